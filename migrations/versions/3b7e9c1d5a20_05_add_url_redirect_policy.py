@@ -0,0 +1,48 @@
+"""05_add_url_redirect_policy
+
+Revision ID: 3b7e9c1d5a20
+Revises: f5f3c83d306d
+Create Date: 2026-10-19 10:12:41.508312
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b7e9c1d5a20'
+down_revision: Union[str, None] = 'f5f3c83d306d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'url',
+        sa.Column(
+            'redirect_type',
+            sa.String(),
+            server_default='temporary',
+            nullable=False
+        )
+    )
+    op.add_column('url', sa.Column('cache_max_age', sa.Integer(), nullable=True))
+    op.create_check_constraint(
+        'redirect_type_constraint',
+        'url',
+        "redirect_type in ('temporary', 'permanent')"
+    )
+    op.create_check_constraint(
+        'permanent_redirect_public_constraint',
+        'url',
+        "redirect_type = 'temporary' or url_type = 'public'"
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint('permanent_redirect_public_constraint', 'url', type_='check')
+    op.drop_constraint('redirect_type_constraint', 'url', type_='check')
+    op.drop_column('url', 'cache_max_age')
+    op.drop_column('url', 'redirect_type')
@@ -0,0 +1,40 @@
+"""10_add_client_connection_summary_indexes
+
+Revision ID: 5c8e2f7a1d43
+Revises: a91d4e6f2b38
+Create Date: 2026-10-19 17:12:40.218465
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c8e2f7a1d43'
+down_revision: Union[str, None] = 'a91d4e6f2b38'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_client_connection_url_id_time',
+        'client_connection',
+        ['url_id', 'time']
+    )
+    op.create_index(
+        'ix_client_connection_url_id_client_info',
+        'client_connection',
+        ['url_id', 'client_info']
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        'ix_client_connection_url_id_client_info',
+        table_name='client_connection'
+    )
+    op.drop_index(
+        'ix_client_connection_url_id_time', table_name='client_connection'
+    )
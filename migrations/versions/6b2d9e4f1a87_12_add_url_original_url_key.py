@@ -0,0 +1,61 @@
+"""12_add_url_original_url_key
+
+Revision ID: 6b2d9e4f1a87
+Revises: d3f61b8a9c57
+Create Date: 2026-10-19 21:40:12.518342
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from src.models.schemas.utils import normalize_url
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6b2d9e4f1a87'
+down_revision: Union[str, None] = 'd3f61b8a9c57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 10000
+
+
+def upgrade() -> None:
+    op.add_column(
+        'url', sa.Column('original_url_key', sa.String(), nullable=True)
+    )
+    # ключ считается той же функцией, что и в приложении,
+    # original_url при этом не меняется
+    connection = op.get_bind()
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.text(
+                'SELECT id, original_url FROM url WHERE id > :last_id '
+                'ORDER BY id LIMIT :limit'
+            ),
+            {'last_id': last_id, 'limit': BATCH_SIZE}
+        ).all()
+        if not rows:
+            break
+        connection.execute(
+            sa.text('UPDATE url SET original_url_key = :key WHERE id = :id'),
+            [
+                {'id': url_id, 'key': normalize_url(original_url)}
+                for url_id, original_url in rows
+            ]
+        )
+        last_id = rows[-1][0]
+    op.alter_column('url', 'original_url_key', nullable=False)
+    op.create_index(
+        'ix_url_original_url_key_user_id',
+        'url',
+        ['original_url_key', 'user_id']
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_url_original_url_key_user_id', table_name='url')
+    op.drop_column('url', 'original_url_key')
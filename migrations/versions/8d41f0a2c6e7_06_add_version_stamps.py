@@ -0,0 +1,40 @@
+"""06_add_version_stamps
+
+Revision ID: 8d41f0a2c6e7
+Revises: 3b7e9c1d5a20
+Create Date: 2026-10-19 11:03:27.114920
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d41f0a2c6e7'
+down_revision: Union[str, None] = '3b7e9c1d5a20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'url',
+        sa.Column('version', sa.Integer(), server_default='1', nullable=False)
+    )
+    op.add_column(
+        'user',
+        sa.Column('version', sa.Integer(), server_default='1', nullable=False)
+    )
+    op.create_index('ix_url_user_id', 'url', ['user_id'])
+    op.create_index(
+        'ix_client_connection_url_id_id', 'client_connection', ['url_id', 'id']
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_client_connection_url_id_id', table_name='client_connection')
+    op.drop_index('ix_url_user_id', table_name='url')
+    op.drop_column('user', 'version')
+    op.drop_column('url', 'version')
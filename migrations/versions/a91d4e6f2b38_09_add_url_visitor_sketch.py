@@ -0,0 +1,33 @@
+"""09_add_url_visitor_sketch
+
+Revision ID: a91d4e6f2b38
+Revises: e7a3b5c9d214
+Create Date: 2026-10-19 16:05:11.482930
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a91d4e6f2b38'
+down_revision: Union[str, None] = 'e7a3b5c9d214'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'url_visitor_sketch',
+        sa.Column('url_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('registers', sa.LargeBinary(), nullable=False),
+        sa.ForeignKeyConstraint(['url_id'], ['url.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('url_id', 'day')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('url_visitor_sketch')
@@ -0,0 +1,67 @@
+"""07_add_archive_tables
+
+Revision ID: c25a7d93e1f4
+Revises: 8d41f0a2c6e7
+Create Date: 2026-10-19 12:20:05.631877
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c25a7d93e1f4'
+down_revision: Union[str, None] = '8d41f0a2c6e7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('url', sa.Column('deleted_at', sa.DateTime(), nullable=True))
+    op.execute(
+        "UPDATE url SET deleted_at = timezone('utc', now()) WHERE deleted"
+    )
+    op.create_table(
+        'url_archive',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('original_url', sa.String(), nullable=False),
+        sa.Column('short_url', sa.String(), nullable=True),
+        sa.Column('created', sa.DateTime(), nullable=True),
+        sa.Column('deleted_at', sa.DateTime(), nullable=True),
+        sa.Column('url_type', sa.String(), nullable=False),
+        sa.Column('redirect_type', sa.String(), nullable=False),
+        sa.Column('cache_max_age', sa.Integer(), nullable=True),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('archived_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(
+        op.f('ix_url_archive_short_url'), 'url_archive', ['short_url']
+    )
+    op.create_table(
+        'client_connection_archive',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('time', sa.DateTime(), nullable=True),
+        sa.Column('client_info', sa.String(), nullable=True),
+        sa.Column('url_id', sa.Integer(), nullable=True),
+        sa.Column('archived_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(
+        op.f('ix_client_connection_archive_url_id'),
+        'client_connection_archive',
+        ['url_id']
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        op.f('ix_client_connection_archive_url_id'),
+        table_name='client_connection_archive'
+    )
+    op.drop_table('client_connection_archive')
+    op.drop_index(op.f('ix_url_archive_short_url'), table_name='url_archive')
+    op.drop_table('url_archive')
+    op.drop_column('url', 'deleted_at')
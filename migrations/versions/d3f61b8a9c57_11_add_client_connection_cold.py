@@ -0,0 +1,45 @@
+"""11_add_client_connection_cold
+
+Revision ID: d3f61b8a9c57
+Revises: 5c8e2f7a1d43
+Create Date: 2026-10-19 18:03:27.905114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd3f61b8a9c57'
+down_revision: Union[str, None] = '5c8e2f7a1d43'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'client_connection_cold',
+        sa.Column('url_id', sa.Integer(), nullable=False),
+        sa.Column('month', sa.Date(), nullable=False),
+        sa.Column('clicks', sa.Integer(), nullable=False),
+        sa.Column('first_click', sa.DateTime(), nullable=False),
+        sa.Column('last_click', sa.DateTime(), nullable=False),
+        sa.Column('path', sa.String(), nullable=False),
+        sa.Column('exported_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('url_id', 'month')
+    )
+    op.create_index(
+        'ix_client_connection_time_brin',
+        'client_connection',
+        ['time'],
+        postgresql_using='brin'
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        'ix_client_connection_time_brin', table_name='client_connection'
+    )
+    op.drop_table('client_connection_cold')
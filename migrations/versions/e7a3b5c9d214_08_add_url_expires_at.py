@@ -0,0 +1,47 @@
+"""08_add_url_expires_at
+
+Revision ID: e7a3b5c9d214
+Revises: c25a7d93e1f4
+Create Date: 2026-10-19 13:41:52.270318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7a3b5c9d214'
+down_revision: Union[str, None] = 'c25a7d93e1f4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('url', sa.Column('expires_at', sa.DateTime(), nullable=True))
+    op.add_column(
+        'url_archive', sa.Column('expires_at', sa.DateTime(), nullable=True)
+    )
+    op.create_index(
+        'ix_url_expires_at_live',
+        'url',
+        ['expires_at'],
+        postgresql_where=sa.text(
+            'expires_at IS NOT NULL AND deleted IS NOT TRUE'
+        )
+    )
+    op.create_check_constraint(
+        'permanent_redirect_no_expiry_constraint',
+        'url',
+        "redirect_type = 'temporary' or expires_at is null"
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint(
+        'permanent_redirect_no_expiry_constraint', 'url', type_='check'
+    )
+    op.drop_index('ix_url_expires_at_live', table_name='url')
+    op.drop_column('url_archive', 'expires_at')
+    op.drop_column('url', 'expires_at')
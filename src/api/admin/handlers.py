@@ -0,0 +1,64 @@
+import logging
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import ORJSONResponse
+
+from core.config import HOST_URL
+from db.db import slow_query_log
+from models.schemas.db_schemas import FullUser
+from services.cache.redirect import redirect_cache
+from services.cache.sketch import hot_urls
+from services.utils.auth import get_admin_user
+
+logger = logging.getLogger(__name__)
+admin_router = APIRouter(prefix='/admin', tags=['admin'])
+
+
+@admin_router.get('/hot', response_class=ORJSONResponse)
+async def get_hot_urls(
+    admin: Annotated[FullUser, Depends(get_admin_user)],
+    limit: Annotated[int, Query(ge=1, le=1000)] = 20
+) -> ORJSONResponse:
+    '''
+    Возвращает самые популярные ссылки процесса за последнее время.
+
+    Число переходов - оценка count-min sketch, старые переходы
+    со временем весят меньше.
+    '''
+    logger.info(f'Admin {admin.username} requested hot urls.')
+    prefix_length = len(HOST_URL) + 1
+    return ORJSONResponse(
+        content={
+            'window': hot_urls.window,
+            'cached_urls': len(redirect_cache),
+            'urls': [
+                {
+                    'short_url': short_url,
+                    'short_url_id': short_url[prefix_length:],
+                    'clicks': clicks
+                }
+                for short_url, clicks in hot_urls.top(limit)
+            ]
+        }
+    )
+
+
+@admin_router.get('/slow-queries', response_class=ORJSONResponse)
+async def get_slow_queries(
+    admin: Annotated[FullUser, Depends(get_admin_user)],
+    limit: Annotated[int, Query(ge=1, le=200)] = 20
+) -> ORJSONResponse:
+    '''
+    Возвращает самые затратные виды медленных запросов процесса.
+
+    Запросы сгруппированы по отпечатку без значений параметров
+    и отсортированы по суммарному времени, у части есть план EXPLAIN.
+    '''
+    logger.info(f'Admin {admin.username} requested slow queries.')
+    return ORJSONResponse(
+        content={
+            'threshold_ms': slow_query_log.threshold * 1000,
+            'queries': slow_query_log.top(limit)
+        }
+    )
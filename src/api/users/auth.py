@@ -59,7 +59,8 @@ async def create_user(
         )
     user_in_db = await user_crud.get_user_by_username(
         db=db,
-        username=user_data.username
+        username=user_data.username,
+        with_urls=False
     )
     if user_in_db:
         logger.info('Error creating user, user exists.')
@@ -1,21 +1,50 @@
-from typing import Annotated
+from typing import Annotated, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi import status
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from db.db import get_session
 from models.schemas.db_schemas import FullUser
-from services.utils.auth import get_current_user
+from services.entities import user_crud
+from services.utils.auth import get_token_username
+from services.utils.responses import etag_matches, make_etag, not_modified
 
 user_router = APIRouter()
 
 
 @user_router.get('/user/status', response_model=FullUser)
 async def read_users_me(
-    current_user: Annotated[FullUser, Depends(get_current_user)]
+    request: Request,
+    response: Response,
+    username: Annotated[Optional[str], Depends(get_token_username)],
+    db: Annotated[AsyncSession, Depends(get_session)]
 ) -> FullUser:
-    '''Возвращает информацию о всех раннее созданных ссылках.'''
-    if not current_user:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail='Authentication credentials were not provided.'
-        )
+    '''
+    Возвращает информацию о всех раннее созданных ссылках.
+
+    Списки переходов содержат только переходы из базы, выгруженные
+    в холодное хранение показывает /status ссылки с full_info=1.
+
+    Если список ссылок и переходов не менялся с момента выдачи ETag,
+    присланного в If-None-Match, возвращается 304 без загрузки ссылок.
+    '''
+    credentials_error = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail='Authentication credentials were not provided.'
+    )
+    if not username:
+        raise credentials_error
+    stamp = await user_crud.get_status_stamp(db=db, username=username)
+    if stamp is None:
+        raise credentials_error
+    etag = make_etag('user', stamp.id, stamp.version, stamp.last_click)
+    if etag_matches(request.headers.get('if-none-match'), etag):
+        return not_modified(etag)
+
+    current_user = await user_crud.get_user_by_username(
+        db=db,
+        username=username
+    )
+    response.headers['ETag'] = etag
     return current_user
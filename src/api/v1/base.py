@@ -1,11 +1,16 @@
 from fastapi import APIRouter
 
+from .batch import batch_router
 from .handlers import shorter_router
+from api.admin.handlers import admin_router
 from api.users.auth import auth_router
 from api.users.handlers import user_router
 
 # Главный роутер
 api_router = APIRouter()
 api_router.include_router(user_router)
+# пакетные операции раньше /{short_url_id}/..., иначе batch станет кодом
+api_router.include_router(batch_router)
 api_router.include_router(shorter_router)
 api_router.include_router(auth_router)
+api_router.include_router(admin_router)
@@ -0,0 +1,91 @@
+import logging
+from typing import Annotated, Dict, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import HOST_URL
+from db.db import get_session
+from models.schemas.db_schemas import (
+    BatchDeleteUrl, BatchResult, BatchUpdateUrl
+)
+from services.entities import url_crud
+from services.utils.auth import get_token_username
+
+logger = logging.getLogger(__name__)
+batch_router = APIRouter(prefix='/batch', tags=['batch'])
+
+
+async def apply_batch(
+    db: AsyncSession,
+    short_url_ids: List[str],
+    values: Dict,
+    username: Optional[str]
+) -> ORJSONResponse:
+    '''Применяет изменения к ссылкам и возвращает статус каждой.'''
+    prefix = f'{HOST_URL}/'
+    try:
+        statuses = await url_crud.batch_update(
+            db=db,
+            short_urls=[prefix + url_id for url_id in short_url_ids],
+            values=values,
+            username=username
+        )
+    except Exception as err:
+        logger.error(f'Error in batch update: {err}', exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail='Error updating urls, try later.'
+        )
+    return ORJSONResponse(
+        content=[
+            {
+                'short_url_id': short_url.removeprefix(prefix),
+                'status': url_status
+            }
+            for short_url, url_status in statuses.items()
+        ]
+    )
+
+
+@batch_router.put('/update', response_model=List[BatchResult])
+async def batch_update_urls(
+    data_in: BatchUpdateUrl,
+    db: Annotated[AsyncSession, Depends(get_session)],
+    username: Annotated[Optional[str], Depends(get_token_username)]
+) -> ORJSONResponse:
+    '''
+    Меняет тип нескольких ссылок одним запросом к базе.
+
+    Для каждой ссылки возвращается статус updated, not_found
+    или forbidden.
+    '''
+    logger.info(f'Batch updating {len(data_in.short_url_ids)} urls')
+    return await apply_batch(
+        db=db,
+        short_url_ids=data_in.short_url_ids,
+        values={'url_type': data_in.url_type},
+        username=username
+    )
+
+
+@batch_router.post('/delete', response_model=List[BatchResult])
+async def batch_delete_urls(
+    data_in: BatchDeleteUrl,
+    db: Annotated[AsyncSession, Depends(get_session)],
+    username: Annotated[Optional[str], Depends(get_token_username)]
+) -> ORJSONResponse:
+    '''
+    Помечает удаленными несколько ссылок одним запросом к базе.
+
+    Для каждой ссылки возвращается статус updated, not_found
+    или forbidden.
+    '''
+    logger.info(f'Batch deleting {len(data_in.short_url_ids)} urls')
+    return await apply_batch(
+        db=db,
+        short_url_ids=data_in.short_url_ids,
+        values={'deleted': True},
+        username=username
+    )
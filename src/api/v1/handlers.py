@@ -1,30 +1,223 @@
 import logging
-from typing import Annotated, Any, Optional
+from datetime import date, datetime
+from typing import Annotated, Any, Dict, List, Optional, Tuple
 
-from fastapi import APIRouter, Depends, HTTPException, Request, status
-from fastapi.responses import ORJSONResponse, RedirectResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import (
+    ORJSONResponse, RedirectResponse, StreamingResponse
+)
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from core.config import HOST_URL
+from core.config import HOST_URL, app_settings
 from db.db import get_session
 from models.schemas.db_schemas import CreateUrl, FullUrl, FullUser, UpdateUrl
 from models.schemas.utils import UrlTypes
-from services.entities import client_con_crud, url_crud
-from services.exceptions.custom_exceptions import AccessError, UrlExistsError
-from services.utils.auth import get_current_user
+from services.cache.dedup import anonymous_urls
+from services.cache.short_urls import negative_cache, short_url_filter
+from services.cache.sketch import hot_urls
+from services.cache.summary import click_summaries
+from services.click_feed import click_feed
+from services.click_stats import click_histogram, to_naive_utc
+from services.cold_storage import (
+    load_cold_details, load_url_clicks, merge_daily, merge_top
+)
+from services.entities import UrlStamp, client_con_crud, url_crud
+from services.visitors import visitor_counter, visitor_id
+from services.exceptions.custom_exceptions import (
+    AccessError, RedirectPolicyError, UrlExistsError
+)
+from services.utils.auth import get_current_user, get_token_username
 from services.utils.utils import (
     check_original_url,
     check_read_permission,
+    check_redirect_policy,
+    check_stamp_read_permission,
     check_update_permission,
     check_url_exists,
     shorten_url
 )
+from services.utils.responses import (
+    etag_matches,
+    json_response,
+    make_etag,
+    not_modified,
+    query_tag,
+    redirect_response,
+    url_response
+)
 
 logger = logging.getLogger(__name__)
 shorter_router = APIRouter(tags=['shorter'])
 
 
+def created_response(
+    url_obj: FullUrl,
+    current_user: Optional[FullUser]
+) -> ORJSONResponse:
+    '''Возвращает ответ 201, ответ по ссылке без владельца кэшируется.'''
+    response = url_response(url_obj, status.HTTP_201_CREATED)
+    if not current_user and check_url_exists(url_obj):
+        anonymous_urls.set(
+            url_obj.original_url, url_obj.short_url, response.body,
+            url_obj.expires_at
+        )
+    return response
+
+
+async def click_summary(
+    db: AsyncSession,
+    stamp: UrlStamp,
+    top: int
+) -> Dict[str, Any]:
+    '''
+    Сводка переходов по ссылке для дашборда.
+
+    Топ user-agent, переходы по дням и время первого и последнего
+    перехода считаются тремя агрегирующими запросами по индексам
+    и ненадолго кэшируются. Переходы из холодного хранения
+    добавляются к результатам из базы. Для ссылки без переходов
+    база не нужна.
+    '''
+    key = (stamp.id, stamp.version, top)
+    summary = click_summaries.get(key)
+    if summary is not None:
+        return summary
+    cold = await load_url_clicks(
+        db=db, url_id=stamp.id, has_cold=stamp.has_cold
+    )
+    if stamp.last_click is None and not cold:
+        return {
+            'first_click': None,
+            'last_click': None,
+            'top_clients': [],
+            'clicks_per_day': []
+        }
+    first_click, last_click = await client_con_crud.get_click_range(
+        db=db, url_id=stamp.id
+    )
+    top_clients = await client_con_crud.get_top_clients(
+        db=db, url_id=stamp.id, limit=None if cold else top
+    )
+    daily_clicks = await client_con_crud.get_daily_clicks(
+        db=db, url_id=stamp.id
+    )
+    if cold:
+        top_clients = merge_top(top_clients, cold, limit=top)
+        daily_clicks = merge_daily(daily_clicks, cold)
+    summary = {
+        'first_click': first_click,
+        'last_click': last_click,
+        'top_clients': [
+            {'client': client, 'clicks': clicks}
+            for client, clicks in top_clients
+        ],
+        'clicks_per_day': [
+            {'day': day, 'clicks': clicks} for day, clicks in daily_clicks
+        ]
+    }
+    click_summaries.set(key, summary)
+    return summary
+
+
+def status_etag(
+    request: Request,
+    stamp: UrlStamp,
+    uniques: int
+) -> Optional[str]:
+    '''
+    Возвращает ETag статистики ссылки или None, если ответ не кэшируется.
+
+    Разные разделы и диапазоны дают разные ответы по одной версии
+    ссылки, поэтому в ETag входят параметры запроса. Число уникальных
+    посетителей меняется при сбросе скетчей без смены версии ссылки,
+    такой ответ ETag не получает.
+    '''
+    if uniques == 1:
+        return None
+    return make_etag(
+        'url', stamp.id, stamp.version, stamp.last_click,
+        query_tag(request.query_params.multi_items())
+    )
+
+
+def check_histogram_range(
+    start: Optional[datetime],
+    end: Optional[datetime]
+) -> None:
+    '''Проверяет, что интервал гистограммы не пустой.'''
+    start, end = to_naive_utc(start), to_naive_utc(end)
+    if start is not None and end is not None and start >= end:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail='histogram_from must be earlier than histogram_to.'
+        )
+
+
+async def connection_details(
+    db: AsyncSession,
+    stamp: UrlStamp,
+    offset: int,
+    max_result: Optional[int]
+) -> List[Dict[str, Any]]:
+    '''
+    Страница переходов по ссылке от новых к старым.
+
+    Переходы из базы новее выгруженных, поэтому страница, которая
+    заканчивается в базе, продолжается переходами из холодного хранения.
+    '''
+    connections = await client_con_crud.get_multi_by_url_id(
+        db=db, url_id=stamp.id, offset=offset, max_result=max_result
+    )
+    details = [
+        {'datetime': connection.time, 'client': connection.client_info}
+        for connection in connections
+    ]
+    if stamp.has_cold and (max_result is None or len(details) < max_result):
+        hot = offset + len(details) if details else (
+            await client_con_crud.count_by_url_id(
+                db=db, url_id=stamp.id, with_cold=False
+            )
+        )
+        cold = await load_cold_details(
+            db=db,
+            url_id=stamp.id,
+            offset=max(0, offset - hot),
+            limit=None if max_result is None else max_result - len(details)
+        )
+        details.extend(
+            {'datetime': time, 'client': agent} for time, agent in cold
+        )
+    return details
+
+
+async def optional_status(
+    db: AsyncSession,
+    stamp: UrlStamp,
+    uniques: Optional[Tuple[Optional[date], Optional[date]]],
+    summary_top: Optional[int],
+    histogram: Optional[Tuple[Optional[datetime], Optional[datetime], int]]
+) -> Dict[str, Any]:
+    '''Собирает запрошенные необязательные разделы статистики ссылки.'''
+    data_out = {}
+    if uniques is not None:
+        start, end = uniques
+        data_out['unique_visitors'] = await visitor_counter.unique_visitors(
+            db=db, url_id=stamp.id, start=start, end=end
+        )
+    if summary_top is not None:
+        data_out['summary'] = await click_summary(
+            db=db, stamp=stamp, top=summary_top
+        )
+    if histogram is not None:
+        start, end, bins = histogram
+        data_out['histogram'] = await click_histogram(
+            db=db, url_id=stamp.id, has_cold=stamp.has_cold, bins=bins,
+            start=start, end=end
+        )
+    return data_out
+
+
 @shorter_router.post(
     '/',
     response_model=FullUrl,
@@ -40,7 +233,14 @@ async def create_short_url(
     Обрабатывает post запрос пользователя.
 
     Создает короткий url вместо оригинального и сохраняет объект в базу.
+    Повторное создание ссылки без владельца отвечает из кэша,
+    не обращаясь к базе.
     '''
+    cached = None if current_user else anonymous_urls.get(
+        data_in.original_url
+    )
+    if cached is not None:
+        return json_response(cached, status.HTTP_201_CREATED)
     try:
         urls_in_db = await url_crud.get_obj_by_original_url(
             db=db,
@@ -50,10 +250,14 @@ async def create_short_url(
 
         url_in_db = check_original_url(urls_in_db, current_user)
         if url_in_db:
-            return url_in_db
+            return created_response(url_in_db, current_user)
 
         if not current_user and data_in.url_type == UrlTypes.PRIVATE:
             data_in.url_type = UrlTypes.PUBLIC
+        if not check_redirect_policy(
+            data_in.url_type, data_in.redirect_type, data_in.expires_at
+        ):
+            raise RedirectPolicyError
 
         extra_data = {}
         if current_user:
@@ -61,9 +265,20 @@ async def create_short_url(
         extra_data.update({'short_url': short_url})
 
         url_obj = await url_crud.create(db=db, data_in=data_in, **extra_data)
+        short_url_filter.add(short_url)
+        negative_cache.discard(short_url)
         logger.info(f'Created new url {short_url}')
-        return url_obj
+        return created_response(url_obj, current_user)
 
+    except RedirectPolicyError as err:
+        logger.error(f'Forbidden redirect policy {err}.', exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=(
+                'Permanent redirect is available for public '
+                'non-expiring urls only.'
+            )
+        )
     except IntegrityError as err:
         logger.error(f'Duplicate key or other error: {err}', exc_info=True)
         raise HTTPException(
@@ -118,12 +333,19 @@ async def redirect_to_original_url(
     '''
     try:
         short_url = f'{HOST_URL}/{short_url_id}'
-        url_obj = await url_crud.get_obj_by_short_url(
+        if (
+            short_url in negative_cache
+            or not short_url_filter.might_contain(short_url)
+        ):
+            raise UrlExistsError
+        hot_urls.record(short_url)
+        url_obj = await url_crud.get_redirect_target(
             db=db,
             short_url=short_url
         )
 
         if not check_url_exists(url_obj):
+            negative_cache.add(short_url)
             raise UrlExistsError
         if not check_read_permission(url_obj, current_user):
             raise AccessError
@@ -132,11 +354,25 @@ async def redirect_to_original_url(
             'client_info': request.headers.get('user-agent'),
             'url_id': url_obj.id
         }
-        await client_con_crud.create(db=db, data_in=connection_data)
+        connection = await client_con_crud.create(
+            db=db, data_in=connection_data
+        )
+        click_feed.publish(
+            short_url,
+            {'datetime': connection.time, 'client': connection.client_info}
+        )
+        visitor_counter.add(
+            url_obj.id,
+            visitor_id(
+                request.client.host if request.client else None,
+                connection.client_info
+            ),
+            now=connection.time
+        )
         logger.info(
             f'Called original url {url_obj.original_url} from {short_url}'
         )
-        return RedirectResponse(url=url_obj.original_url)
+        return redirect_response(url_obj)
 
     except UrlExistsError as err:
         logger.error(
@@ -181,13 +417,23 @@ async def update_url(
         if not check_update_permission(url_obj, current_user):
             raise AccessError
 
+        data = data_in.changes()
+        if not data:
+            return url_response(url_obj)
+        if not check_redirect_policy(
+            data.get('url_type', url_obj.url_type),
+            data.get('redirect_type', url_obj.redirect_type),
+            data.get('expires_at', url_obj.expires_at)
+        ):
+            raise RedirectPolicyError
+
         logger.info(f'Updating url {url_obj.original_url}')
         updated_url = await url_crud.update(
             db=db,
             db_obj=url_obj,
-            data_in=data_in
+            data_in=data
         )
-        return updated_url
+        return url_response(updated_url)
     except UrlExistsError as err:
         logger.error(
             f'User tried accessing unexisting or deleted url {err}.',
@@ -205,6 +451,15 @@ async def update_url(
             status_code=status.HTTP_403_FORBIDDEN,
             detail='The url is available for its creator only.'
         )
+    except RedirectPolicyError as err:
+        logger.error(f'Forbidden redirect policy {err}.', exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=(
+                'Permanent redirect is available for public '
+                'non-expiring urls only.'
+            )
+        )
     except Exception as err:
         logger.error(f'Error updating url: {err}', exc_info=True)
         raise HTTPException(
@@ -215,47 +470,85 @@ async def update_url(
 
 @shorter_router.get('/{short_url_id}/status', response_class=ORJSONResponse)
 async def get_url_status(
+    request: Request,
     short_url_id: str,
     db: Annotated[AsyncSession, Depends(get_session)],
-    current_user: Annotated[FullUser, Depends(get_current_user)],
+    username: Annotated[Optional[str], Depends(get_token_username)],
     full_info: int = 0,
     max_result: Optional[int] = 10,
     offset: Optional[int] = 0,
+    uniques: int = 0,
+    uniques_from: Optional[date] = None,
+    uniques_to: Optional[date] = None,
+    summary: int = 0,
+    summary_top: Annotated[int, Query(ge=1, le=100)] = 10,
+    histogram: int = 0,
+    histogram_from: Optional[datetime] = None,
+    histogram_to: Optional[datetime] = None,
+    histogram_bins: Annotated[int, Query(ge=1, le=1000)] = 24,
 ) -> Any:
-    '''Возвращает статистику использования короткой url.'''
+    '''
+    Возвращает статистику использования короткой url.
+
+    С full_info=1 ответ содержит страницу переходов от новых к старым,
+    включая переходы из холодного хранения.
+
+    С uniques=1 ответ содержит оценку числа уникальных посетителей
+    за дни с uniques_from по uniques_to по скетчам HyperLogLog.
+    С summary=1 ответ содержит сводку переходов: summary_top самых
+    частых user-agent, переходы по дням, первый и последний переход.
+    С histogram=1 ответ содержит гистограмму переходов за
+    [histogram_from, histogram_to) из histogram_bins интервалов,
+    перцентили времени переходов и интервалов между ними.
+
+    Ответ помечается ETag из версии ссылки, id последнего перехода
+    и параметров запроса (кроме ответа с uniques=1). Если клиент
+    прислал тот же ETag в If-None-Match, возвращается 304 без загрузки
+    переходов и сборки статистики.
+    '''
+    check_histogram_range(histogram_from, histogram_to)
     try:
         logger.debug(f'Getting info about url {short_url_id}')
         short_url = f'{HOST_URL}/{short_url_id}'
-        url_obj = await url_crud.get_obj_by_short_url(
-            db=db,
-            short_url=short_url
-        )
+        stamp = await url_crud.get_status_stamp(db=db, short_url=short_url)
 
-        if not check_url_exists(url_obj):
+        if not check_url_exists(stamp):
             raise UrlExistsError
-        if not check_read_permission(url_obj, current_user):
+        if not check_stamp_read_permission(stamp, username):
             raise AccessError
+        etag = status_etag(request=request, stamp=stamp, uniques=uniques)
+        if etag and etag_matches(request.headers.get('if-none-match'), etag):
+            return not_modified(etag)
 
-        data_out = {'number_of_calls': len(url_obj.connections)}
+        data_out = {
+            'number_of_calls': await client_con_crud.count_by_url_id(
+                db=db,
+                url_id=stamp.id
+            )
+        }
 
-        if full_info == 1:
-            details = []
-            connections = await client_con_crud.get_multi_by_url_id(
+        data_out.update(
+            await optional_status(
                 db=db,
-                url_id=url_obj.id,
-                offset=offset,
-                max_result=max_result
+                stamp=stamp,
+                uniques=(uniques_from, uniques_to) if uniques == 1 else None,
+                summary_top=summary_top if summary == 1 else None,
+                histogram=(
+                    (histogram_from, histogram_to, histogram_bins)
+                    if histogram == 1 else None
+                )
+            )
+        )
+
+        if full_info == 1:
+            data_out['details'] = await connection_details(
+                db=db, stamp=stamp, offset=offset or 0, max_result=max_result
             )
-            for connection in connections:
-                con_info = {
-                    'datetime': connection.time,
-                    'client': connection.client_info
-                }
-                details.append(con_info)
-            data_out.update({'details': details})
 
         logger.debug(f'Collected info about url {short_url}')
-        return ORJSONResponse(content=data_out)
+        return ORJSONResponse(
+            content=data_out, headers={'ETag': etag} if etag else None
+        )
 
     except UrlExistsError as err:
         logger.error(
@@ -283,6 +576,44 @@ async def get_url_status(
         )
 
 
+@shorter_router.get('/{short_url_id}/status/stream')
+async def stream_url_clicks(
+    short_url_id: str,
+    db: Annotated[AsyncSession, Depends(get_session)],
+    username: Annotated[Optional[str], Depends(get_token_username)]
+) -> StreamingResponse:
+    '''
+    Транслирует переходы по короткой url в формате Server-Sent Events.
+
+    Права проверяются одним запросом к базе, после чего соединение
+    возвращается в пул, и трансляция базу больше не использует.
+    Видны только переходы, обработанные этим процессом. После
+    изменения или удаления ссылки трансляция завершается, и при
+    переподключении права проверяются заново.
+    '''
+    short_url = f'{HOST_URL}/{short_url_id}'
+    stamp = await url_crud.get_status_stamp(db=db, short_url=short_url)
+    await db.close()
+    if not check_url_exists(stamp):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail='No such url in database.'
+        )
+    if not check_stamp_read_permission(stamp, username):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail='The url is available for its creator only.'
+        )
+    logger.info(f'Streaming clicks of {short_url}')
+    return StreamingResponse(
+        click_feed.stream(
+            short_url, heartbeat=app_settings.STREAM_HEARTBEAT_SECONDS
+        ),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
 @shorter_router.delete(
     '/{short_url_id}/delete',
     response_class=ORJSONResponse
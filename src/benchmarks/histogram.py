@@ -0,0 +1,161 @@
+'''
+Сравнение гистограммы переходов через ORM и через бинарный столбец.
+
+Запуск из корня проекта (нужна тестовая база из docker-compose-testdb.yml
+и TESTING_MODE=True в .env):
+
+    PYTHONPATH=src python -m benchmarks.histogram --clicks 100000
+
+Скрипт создает ссылку с --clicks переходами за 30 дней и считает
+одну и ту же гистограмму двумя способами: загрузкой объектов
+ClientConnection с циклами на Python, как в details у get_url_status,
+и через click_histogram. После замеров ссылка удаляется.
+'''
+import argparse
+import asyncio
+import sys
+import time
+from datetime import timedelta
+from typing import Any, Dict, List, Optional
+from uuid import uuid4
+
+from sqlalchemy import delete, select, text
+
+from .stats import summarize, write_report
+from core.config import HOST_URL
+from db.db import async_session, engine
+from models import ClientConnection, Url
+from services import click_stats
+from services.click_stats import click_histogram
+from services.entities import url_crud
+
+
+async def seed(clicks: int) -> int:
+    '''Создает ссылку с clicks переходами и возвращает ее id.'''
+    async with async_session() as db:
+        url_obj = await url_crud.create(
+            db=db,
+            data_in={
+                'original_url': f'https://example.com/histogram/{uuid4()}',
+                'short_url': f'{HOST_URL}/hist-{uuid4().hex}',
+                'url_type': 'public'
+            }
+        )
+        await db.execute(
+            text(
+                'INSERT INTO client_connection (time, client_info, url_id) '
+                "SELECT now() - random() * interval '30 days', 'benchmark', "
+                ':url_id FROM generate_series(1, :clicks)'
+            ),
+            {'url_id': url_obj.id, 'clicks': clicks}
+        )
+        await db.execute(text('ANALYZE client_connection'))
+        await db.commit()
+        return url_obj.id
+
+
+async def cleanup(url_id: int) -> None:
+    async with async_session() as db:
+        await db.execute(
+            delete(ClientConnection).where(ClientConnection.url_id == url_id)
+        )
+        await db.execute(delete(Url).where(Url.id == url_id))
+        await db.commit()
+
+
+async def orm_histogram(url_id: int, bins: int) -> Dict[str, Any]:
+    '''Та же гистограмма по объектам ClientConnection и циклам Python.'''
+    async with async_session() as db:
+        result = await db.execute(
+            select(ClientConnection).
+            where(ClientConnection.url_id == url_id).
+            order_by(ClientConnection.time)
+        )
+        connections = result.scalars().all()
+    times = [connection.time for connection in connections]
+    start, end = times[0], times[-1] + timedelta(microseconds=1)
+    width = (end - start) / bins
+    counts = [0] * bins
+    for moment in times:
+        counts[min(int((moment - start) / width), bins - 1)] += 1
+    gaps = sorted(
+        (following - previous).total_seconds()
+        for previous, following in zip(times, times[1:])
+    )
+    return {
+        'clicks': len(times),
+        'counts': counts,
+        'p50': times[len(times) // 2],
+        'max_gap': gaps[-1],
+    }
+
+
+async def vectorized_histogram(url_id: int, bins: int) -> Dict[str, Any]:
+    async with async_session() as db:
+        return await click_histogram(db=db, url_id=url_id, bins=bins)
+
+
+async def measure(
+    func,
+    url_id: int,
+    bins: int,
+    repeat: int
+) -> Dict[str, Any]:
+    latencies: List[float] = []
+    started = time.perf_counter()
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        await func(url_id, bins)
+        latencies.append(time.perf_counter() - begin)
+    return summarize(latencies, 0, time.perf_counter() - started)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Click histogram benchmark')
+    parser.add_argument('--clicks', type=int, default=100000)
+    parser.add_argument('--bins', type=int, default=24)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', default='histogram.json')
+    return parser.parse_args(argv)
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    url_id = await seed(args.clicks)
+    try:
+        orm = await orm_histogram(url_id, args.bins)
+        fast = await vectorized_histogram(url_id, args.bins)
+        binned = sum(item['clicks'] for item in fast['bins'])
+        if not orm['clicks'] == fast['clicks'] == binned:
+            raise RuntimeError('ORM and vectorized histograms differ')
+        results = {
+            'orm': await measure(
+                orm_histogram, url_id, args.bins, args.repeat
+            ),
+            'vectorized': await measure(
+                vectorized_histogram, url_id, args.bins, args.repeat
+            ),
+        }
+    finally:
+        await cleanup(url_id)
+        await engine.dispose()
+    speedup = results['orm']['p50_ms'] / results['vectorized']['p50_ms']
+    return {
+        'clicks': args.clicks,
+        'bins': args.bins,
+        'numpy': click_stats.np is not None,
+        'results': results,
+        'speedup_p50': round(speedup, 2),
+    }
+
+
+def main(args: argparse.Namespace) -> int:
+    report = asyncio.run(run(args))
+    for name, stats in report['results'].items():
+        print(f'{name:12} p50 {stats["p50_ms"]:>10.2f} ms')
+    print(f'speedup (p50): {report["speedup_p50"]}x, numpy: {report["numpy"]}')
+    write_report(args.output, report)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(parse_args()))
@@ -0,0 +1,190 @@
+'''
+Нагрузочный тест конечных точек сервиса.
+
+Запуск из корня проекта (нужна тестовая база из docker-compose-testdb.yml
+и TESTING_MODE=True в .env):
+
+    PYTHONPATH=src python -m benchmarks.load --output load.json
+
+По умолчанию приложение запускается внутри процесса через httpx.AsyncClient,
+с флагом --base-url запросы идут на уже запущенный uvicorn.
+'''
+import argparse
+import asyncio
+import itertools
+import logging
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+from uuid import uuid4
+
+from httpx import AsyncClient
+
+from .stats import summarize, write_report
+
+logger = logging.getLogger(__name__)
+
+SCENARIOS = ('redirect', 'create', 'status', 'user_status')
+
+
+@dataclass
+class Dataset:
+    '''Засеянные пользователи и ссылки.'''
+    tokens: List[str] = field(default_factory=list)
+    codes: List[str] = field(default_factory=list)
+    weights: List[float] = field(default_factory=list)
+
+
+def zipf_weights(size: int, exponent: float) -> List[float]:
+    '''Кумулятивные веса распределения Ципфа для size элементов.'''
+    weights = [1 / rank ** exponent for rank in range(1, size + 1)]
+    return list(itertools.accumulate(weights))
+
+
+def get_code(short_url: str) -> str:
+    '''Достает код из полной короткой ссылки.'''
+    return short_url.rstrip('/').rsplit('/', 1)[-1]
+
+
+async def seed(
+    client: AsyncClient,
+    users: int,
+    urls: int,
+    exponent: float
+) -> Dataset:
+    '''Создает пользователей и ссылки через api.'''
+    dataset = Dataset()
+    run_id = uuid4().hex[:8]
+    for number in range(users):
+        credentials = {
+            'username': f'bench_{run_id}_{number}',
+            'password': 'Benchmark1'
+        }
+        await client.post('/auth/users/create', json=credentials)
+        response = await client.post('/auth/token', data=credentials)
+        dataset.tokens.append(response.json()['access_token'])
+
+    for number in range(urls):
+        headers = {}
+        if dataset.tokens and number % 2:
+            token = dataset.tokens[number % len(dataset.tokens)]
+            headers = {'Authorization': f'Bearer {token}'}
+        response = await client.post(
+            '/',
+            headers=headers,
+            json={
+                'original_url': f'https://example.com/{run_id}/{number}',
+                'url_type': 'public'
+            }
+        )
+        dataset.codes.append(get_code(response.json()['short_url']))
+
+    random.shuffle(dataset.codes)
+    dataset.weights = zipf_weights(len(dataset.codes), exponent)
+    logger.info(f'Seeded {users} users and {urls} urls')
+    return dataset
+
+
+def build_request(scenario: str, dataset: Dataset) -> Dict[str, Any]:
+    '''Собирает параметры очередного запроса сценария.'''
+    if scenario == 'create':
+        return {
+            'method': 'POST',
+            'url': '/',
+            'json': {
+                'original_url': f'https://example.com/new/{uuid4().hex}',
+                'url_type': 'public'
+            }
+        }
+    if scenario == 'user_status':
+        token = random.choice(dataset.tokens)
+        return {
+            'method': 'GET',
+            'url': '/user/status',
+            'headers': {'Authorization': f'Bearer {token}'}
+        }
+    code = random.choices(dataset.codes, cum_weights=dataset.weights)[0]
+    if scenario == 'status':
+        return {'method': 'GET', 'url': f'/{code}/status'}
+    return {'method': 'GET', 'url': f'/{code}'}
+
+
+async def run_scenario(
+    client: AsyncClient,
+    scenario: str,
+    dataset: Dataset,
+    requests: int,
+    concurrency: int
+) -> Dict[str, Any]:
+    '''Выполняет requests запросов сценария в concurrency потоков.'''
+    latencies: List[float] = []
+    errors = 0
+    counter = itertools.count()
+
+    async def worker():
+        nonlocal errors
+        while next(counter) < requests:
+            params = build_request(scenario, dataset)
+            start = time.perf_counter()
+            response = await client.request(**params)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - start)
+
+
+async def main(args: argparse.Namespace) -> Dict[str, Any]:
+    '''Засевает данные и прогоняет все сценарии.'''
+    random.seed(args.seed)
+    if args.base_url:
+        client = AsyncClient(base_url=args.base_url, timeout=30)
+    else:
+        from core.config import HOST_URL
+        from main import app
+        client = AsyncClient(app=app, base_url=HOST_URL, timeout=30)
+
+    async with client:
+        dataset = await seed(client, args.users, args.urls, args.zipf)
+        results = {}
+        for scenario in args.scenarios:
+            results[scenario] = await run_scenario(
+                client, scenario, dataset, args.requests, args.concurrency
+            )
+            logger.info(f'{scenario}: {results[scenario]}')
+    return results
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Load test of shortener')
+    parser.add_argument('--base-url', default=None)
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--urls', type=int, default=200)
+    parser.add_argument('--zipf', type=float, default=1.1)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS)
+    )
+    parser.add_argument('--output', default='load.json')
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    arguments = parse_args()
+    report = asyncio.run(main(arguments))
+    params = {
+        key: value for key, value in vars(arguments).items()
+        if key != 'output'
+    }
+    write_report(arguments.output, {'params': params, 'results': report})
+    for name, summary in report.items():
+        print(
+            f'{name:12} {summary["rps"]:>9} req/s  '
+            f'p50 {summary["p50_ms"]} ms  p95 {summary["p95_ms"]} ms  '
+            f'p99 {summary["p99_ms"]} ms  errors {summary["errors"]}'
+        )
@@ -0,0 +1,297 @@
+'''
+Микробенчмарки сериализации схем и построения запросов.
+
+Запуск из корня проекта:
+
+    PYTHONPATH=src python -m benchmarks.micro --output micro.json
+
+Если время операции превышает порог из thresholds.json (умноженный
+на --factor), скрипт завершается с кодом 1.
+С флагом --update-thresholds текущие результаты с запасом
+записываются в thresholds.json как новые пороги.
+'''
+import argparse
+import asyncio
+import json
+import os
+import sys
+import timeit
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import insert, inspect, select
+from sqlalchemy.dialects.postgresql.asyncpg import dialect as pg_dialect
+
+from .stats import write_report
+from models import ClientConnection, Url, User
+from models.schemas.db_schemas import FullUrl, FullUser, UpdateUrl
+from services.entities import client_con_crud, url_crud
+from services.utils.responses import url_response
+
+THRESHOLDS_PATH = os.path.join(os.path.dirname(__file__), 'thresholds.json')
+THRESHOLDS_HEADROOM = 3
+
+# пары (быстрый путь, путь через response_model) для расчета экономии
+COMPARISONS = {
+    f'fast_full_url_{size}': f'render_full_url_{size}'
+    for size in (0, 10, 100, 1000)
+}
+
+DIALECT = pg_dialect()
+
+
+class _Row:
+    '''Строка RETURNING, в которой каждая колонка равна 1.'''
+    _mapping = defaultdict(lambda: 1)
+
+
+class _Result:
+    '''Пустой результат запроса для CaptureSession.'''
+
+    def scalar_one_or_none(self):
+        return None
+
+    def one(self):
+        return _Row()
+
+    def scalars(self):
+        return self
+
+    def all(self):
+        return []
+
+
+class CaptureSession:
+    '''
+    Заглушка AsyncSession без обращения к базе.
+
+    Компилирует каждый запрос под диалект asyncpg, поэтому время
+    вызова метода менеджера включает построение и компиляцию запроса.
+    '''
+
+    def __init__(self):
+        self.statements = []
+        self.info = {}
+
+    async def execute(self, statement, *args, **kwargs):
+        self._compile(statement)
+        return _Result()
+
+    def _compile(self, statement):
+        self.statements.append(statement.compile(dialect=DIALECT))
+
+    def add(self, obj):
+        '''Компилирует INSERT, который сессия выполнила бы при flush.'''
+        state = inspect(obj)
+        if state.key is not None:
+            return
+        mapper = state.mapper
+        self._compile(
+            insert(mapper.local_table).
+            values({
+                attr.key: state.dict[attr.key]
+                for attr in mapper.column_attrs if attr.key in state.dict
+            }).
+            returning(*mapper.primary_key)
+        )
+
+    async def commit(self):
+        pass
+
+    async def refresh(self, obj):
+        '''Компилирует SELECT, которым сессия перечитывает объект.'''
+        mapper = inspect(obj).mapper
+        self._compile(
+            select(mapper).
+            where(*(
+                column == getattr(obj, column.key)
+                for column in mapper.primary_key
+            ))
+        )
+
+
+def make_url(number: int, connections: int) -> Url:
+    '''Создает объект Url с историей переходов.'''
+    created = datetime(2024, 1, 1)
+    url = Url(
+        id=number,
+        original_url=f'https://example.com/articles/{number}?ref=campaign',
+        short_url=f'http://127.0.0.1:8080/{number:06x}',
+        created=created,
+        deleted=False,
+        url_type='public',
+        redirect_type='temporary',
+        user_id=1,
+    )
+    url.connections = [
+        ClientConnection(
+            id=number * 100000 + index,
+            time=created + timedelta(seconds=index),
+            client_info=(
+                'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 '
+                f'(KHTML, like Gecko) Chrome/{100 + index % 20}.0'
+            ),
+            url_id=number,
+        )
+        for index in range(connections)
+    ]
+    return url
+
+
+def make_user(urls: int, connections: int) -> User:
+    '''Создает объект User со ссылками.'''
+    user = User(id=1, username='benchmark', password='hash')
+    user.urls = [make_url(number, connections) for number in range(urls)]
+    return user
+
+
+def run_async(coro_factory: Callable) -> Callable:
+    '''Оборачивает корутину для синхронного timeit.'''
+    loop = asyncio.new_event_loop()
+
+    def wrapper():
+        loop.run_until_complete(coro_factory())
+    return wrapper
+
+
+def build_cases() -> Dict[str, Callable]:
+    '''Собирает все измеряемые операции.'''
+    cases: Dict[str, Callable] = {}
+    for size in (0, 10, 100, 1000):
+        url = make_url(1, size)
+        cases[f'validate_full_url_{size}'] = (
+            lambda url=url: FullUrl.model_validate(url)
+        )
+        cases[f'render_full_url_{size}'] = (
+            lambda url=url: ORJSONResponse(
+                content=jsonable_encoder(FullUrl.model_validate(url))
+            )
+        )
+        cases[f'fast_full_url_{size}'] = lambda url=url: url_response(url)
+    user = make_user(urls=20, connections=50)
+    cases['validate_full_user_20x50'] = lambda: FullUser.model_validate(user)
+    cases['render_full_user_20x50'] = lambda: ORJSONResponse(
+        content=jsonable_encoder(FullUser.model_validate(user))
+    )
+    url = make_url(1, 100)
+    status_payload = {
+        'number_of_calls': len(url.connections),
+        'details': [
+            {'datetime': con.time, 'client': con.client_info}
+            for con in url.connections
+        ]
+    }
+    cases['render_url_status_100'] = (
+        lambda: ORJSONResponse(content=status_payload)
+    )
+
+    db = CaptureSession()
+    db_obj = make_url(1, 0)
+    statements = {
+        'url_get': lambda: url_crud.get(db=db, id=1),
+        'url_get_multi': lambda: url_crud.get_multi(db=db),
+        'url_get_obj_by_short_url': lambda: url_crud.get_obj_by_short_url(
+            db=db, short_url='http://127.0.0.1:8080/abcdef'
+        ),
+        'url_get_obj_by_original_url': (
+            lambda: url_crud.get_obj_by_original_url(
+                db=db, original_url='https://example.com', user_id=1
+            )
+        ),
+        'url_update': lambda: url_crud.update(
+            db=db, db_obj=db_obj, data_in=UpdateUrl(url_type='private')
+        ),
+        'url_delete': lambda: url_crud.delete(db=db, id=1),
+        'connection_get_multi_by_url_id': (
+            lambda: client_con_crud.get_multi_by_url_id(db=db, url_id=1)
+        ),
+        'connection_create': lambda: client_con_crud.create(
+            db=db, data_in={'client_info': 'Mozilla/5.0', 'url_id': 1}
+        ),
+    }
+    for name, factory in statements.items():
+        cases[f'stmnt_{name}'] = run_async(factory)
+    return cases
+
+
+def measure(func: Callable, repeat: int, min_time: float) -> float:
+    '''Возвращает лучшее время одного вызова в микросекундах.'''
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    number = max(number, int(number * min_time / 0.2))
+    best = min(timer.repeat(repeat=repeat, number=number))
+    return best / number * 1e6
+
+
+def check_thresholds(
+    results: Dict[str, float],
+    thresholds: Dict[str, float],
+    factor: float
+) -> List[str]:
+    '''Возвращает список операций, превысивших порог.'''
+    failed = []
+    for name, value in results.items():
+        limit = thresholds.get(name)
+        if limit is not None and value > limit * factor:
+            failed.append(
+                f'{name}: {value:.1f} us > {limit * factor:.1f} us'
+            )
+    return failed
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Microbenchmarks')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=0.2)
+    parser.add_argument('--factor', type=float, default=1.0)
+    parser.add_argument('--filter', default='')
+    parser.add_argument('--output', default='micro.json')
+    parser.add_argument('--update-thresholds', action='store_true')
+    return parser.parse_args(argv)
+
+
+def main(args: argparse.Namespace) -> int:
+    results: Dict[str, Any] = {}
+    for name, func in build_cases().items():
+        if args.filter in name:
+            results[name] = round(measure(func, args.repeat, args.min_time), 2)
+            print(f'{name:40} {results[name]:>12.2f} us')
+
+    savings = {
+        fast: round(results[slow] - results[fast], 2)
+        for fast, slow in COMPARISONS.items()
+        if fast in results and slow in results
+    }
+    for name, value in savings.items():
+        print(f'saved per request by {name}: {value:.2f} us')
+
+    write_report(
+        args.output,
+        {'unit': 'us', 'results': results, 'savings': savings}
+    )
+
+    thresholds = {}
+    if os.path.exists(THRESHOLDS_PATH):
+        with open(THRESHOLDS_PATH, encoding='utf-8') as file:
+            thresholds = json.load(file)
+
+    if args.update_thresholds:
+        thresholds.update({
+            name: round(value * THRESHOLDS_HEADROOM, 1)
+            for name, value in results.items()
+        })
+        with open(THRESHOLDS_PATH, 'w', encoding='utf-8') as file:
+            json.dump(thresholds, file, indent=2, sort_keys=True)
+        return 0
+
+    failed = check_thresholds(results, thresholds, args.factor)
+    for line in failed:
+        print(f'REGRESSION {line}', file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(parse_args()))
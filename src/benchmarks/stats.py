@@ -0,0 +1,56 @@
+import json
+import math
+import subprocess
+from datetime import datetime
+from typing import Any, Dict, List, Sequence
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    '''Возвращает перцентиль pct (0-100) по методу ближайшего ранга.'''
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(math.ceil(pct / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def summarize(
+    latencies: List[float],
+    errors: int,
+    elapsed: float
+) -> Dict[str, Any]:
+    '''Собирает сводку по латентностям одного сценария в миллисекундах.'''
+    count = len(latencies)
+    return {
+        'requests': count,
+        'errors': errors,
+        'elapsed_s': round(elapsed, 4),
+        'rps': round(count / elapsed, 2) if elapsed else 0.0,
+        'mean_ms': round(sum(latencies) / count * 1000, 3) if count else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+def current_commit() -> str:
+    '''Возвращает хэш текущего коммита или пустую строку.'''
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            stderr=subprocess.DEVNULL,
+            text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def write_report(path: str, report: Dict[str, Any]) -> None:
+    '''Сохраняет отчет в json вместе с коммитом и временем запуска.'''
+    report = {
+        'commit': current_commit(),
+        'created': datetime.utcnow().isoformat(),
+        **report
+    }
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
@@ -1,9 +1,12 @@
 import os
 from logging import config
+from typing import Literal
 
 from fastapi.security.oauth2 import OAuth2PasswordBearer
 from passlib.context import CryptContext
+from pydantic import model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
+from sqlalchemy.engine import make_url
 
 from .logger import LOGGING_CONFIG
 
@@ -41,12 +44,104 @@ class AppSettings(BaseSettings):
     CRYPTO_ALGORITHM: str
     ACCESS_TOKEN_EXPIRE_MUNITES: int
     TESTING_MODE: bool
+    # пул соединений с базой
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    # продакшн-режим сервера: python src/main.py --mode prod
+    SERVER_WORKERS: int = 1
+    SERVER_BACKLOG: int = 2048
+    SERVER_KEEPALIVE_TIMEOUT: int = 30
+    SERVER_GRACEFUL_TIMEOUT: int = 30
+    # кэш переадресаций и прогрев при старте
+    REDIRECT_CACHE_BACKEND: Literal['local', 'shared'] = 'local'
+    REDIRECT_CACHE_SIZE: int = 10000
+    REDIRECT_CACHE_TTL: float = 60
+    # max-age постоянной переадресации, если он не задан у ссылки
+    PERMANENT_REDIRECT_MAX_AGE: int = 86400
+    SHARED_CACHE_PATH: str = '/dev/shm/url_shortener_redirects'
+    SHARED_CACHE_SLOTS: int = 65536
+    SHARED_CACHE_ARENA_BYTES: int = 32 * 1024 * 1024
+    WARMUP_POOL_CONNECTIONS: int = 5
+    WARMUP_TOP_URLS: int = 1000
+    # поиск популярных ссылок (count-min sketch) и админы
+    HOT_SKETCH_WIDTH: int = 16384
+    HOT_SKETCH_DEPTH: int = 4
+    HOT_TOP_K: int = 100
+    HOT_WINDOW: int = 100000
+    ADMIN_USERNAMES: str = ''
+    # инвалидация кэшей между процессами через LISTEN/NOTIFY
+    INVALIDATION_CHANNEL: str = 'url_invalidation'
+    INVALIDATION_RECONNECT_SECONDS: float = 1
+    INVALIDATION_HEALTHCHECK_SECONDS: float = 15
+    # фильтр Блума существующих коротких ссылок
+    BLOOM_CAPACITY: int = 1_000_000
+    BLOOM_ERROR_RATE: float = 0.01
+    BLOOM_MAX_BYTES: int = 16 * 1024 * 1024
+    BLOOM_REBUILD_SECONDS: int = 3600
+    # перенос давно удаленных ссылок в архив
+    COMPACTION_GRACE_SECONDS: int = 7 * 24 * 60 * 60
+    COMPACTION_BATCH_SIZE: int = 500
+    COMPACTION_INTERVAL_SECONDS: int = 3600
+    # удаление истекших ссылок
+    EXPIRY_SWEEP_SECONDS: int = 60
+    EXPIRY_SWEEP_BATCH_SIZE: int = 1000
+    # кэш отсутствующих коротких ссылок
+    NEGATIVE_CACHE_SIZE: int = 10000
+    NEGATIVE_CACHE_TTL: float = 30
+    # кэш ответов на повторное создание ссылки без владельца
+    DEDUP_CACHE_SIZE: int = 10000
+    DEDUP_CACHE_TTL: float = 30
+    # журнал медленных запросов и доля запросов, для которых берется план
+    SLOW_QUERY_THRESHOLD_MS: float = 100
+    SLOW_QUERY_EXPLAIN_RATE: float = 0.1
+    SLOW_QUERY_MAX_FINGERPRINTS: int = 200
+    # трансляция переходов: очередь зрителя и интервал keepalive
+    STREAM_QUEUE_SIZE: int = 100
+    STREAM_HEARTBEAT_SECONDS: float = 15
+    # уникальные посетители: точность HyperLogLog и интервал сохранения
+    VISITOR_SKETCH_PRECISION: int = 12
+    VISITOR_FLUSH_SECONDS: float = 60
+    # кэш сводной статистики переходов по ссылке
+    SUMMARY_CACHE_SIZE: int = 1000
+    SUMMARY_CACHE_TTL: float = 10
+    # холодное хранение переходов старше COLD_STORAGE_AFTER_MONTHS месяцев,
+    # пустой COLD_STORAGE_DIR отключает выгрузку; каталог должен быть
+    # общим для всех процессов и хостов
+    COLD_STORAGE_DIR: str = ''
+    COLD_STORAGE_AFTER_MONTHS: int = 3
+    COLD_STORAGE_BATCH_SIZE: int = 100
+    COLD_STORAGE_INTERVAL_SECONDS: int = 86400
+    # генератор коротких кодов: у каждого узла свой SNOWFLAKE_NODE_ID,
+    # воркеры узла занимают младшие SNOWFLAKE_WORKER_BITS бит номера
+    SNOWFLAKE_NODE_ID: int = 0
+    SNOWFLAKE_NODE_BITS: int = 10
+    SNOWFLAKE_WORKER_BITS: int = 4
+    SNOWFLAKE_SEQUENCE_BITS: int = 12
+    SNOWFLAKE_EPOCH_MS: int = 1704067200000
+    SNOWFLAKE_MAX_CLOCK_SKEW_MS: int = 50
+    SNOWFLAKE_LOCK_DIR: str = '/dev/shm'
 
     model_config = SettingsConfigDict(
         env_file='.env',
         env_file_encoding='utf-8'
     )
 
+    @model_validator(mode='after')
+    def check_snowflake_node(self) -> 'AppSettings':
+        '''
+        Проверяет, что номер узла помещается в свои биты.
+
+        Без проверки ошибка всплыла бы только при создании первой ссылки.
+        '''
+        node_bits = self.SNOWFLAKE_NODE_BITS - self.SNOWFLAKE_WORKER_BITS
+        assert node_bits >= 0, (
+            'SNOWFLAKE_WORKER_BITS must not exceed SNOWFLAKE_NODE_BITS'
+        )
+        assert 0 <= self.SNOWFLAKE_NODE_ID < 1 << node_bits, (
+            f'SNOWFLAKE_NODE_ID must be in [0, {1 << node_bits})'
+        )
+        return self
+
 
 app_settings = AppSettings()
 
@@ -61,3 +156,8 @@ sa_url = (
     if app_settings.TESTING_MODE
     else app_settings.POSTGRES_DSN
 )
+
+# тот же url для прямого подключения asyncpg
+pg_dsn = make_url(sa_url).set(drivername='postgresql').render_as_string(
+    hide_password=False
+)
@@ -1,13 +1,25 @@
+from sqlalchemy import text
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 
-from core.config import sa_url
+from core.config import app_settings, sa_url
+from db.slow_queries import SlowQueryLog
 
 engine = create_async_engine(
     url=sa_url,
-    future=True
+    future=True,
+    pool_size=app_settings.DB_POOL_SIZE,
+    max_overflow=app_settings.DB_MAX_OVERFLOW
 )
 
+# замер всех запросов и журнал медленных
+slow_query_log = SlowQueryLog(
+    threshold=app_settings.SLOW_QUERY_THRESHOLD_MS / 1000,
+    explain_rate=app_settings.SLOW_QUERY_EXPLAIN_RATE,
+    max_fingerprints=app_settings.SLOW_QUERY_MAX_FINGERPRINTS
+)
+slow_query_log.install(engine.sync_engine)
+
 async_session = sessionmaker(
     bind=engine,
     class_=AsyncSession,
@@ -19,3 +31,9 @@ async def get_session() -> AsyncSession:
     '''Генерирует асинхронную сессию для работы с бд.'''
     async with async_session() as session:
         yield session
+
+
+async def check_connection() -> None:
+    '''Открывает первое соединение пула и проверяет доступность базы.'''
+    async with engine.connect() as connection:
+        await connection.execute(text('SELECT 1'))
@@ -0,0 +1,196 @@
+import asyncio
+import logging
+import math
+import random
+import re
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import orjson
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+logger = logging.getLogger(__name__)
+
+EXPLAINABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')
+_LITERALS = re.compile(
+    r"'(?:[^']|'')*'"
+    r'|\$\d+(?:::[A-Z]+(?: (?:WITHOUT|WITH) TIME ZONE)?(?:\[\])?)?'
+    r'|\b\d+(?:\.\d+)?\b'
+)
+_LISTS = re.compile(r'\bIN \(\s*\?(?:\s*,\s*\?)*\s*\)', re.IGNORECASE)
+_SPACES = re.compile(r'\s+')
+
+
+def fingerprint(statement: str) -> str:
+    '''
+    Приводит запрос к виду без значений.
+
+    Строки, числа и параметры заменяются на ?, списки IN (?, ?, ...)
+    сворачиваются в (...), поэтому запросы, различающиеся только
+    значениями, попадают в одну группу.
+    '''
+    normalized = _LITERALS.sub('?', _SPACES.sub(' ', statement).strip())
+    return _LISTS.sub('IN (...)', normalized)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    '''Перцентиль pct (0-100) по методу ближайшего ранга.'''
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(math.ceil(pct / 100 * len(ordered)), 1) - 1]
+
+
+class QueryStats:
+    '''Медленные выполнения запросов одного вида.'''
+
+    def __init__(self, statement: str, samples: int):
+        self.statement = statement
+        self.count = 0
+        self.total = 0.0
+        self.durations: Deque[float] = deque(maxlen=samples)
+        self.plan: Optional[Any] = None
+
+    def add(self, duration: float) -> None:
+        self.count += 1
+        self.total += duration
+        self.durations.append(duration)
+
+    def to_dict(self) -> Dict[str, Any]:
+        durations = list(self.durations)
+        return {
+            'fingerprint': self.statement,
+            'count': self.count,
+            'total_ms': round(self.total * 1000, 3),
+            'p50_ms': round(percentile(durations, 50) * 1000, 3),
+            'p95_ms': round(percentile(durations, 95) * 1000, 3),
+            'p99_ms': round(percentile(durations, 99) * 1000, 3),
+            'max_ms': round(max(durations, default=0) * 1000, 3),
+            'plan': self.plan,
+        }
+
+
+class SlowQueryLog:
+    '''
+    Журнал медленных запросов процесса.
+
+    Каждый запрос к базе замеряется через события движка, запросы
+    дольше threshold секунд пишутся в лог без значений параметров
+    и группируются по отпечатку. Для доли explain_rate медленных
+    запросов фоновая задача получает план через EXPLAIN (FORMAT JSON)
+    на отдельном соединении, запрос при этом повторно не выполняется.
+    '''
+
+    def __init__(
+        self,
+        threshold: float,
+        explain_rate: float = 0,
+        max_fingerprints: int = 200,
+        samples: int = 256,
+        explain_queue_size: int = 16
+    ):
+        self.threshold = threshold
+        self.explain_rate = explain_rate
+        self.max_fingerprints = max_fingerprints
+        self.samples = samples
+        self._stats: Dict[str, QueryStats] = {}
+        self._explain_queue: asyncio.Queue = asyncio.Queue(
+            maxsize=explain_queue_size
+        )
+
+    def install(self, engine: Engine) -> None:
+        '''Подключает замеры к событиям движка.'''
+        event.listen(engine, 'before_cursor_execute', self._before_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_execute)
+
+    def _before_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ) -> None:
+        context.slow_query_start = time.perf_counter()
+
+    def _after_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ) -> None:
+        duration = time.perf_counter() - context.slow_query_start
+        if duration >= self.threshold and not context.execution_options.get(
+            'skip_slow_query_log'
+        ):
+            self.record(statement, duration, parameters, executemany)
+
+    def record(
+        self,
+        statement: str,
+        duration: float,
+        parameters: Any = None,
+        executemany: bool = False
+    ) -> QueryStats:
+        '''Учитывает медленное выполнение запроса.'''
+        key = fingerprint(statement)
+        stats = self._stats.get(key)
+        if stats is None:
+            if len(self._stats) >= self.max_fingerprints:
+                rarest = min(self._stats, key=lambda k: self._stats[k].count)
+                del self._stats[rarest]
+            stats = self._stats[key] = QueryStats(key, self.samples)
+        stats.add(duration)
+        count = len(parameters) if parameters else 0
+        logger.warning(
+            f'Slow query {duration * 1000:.1f} ms: {key} '
+            f'[{count} parameters redacted]'
+        )
+        if (
+            not executemany
+            and statement.lstrip().upper().startswith(EXPLAINABLE)
+            and random.random() < self.explain_rate
+        ):
+            try:
+                self._explain_queue.put_nowait((key, statement, parameters))
+            except asyncio.QueueFull:
+                pass
+        return stats
+
+    def top(self, limit: int) -> List[Dict[str, Any]]:
+        '''Возвращает limit видов запросов с наибольшим общим временем.'''
+        return [
+            stats.to_dict() for stats in sorted(
+                self._stats.values(), key=lambda item: item.total,
+                reverse=True
+            )[:limit]
+        ]
+
+    def clear(self) -> None:
+        self._stats.clear()
+
+    async def explain(
+        self,
+        engine: AsyncEngine,
+        key: str,
+        statement: str,
+        parameters: Tuple
+    ) -> None:
+        '''Сохраняет план запроса, не выполняя его.'''
+        async with engine.connect() as connection:
+            connection = await connection.execution_options(
+                skip_slow_query_log=True
+            )
+            result = await connection.exec_driver_sql(
+                f'EXPLAIN (ANALYZE off, FORMAT JSON) {statement}',
+                parameters
+            )
+            plan = result.scalar_one()
+            await connection.rollback()
+        stats = self._stats.get(key)
+        if stats is not None:
+            stats.plan = orjson.loads(plan) if isinstance(plan, str) else plan
+
+    async def run_explainer(self, engine: AsyncEngine) -> None:
+        '''Получает планы отобранных медленных запросов.'''
+        while True:
+            key, statement, parameters = await self._explain_queue.get()
+            try:
+                await self.explain(engine, key, statement, parameters)
+            except Exception as err:
+                logger.error(f'Error explaining slow query {key}: {err}')
@@ -0,0 +1,366 @@
+'''
+Массовый импорт ссылок из CSV или NDJSON.
+
+Запуск из корня проекта:
+
+    PYTHONPATH=src python -m importer.bulk links.csv
+
+Каждая строка содержит original_url и необязательные code (короткий
+код ссылки), owner (имя пользователя) и type (public или private).
+Файл читается потоково пачками по --chunk-size строк, строки проверяются
+правилами CreateUrl, пачка загружается через COPY во временную таблицу
+и одним INSERT ... SELECT переносится в url. Уже существующие ссылки
+(по коду или по нормализованному original_url владельца) пропускаются,
+поэтому повторный импорт той же пачки ничего не дублирует. Сам original_url
+сохраняется так, как записан в файле.
+
+Каждая пачка коммитится вместе с уведомлениями о новых ссылках
+и новыми версиями списков ссылок их владельцев, поэтому воркеры видят
+импортированные ссылки сразу, а не после конца импорта.
+После каждой пачки в файл --checkpoint записывается число обработанных
+строк, и прерванный импорт продолжается с места остановки.
+Строки с ошибками и с неизвестным владельцем пишутся в --rejects.
+'''
+import argparse
+import asyncio
+import csv
+import logging
+import os
+import re
+import sys
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+import asyncpg
+import orjson
+from pydantic import ValidationError
+
+from core.config import HOST_URL, pg_dsn
+from models.schemas.db_schemas import CreateUrl
+from models.schemas.utils import UrlTypes, normalize_url
+from services.cache.invalidation import InvalidationEvents, invalidation_bus
+from services.utils.ids import get_id_generator
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('csv', 'ndjson')
+CODE_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+STAGING_COLUMNS = (
+    'line', 'original_url', 'original_url_key', 'short_url', 'owner',
+    'url_type'
+)
+
+CREATE_STAGING = '''
+CREATE TEMP TABLE IF NOT EXISTS url_import_staging (
+    line bigint NOT NULL,
+    original_url text NOT NULL,
+    original_url_key text NOT NULL,
+    short_url text NOT NULL,
+    owner text,
+    url_type text NOT NULL
+) ON COMMIT DELETE ROWS
+'''
+
+# Как и в POST /, ссылка не дублируется, если у того же владельца
+# (или среди ссылок без владельца) уже есть url с тем же
+# нормализованным ключом original_url_key.
+# В той же транзакции увеличиваются версии списков ссылок владельцев
+# и для каждой новой ссылки отправляется NOTIFY $1 с событием $2:
+# после коммита пачки воркеры сразу добавляют коды в фильтр Блума.
+MERGE_STAGING = '''
+WITH candidates AS (
+    SELECT DISTINCT ON (s.original_url_key, s.owner)
+        s.original_url, s.original_url_key, s.short_url, s.owner,
+        s.url_type, u.id AS user_id
+    FROM url_import_staging s
+    LEFT JOIN "user" u ON u.username = s.owner
+    ORDER BY s.original_url_key, s.owner, s.line
+), inserted AS (
+    INSERT INTO url (original_url, original_url_key, short_url, created,
+                     deleted, url_type, user_id)
+    SELECT c.original_url, c.original_url_key, c.short_url,
+           timezone('utc', now()), false, c.url_type, c.user_id
+    FROM candidates c
+    WHERE (c.owner IS NULL OR c.user_id IS NOT NULL)
+      AND NOT EXISTS (
+          SELECT 1 FROM url e
+          WHERE e.original_url_key = c.original_url_key
+            AND (e.user_id = c.user_id
+                 OR e.user_id IS NULL AND c.user_id IS NULL)
+      )
+    ON CONFLICT DO NOTHING
+    RETURNING short_url, user_id
+), owners AS (
+    UPDATE "user" SET version = version + 1
+    WHERE id IN (SELECT user_id FROM inserted)
+), notified AS (
+    SELECT pg_notify($1, json_build_object(
+        'event', $2::text, 'short_url', short_url, 'user_id', user_id
+    )::text)
+    FROM inserted
+)
+SELECT
+    (SELECT count(*) FROM notified),
+    (SELECT coalesce(array_agg(s.line), '{}') FROM url_import_staging s
+     WHERE s.owner IS NOT NULL
+       AND NOT EXISTS (SELECT 1 FROM "user" u WHERE u.username = s.owner))
+'''
+
+Record = Tuple[int, str, str, str, Optional[str], str]
+
+
+@dataclass
+class ImportStats:
+    '''Счетчики импорта, они же содержимое файла контрольной точки.'''
+    rows: int = 0
+    inserted: int = 0
+    skipped: int = 0
+    rejected: int = 0
+
+
+def detect_format(path: str) -> str:
+    return 'ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv'
+
+
+def read_rows(path: str, fmt: str) -> Iterator[Optional[Dict[str, Any]]]:
+    '''
+    Построчно читает файл.
+
+    Для нечитаемой строки NDJSON отдает None, чтобы номера строк
+    не сбивались.
+    '''
+    with open(path, newline='', encoding='utf-8') as source:
+        if fmt == 'csv':
+            yield from csv.DictReader(source)
+            return
+        for line in source:
+            if not line.strip():
+                continue
+            try:
+                row = orjson.loads(line)
+            except orjson.JSONDecodeError:
+                yield None
+                continue
+            yield row if isinstance(row, dict) else None
+
+
+def validate_row(
+    line: int,
+    row: Optional[Dict[str, Any]]
+) -> Tuple[Optional[Record], Optional[str]]:
+    '''
+    Проверяет строку правилами CreateUrl.
+
+    Возвращает запись для временной таблицы или текст ошибки.
+    Приватная ссылка без владельца, как и в POST /, становится публичной.
+    '''
+    if row is None:
+        return None, 'Malformed row'
+    try:
+        data = CreateUrl(
+            original_url=row.get('original_url'),
+            url_type=row.get('type') or UrlTypes.PUBLIC
+        )
+    except ValidationError as err:
+        return None, err.errors()[0]['msg']
+    owner = row.get('owner') or None
+    url_type = data.url_type.lower()
+    if owner is None and url_type == UrlTypes.PRIVATE:
+        url_type = UrlTypes.PUBLIC
+    code = row.get('code') or get_id_generator().next_code()
+    if not CODE_PATTERN.match(code):
+        return None, 'Code must contain only letters, digits, "-" and "_"'
+    return (
+        line, data.original_url, normalize_url(data.original_url),
+        f'{HOST_URL}/{code}', owner, url_type
+    ), None
+
+
+def read_checkpoint(path: str) -> ImportStats:
+    if not os.path.exists(path):
+        return ImportStats()
+    with open(path, 'rb') as checkpoint:
+        return ImportStats(**orjson.loads(checkpoint.read()))
+
+
+def write_checkpoint(path: str, stats: ImportStats) -> None:
+    '''Атомарно перезаписывает контрольную точку.'''
+    temporary = f'{path}.tmp'
+    with open(temporary, 'wb') as checkpoint:
+        checkpoint.write(orjson.dumps(asdict(stats)))
+    os.replace(temporary, path)
+
+
+async def load_chunk(
+    connection: asyncpg.Connection,
+    records: List[Record]
+) -> Tuple[int, List[int]]:
+    '''
+    Загружает пачку через COPY и переносит ее в url одной транзакцией.
+
+    Возвращает число вставленных ссылок и номера строк с неизвестным
+    владельцем.
+    '''
+    async with connection.transaction():
+        await connection.copy_records_to_table(
+            'url_import_staging',
+            records=records,
+            columns=STAGING_COLUMNS
+        )
+        inserted, unknown_owners = await connection.fetchrow(
+            MERGE_STAGING,
+            invalidation_bus.channel,
+            InvalidationEvents.CREATE
+        )
+    return inserted, unknown_owners
+
+
+def write_reject(
+    rejects: BinaryIO,
+    line: int,
+    error: str,
+    row: Optional[Dict[str, Any]]
+) -> None:
+    rejects.write(orjson.dumps(
+        {'line': line, 'error': error, 'row': row}
+    ) + b'\n')
+
+
+def record_row(record: Record) -> Dict[str, Any]:
+    '''Восстанавливает строку файла по записи временной таблицы.'''
+    _, original_url, _, short_url, owner, url_type = record
+    return {
+        'original_url': original_url,
+        'code': short_url.removeprefix(f'{HOST_URL}/'),
+        'owner': owner,
+        'type': url_type
+    }
+
+
+async def import_file(
+    path: str,
+    fmt: Optional[str] = None,
+    chunk_size: int = 10000,
+    checkpoint_path: Optional[str] = None,
+    rejects_path: Optional[str] = None,
+    restart: bool = False,
+    dsn: str = pg_dsn
+) -> ImportStats:
+    '''
+    Импортирует файл ссылок, продолжая с контрольной точки.
+
+    В памяти держится не больше одной пачки строк.
+    '''
+    fmt = fmt or detect_format(path)
+    checkpoint_path = checkpoint_path or f'{path}.checkpoint'
+    rejects_path = rejects_path or f'{path}.rejects'
+    stats = ImportStats() if restart else read_checkpoint(checkpoint_path)
+    resume_from = stats.rows
+    if resume_from:
+        logger.info(f'Resuming import of {path} from row {resume_from}')
+    start = time.perf_counter()
+    connection = await asyncpg.connect(dsn)
+    try:
+        await connection.execute(CREATE_STAGING)
+        with open(rejects_path, 'ab') as rejects:
+            records: List[Record] = []
+            rejected = 0
+            line = resume_from
+            for line, row in enumerate(read_rows(path, fmt), start=1):
+                if line <= resume_from:
+                    continue
+                record, error = validate_row(line, row)
+                if error is None:
+                    records.append(record)
+                else:
+                    rejected += 1
+                    write_reject(rejects, line, error, row)
+                if len(records) + rejected < chunk_size:
+                    continue
+                await _flush_chunk(
+                    connection, records, rejected, line, stats, rejects
+                )
+                rejects.flush()
+                write_checkpoint(checkpoint_path, stats)
+                report_progress(stats, resume_from, start)
+                records, rejected = [], 0
+            if line > stats.rows:
+                await _flush_chunk(
+                    connection, records, rejected, line, stats, rejects
+                )
+                write_checkpoint(checkpoint_path, stats)
+                report_progress(stats, resume_from, start)
+    finally:
+        await connection.close()
+    return stats
+
+
+async def _flush_chunk(
+    connection: asyncpg.Connection,
+    records: List[Record],
+    rejected: int,
+    last_line: int,
+    stats: ImportStats,
+    rejects: BinaryIO
+) -> None:
+    inserted, unknown_owners = (
+        await load_chunk(connection, records) if records else (0, [])
+    )
+    if unknown_owners:
+        unknown = set(unknown_owners)
+        for record in records:
+            if record[0] in unknown:
+                write_reject(
+                    rejects, record[0], 'Unknown owner', record_row(record)
+                )
+    stats.rows = last_line
+    stats.inserted += inserted
+    stats.rejected += rejected + len(unknown_owners)
+    stats.skipped += len(records) - inserted - len(unknown_owners)
+
+
+def report_progress(
+    stats: ImportStats,
+    resumed_from: int,
+    start: float
+) -> None:
+    elapsed = time.perf_counter() - start
+    rate = (stats.rows - resumed_from) / elapsed if elapsed else 0
+    message = (
+        f'{stats.rows} rows: {stats.inserted} inserted, '
+        f'{stats.skipped} skipped, {stats.rejected} rejected, '
+        f'{rate:.0f} rows/s'
+    )
+    logger.info(message)
+    print(message, file=sys.stderr, flush=True)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Bulk import of short urls')
+    parser.add_argument('path')
+    parser.add_argument('--format', choices=FORMATS)
+    parser.add_argument('--chunk-size', type=int, default=10000)
+    parser.add_argument('--checkpoint')
+    parser.add_argument('--rejects')
+    parser.add_argument(
+        '--restart',
+        action='store_true',
+        help='ignore the checkpoint and start from the first row'
+    )
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    arguments = parse_args()
+    result = asyncio.run(
+        import_file(
+            path=arguments.path,
+            fmt=arguments.format,
+            chunk_size=arguments.chunk_size,
+            checkpoint_path=arguments.checkpoint,
+            rejects_path=arguments.rejects,
+            restart=arguments.restart
+        )
+    )
+    print(orjson.dumps(asdict(result)).decode())
@@ -1,3 +1,11 @@
+import argparse
+import asyncio
+import contextlib
+import functools
+import logging
+from importlib.util import find_spec
+from typing import List
+
 import uvicorn
 from fastapi import FastAPI
 from fastapi.responses import ORJSONResponse
@@ -6,12 +14,116 @@ from fastapi.middleware.cors import CORSMiddleware
 from api.v1.base import api_router
 from core.config import app_settings
 from core.logger import LOGGING_CONFIG
+from db.db import (
+    async_session, check_connection, engine, slow_query_log
+)
+from services.cache.invalidation import invalidation_bus
+from services.cache.short_urls import short_url_filter
+from services.cold_storage import cold_storage, export_cold_clicks
+from services.compaction import (
+    compact_deleted, run_periodically, sweep_expired
+)
+from services.visitors import flush_visitors
+from services.warmup import warmup
+
+logger = logging.getLogger(__name__)
+
+
+def maintenance_tasks() -> List[asyncio.Task]:
+    '''Запускает периодические задачи обслуживания базы.'''
+    jobs = [
+        (
+            functools.partial(
+                compact_deleted,
+                session_factory=async_session,
+                grace=app_settings.COMPACTION_GRACE_SECONDS,
+                batch_size=app_settings.COMPACTION_BATCH_SIZE
+            ),
+            app_settings.COMPACTION_INTERVAL_SECONDS
+        ),
+        (
+            functools.partial(
+                sweep_expired,
+                session_factory=async_session,
+                batch_size=app_settings.EXPIRY_SWEEP_BATCH_SIZE
+            ),
+            app_settings.EXPIRY_SWEEP_SECONDS
+        ),
+        (
+            functools.partial(flush_visitors, session_factory=async_session),
+            app_settings.VISITOR_FLUSH_SECONDS
+        ),
+    ]
+    if cold_storage.enabled:
+        jobs.append((
+            functools.partial(
+                export_cold_clicks,
+                session_factory=async_session,
+                months=app_settings.COLD_STORAGE_AFTER_MONTHS,
+                batch_size=app_settings.COLD_STORAGE_BATCH_SIZE
+            ),
+            app_settings.COLD_STORAGE_INTERVAL_SECONDS
+        ))
+    return [
+        asyncio.create_task(run_periodically(job, interval=interval))
+        for job, interval in jobs
+    ]
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    '''
+    Жизненный цикл процесса приложения.
+
+    При старте открывает пул соединений и готовит кэши,
+    при остановке завершает фоновые задачи и закрывает пул.
+    '''
+    await check_connection()
+    tasks = [
+        asyncio.create_task(invalidation_bus.run()),
+        asyncio.create_task(slow_query_log.run_explainer(engine))
+    ]
+    try:
+        await asyncio.wait_for(invalidation_bus.ready.wait(), timeout=5)
+    except asyncio.TimeoutError:
+        logger.error('Invalidation listener is not ready, caches may lag.')
+    try:
+        await warmup()
+    except Exception as err:
+        logger.error(f'Error warming up: {err}', exc_info=True)
+    try:
+        async with async_session() as db:
+            await short_url_filter.rebuild(db=db)
+    except Exception as err:
+        logger.error(f'Error building bloom filter: {err}', exc_info=True)
+    tasks.append(
+        asyncio.create_task(
+            short_url_filter.run_periodic_rebuild(
+                session_factory=async_session,
+                interval=app_settings.BLOOM_REBUILD_SECONDS
+            )
+        )
+    )
+    tasks.extend(maintenance_tasks())
+    logger.info('Application started.')
+    yield
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    try:
+        await flush_visitors(session_factory=async_session)
+    except Exception as err:
+        logger.error(f'Error saving visitor sketches: {err}', exc_info=True)
+    await engine.dispose()
+    logger.info('Application stopped, database pool closed.')
+
 
 app = FastAPI(
     title=app_settings.PROJECT_TITLE,
     docs_url='/api/openapi',
     openapi_url='/api/openapi.json',
     default_response_class=ORJSONResponse,
+    lifespan=lifespan,
 )
 
 app.include_router(api_router)
@@ -24,7 +136,8 @@ app.add_middleware(
 )
 
 
-if __name__ == '__main__':
+def run_dev() -> None:
+    '''Запускает однопроцессный сервер с перезагрузкой при изменениях.'''
     uvicorn.run(
         'main:app',
         host=app_settings.PROJECT_HOST,
@@ -32,3 +145,43 @@ if __name__ == '__main__':
         reload=True,
         log_config=LOGGING_CONFIG
     )
+
+
+def run_prod(workers: int) -> None:
+    '''
+    Запускает сервер с несколькими процессами-воркерами.
+
+    uvloop и httptools используются, если установлены.
+    По SIGTERM воркеры перестают принимать соединения и дожидаются
+    текущих запросов не дольше SERVER_GRACEFUL_TIMEOUT секунд.
+    '''
+    loop = 'uvloop' if find_spec('uvloop') else 'asyncio'
+    http = 'httptools' if find_spec('httptools') else 'h11'
+    logger.info(f'Starting {workers} workers with {loop} loop, {http} http.')
+    uvicorn.run(
+        'main:app',
+        host=app_settings.PROJECT_HOST,
+        port=app_settings.PROJECT_PORT,
+        workers=workers,
+        loop=loop,
+        http=http,
+        backlog=app_settings.SERVER_BACKLOG,
+        timeout_keep_alive=app_settings.SERVER_KEEPALIVE_TIMEOUT,
+        timeout_graceful_shutdown=app_settings.SERVER_GRACEFUL_TIMEOUT,
+        proxy_headers=True,
+        access_log=False,
+        log_config=LOGGING_CONFIG
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Url shortener server')
+    parser.add_argument('--mode', choices=('dev', 'prod'), default='dev')
+    parser.add_argument(
+        '--workers', type=int, default=app_settings.SERVER_WORKERS
+    )
+    args = parser.parse_args()
+    if args.mode == 'prod':
+        run_prod(workers=args.workers)
+    else:
+        run_dev()
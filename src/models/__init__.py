@@ -2,8 +2,15 @@ __all__ = [
     'Base',
     'Url',
     'ClientConnection',
-    'User'
+    'ClientConnectionArchive',
+    'ClientConnectionCold',
+    'User',
+    'UrlArchive',
+    'UrlVisitorSketch'
 ]
 
 from .base import Base
-from .models import ClientConnection, Url, User
+from .models import (
+    ClientConnection, ClientConnectionArchive, ClientConnectionCold, Url,
+    UrlArchive, UrlVisitorSketch, User
+)
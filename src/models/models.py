@@ -1,7 +1,7 @@
 from datetime import datetime
 from sqlalchemy import (
-    Boolean, CheckConstraint, Column, DateTime, Integer, ForeignKey, String,
-    UniqueConstraint
+    Boolean, CheckConstraint, Column, Date, DateTime, Index, Integer,
+    ForeignKey, LargeBinary, String, UniqueConstraint, text
 )
 from sqlalchemy.orm import relationship
 
@@ -15,6 +15,8 @@ class Url(Base):
 
     id = Column(Integer, primary_key=True)
     original_url = Column(String, nullable=False)
+    # нормализованный original_url для поиска дублей
+    original_url_key = Column(String, nullable=False)
     short_url = Column(String, unique=True)
     created = Column(DateTime, default=datetime.utcnow, index=True)
     connections = relationship(
@@ -23,13 +25,23 @@ class Url(Base):
         lazy='selectin'
     )
     deleted = Column(Boolean, default=False)
+    deleted_at = Column(DateTime, nullable=True)
+    expires_at = Column(DateTime, nullable=True)
     url_type = Column(
         String,
         default='public',
         nullable=False
     )
+    redirect_type = Column(
+        String,
+        default='temporary',
+        server_default='temporary',
+        nullable=False
+    )
+    cache_max_age = Column(Integer, nullable=True)
+    version = Column(Integer, default=1, server_default='1', nullable=False)
 
-    user_id = Column(ForeignKey('user.id'), nullable=True)
+    user_id = Column(ForeignKey('user.id'), nullable=True, index=True)
     user = relationship('User', back_populates='urls')
 
     __table_args__ = (
@@ -40,6 +52,28 @@ class Url(Base):
             r'url_type in ("private", "public")',
             name='url_type_constraint',
         ),
+        CheckConstraint(
+            "redirect_type in ('temporary', 'permanent')",
+            name='redirect_type_constraint',
+        ),
+        CheckConstraint(
+            "redirect_type = 'temporary' or url_type = 'public'",
+            name='permanent_redirect_public_constraint',
+        ),
+        CheckConstraint(
+            "redirect_type = 'temporary' or expires_at is null",
+            name='permanent_redirect_no_expiry_constraint',
+        ),
+        Index(
+            'ix_url_original_url_key_user_id', 'original_url_key', 'user_id'
+        ),
+        Index(
+            'ix_url_expires_at_live',
+            'expires_at',
+            postgresql_where=text(
+                'expires_at IS NOT NULL AND deleted IS NOT TRUE'
+            ),
+        ),
     )
 
 
@@ -54,6 +88,17 @@ class ClientConnection(Base):
     url_id = Column(ForeignKey('url.id'))
     url = relationship('Url', back_populates='connections')
 
+    __table_args__ = (
+        Index('ix_client_connection_url_id_id', 'url_id', 'id'),
+        Index('ix_client_connection_url_id_time', 'url_id', 'time'),
+        Index(
+            'ix_client_connection_url_id_client_info', 'url_id', 'client_info'
+        ),
+        Index(
+            'ix_client_connection_time_brin', 'time', postgresql_using='brin'
+        ),
+    )
+
 
 class User(Base):
     '''Таблица для пользователей.'''
@@ -62,4 +107,61 @@ class User(Base):
     id = Column(Integer, primary_key=True)
     username = Column(String(100), nullable=False, unique=True)
     password = Column(String, nullable=False)
+    version = Column(Integer, default=1, server_default='1', nullable=False)
     urls = relationship('Url', back_populates='user', lazy='selectin')
+
+
+class UrlArchive(Base):
+    '''Архив давно удаленных url.'''
+
+    __tablename__ = 'url_archive'
+
+    id = Column(Integer, primary_key=True)
+    original_url = Column(String, nullable=False)
+    short_url = Column(String, index=True)
+    created = Column(DateTime)
+    deleted_at = Column(DateTime)
+    expires_at = Column(DateTime)
+    url_type = Column(String, nullable=False)
+    redirect_type = Column(String, nullable=False)
+    cache_max_age = Column(Integer, nullable=True)
+    user_id = Column(Integer, nullable=True)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+
+class ClientConnectionArchive(Base):
+    '''Архив переходов по давно удаленным url.'''
+
+    __tablename__ = 'client_connection_archive'
+
+    id = Column(Integer, primary_key=True)
+    time = Column(DateTime)
+    client_info = Column(String)
+    url_id = Column(Integer, index=True)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+
+class UrlVisitorSketch(Base):
+    '''Скетч HyperLogLog уникальных посетителей url за день.'''
+
+    __tablename__ = 'url_visitor_sketch'
+
+    url_id = Column(
+        ForeignKey('url.id', ondelete='CASCADE'), primary_key=True
+    )
+    day = Column(Date, primary_key=True)
+    registers = Column(LargeBinary, nullable=False)
+
+
+class ClientConnectionCold(Base):
+    '''Таблица переходов за месяц, выгруженных в файл холодного хранения.'''
+
+    __tablename__ = 'client_connection_cold'
+
+    url_id = Column(Integer, primary_key=True)
+    month = Column(Date, primary_key=True)
+    clicks = Column(Integer, nullable=False)
+    first_click = Column(DateTime, nullable=False)
+    last_click = Column(DateTime, nullable=False)
+    path = Column(String, nullable=False)
+    exported_at = Column(DateTime, default=datetime.utcnow)
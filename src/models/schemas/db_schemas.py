@@ -1,10 +1,18 @@
-from datetime import datetime
-from typing import Annotated, List, Optional
+from datetime import date, datetime
+from typing import Annotated, Any, Dict, List, Optional
 
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
 from pydantic.functional_validators import AfterValidator
 
-from .utils import check_url_type
+from .utils import (
+    RedirectTypes, check_expires_at, check_redirect_type,
+    check_required_url_type, check_url_type
+)
+
+# максимальное время кэширования постоянной переадресации, год
+MAX_CACHE_AGE = 365 * 24 * 60 * 60
+# максимальное число ссылок в пакетной операции
+MAX_BATCH_URLS = 5000
 
 
 class BaseUrl(BaseModel):
@@ -15,21 +23,88 @@ class BaseUrl(BaseModel):
 class CreateUrl(BaseUrl):
     '''Схема данных при создании ссылки.'''
     url_type: Annotated[Optional[str], AfterValidator(check_url_type)]
+    redirect_type: Annotated[
+        str, AfterValidator(check_redirect_type)
+    ] = RedirectTypes.TEMPORARY
+    cache_max_age: Annotated[
+        Optional[int], Field(ge=0, le=MAX_CACHE_AGE)
+    ] = None
+    expires_at: Annotated[
+        Optional[datetime], AfterValidator(check_expires_at)
+    ] = None
 
 
 class UpdateUrl(BaseModel):
-    '''Схема данных при обновлении ссылки.'''
+    '''
+    Схема данных при обновлении ссылки.
+
+    Записываются только переданные поля. Явный null очищает
+    cache_max_age и expires_at, а для обязательных url_type
+    и redirect_type означает, что они не меняются.
+    '''
     url_type: Annotated[Optional[str], AfterValidator(check_url_type)]
+    redirect_type: Annotated[
+        Optional[str], AfterValidator(check_redirect_type)
+    ] = None
+    cache_max_age: Annotated[
+        Optional[int], Field(ge=0, le=MAX_CACHE_AGE)
+    ] = None
+    expires_at: Annotated[
+        Optional[datetime], AfterValidator(check_expires_at)
+    ] = None
+
+    def changes(self) -> Dict[str, Any]:
+        '''Возвращает поля для записи в базу.'''
+        return {
+            key: value
+            for key, value in self.model_dump(exclude_unset=True).items()
+            if value is not None or key in ('cache_max_age', 'expires_at')
+        }
+
+
+class BatchDeleteUrl(BaseModel):
+    '''Схема данных при пакетном удалении ссылок.'''
+    short_url_ids: Annotated[
+        List[str], Field(min_length=1, max_length=MAX_BATCH_URLS)
+    ]
+
+
+class BatchUpdateUrl(BatchDeleteUrl):
+    '''Схема данных при пакетном обновлении ссылок.'''
+    url_type: Annotated[str, AfterValidator(check_required_url_type)]
+
+
+class BatchResult(BaseModel):
+    '''Результат пакетной операции над одной ссылкой.'''
+    short_url_id: str
+    status: str
 
 
 class FullUrlBase(BaseModel):
-    '''Схема данных о ссылке в базе данных.'''
+    '''
+    Схема данных о ссылке в базе данных.
+
+    connections содержит только переходы из базы: выгруженные
+    в холодное хранение в него не попадают, полный список отдает
+    /status с full_info=1.
+    '''
     original_url: str
     short_url: str
     created: datetime
     url_type: str
+    redirect_type: str
+    cache_max_age: Optional[int]
+    expires_at: Optional[datetime]
     user_id: Optional[int]
-    connections: Optional[List['FullClientConnection']]
+    connections: Annotated[
+        Optional[List['FullClientConnection']],
+        Field(
+            description=(
+                'Clicks stored in the database only, clicks moved to '
+                'cold storage are listed by /status?full_info=1.'
+            )
+        )
+    ]
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -68,6 +143,28 @@ class FullClientConnection(FullClientConnectionBase):
     pass
 
 
+class UrlVisitorSketchBase(BaseModel):
+    '''Схема данных дневного скетча посетителей ссылки.'''
+    url_id: int
+    day: date
+    registers: bytes
+
+
+class UpdateUrlVisitorSketch(BaseModel):
+    '''Схема данных при обновлении скетча посетителей.'''
+    registers: bytes
+
+
+class ClientConnectionColdBase(BaseModel):
+    '''Схема данных о переходах за месяц в холодном хранении.'''
+    url_id: int
+    month: date
+    clicks: int
+    first_click: datetime
+    last_click: datetime
+    path: str
+
+
 class UserBase(BaseModel):
     '''Базовая схема пользователя.'''
     username: str
@@ -1,4 +1,8 @@
+from datetime import datetime, timezone
 from typing import Optional
+from urllib.parse import urlsplit, urlunsplit
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
 
 
 class UrlTypes:
@@ -7,6 +11,19 @@ class UrlTypes:
     PUBLIC = 'public'
 
 
+class BatchStatuses:
+    '''Результаты пакетной операции над ссылкой.'''
+    UPDATED = 'updated'
+    NOT_FOUND = 'not_found'
+    FORBIDDEN = 'forbidden'
+
+
+class RedirectTypes:
+    '''Возможные типы переадресации.'''
+    TEMPORARY = 'temporary'
+    PERMANENT = 'permanent'
+
+
 def check_url_type(url_type: Optional[str]) -> Optional[str]:
     '''Проверяет ограничения по типу url.'''
     if not url_type:
@@ -16,3 +33,71 @@ def check_url_type(url_type: Optional[str]) -> Optional[str]:
         f'url_type must be "{UrlTypes.PRIVATE}" or "{UrlTypes.PUBLIC}"'
     )
     return url_type
+
+
+def check_required_url_type(url_type: str) -> str:
+    '''Проверяет обязательный тип url и приводит его к нижнему регистру.'''
+    assert url_type, 'url_type must not be empty'
+    return check_url_type(url_type).lower()
+
+
+def check_redirect_type(redirect_type: Optional[str]) -> Optional[str]:
+    '''
+    Проверяет ограничения по типу переадресации.
+
+    Пустая строка не заменяется на None: колонка обязательная.
+    '''
+    if redirect_type is None:
+        return None
+
+    redirect_type = redirect_type.lower()
+    assert redirect_type in (
+        RedirectTypes.TEMPORARY, RedirectTypes.PERMANENT
+    ), (
+        f'redirect_type must be "{RedirectTypes.TEMPORARY}" '
+        f'or "{RedirectTypes.PERMANENT}"'
+    )
+    return redirect_type
+
+
+def check_expires_at(expires_at: Optional[datetime]) -> Optional[datetime]:
+    '''
+    Проверяет время истечения ссылки.
+
+    Время с часовым поясом переводится в UTC без пояса,
+    как хранятся все даты в базе.
+    '''
+    if expires_at is None:
+        return None
+
+    if expires_at.tzinfo is not None:
+        expires_at = expires_at.astimezone(timezone.utc).replace(tzinfo=None)
+    assert expires_at > datetime.utcnow(), 'expires_at must be in the future'
+    return expires_at
+
+
+def normalize_url(original_url: str) -> str:
+    '''
+    Приводит url к ключу поиска дублей.
+
+    Схема и хост не зависят от регистра, порт по умолчанию
+    и пустой путь ничего не меняют. Остальные части url
+    сравниваются как есть. Ключ хранится в url.original_url_key
+    и служит ключом кэша ссылок без владельца, а сам original_url
+    сохраняется в том виде, в котором его прислали.
+    '''
+    try:
+        parts = urlsplit(original_url.strip())
+        port = parts.port
+    except ValueError:
+        return original_url
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if parts.username is not None or parts.password is not None:
+        return original_url
+    netloc = host if port in (None, DEFAULT_PORTS.get(scheme)) else (
+        f'{host}:{port}'
+    )
+    return urlunsplit(
+        (scheme, netloc, parts.path or '/', parts.query, parts.fragment)
+    )
@@ -0,0 +1,53 @@
+import math
+from hashlib import blake2b
+from typing import Iterator, Optional
+
+
+class BloomFilter:
+    '''
+    Фильтр Блума для строковых ключей.
+
+    Размер битового массива и число хэш-функций считаются по ожидаемому
+    числу элементов и допустимой доле ложноположительных ответов.
+    max_bytes ограничивает память, доля ошибок при этом растет.
+    '''
+
+    def __init__(
+        self,
+        capacity: int,
+        error_rate: float,
+        max_bytes: Optional[int] = None
+    ):
+        capacity = max(capacity, 1)
+        bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        if max_bytes:
+            bits = min(bits, max_bytes * 8)
+        self.size = max(bits, 8)
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray(math.ceil(self.size / 8))
+
+    def _positions(self, key: str) -> Iterator[int]:
+        '''Номера битов ключа по схеме двойного хэширования.'''
+        digest = blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        for index in range(self.hashes):
+            yield (first + index * second) % self.size
+
+    def add(self, key: str) -> None:
+        '''Добавляет ключ в фильтр.'''
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(
+            self._bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(key)
+        )
+
+    @property
+    def nbytes(self) -> int:
+        '''Размер битового массива в байтах.'''
+        return len(self._bits)
@@ -0,0 +1,108 @@
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, Optional, Tuple
+
+from .invalidation import Event, InvalidationEvents, invalidation_bus
+from core.config import app_settings
+from models.schemas.utils import normalize_url
+
+
+class AnonymousUrlCache:
+    '''
+    Кэш ответов на создание ссылки без владельца.
+
+    Ключ - нормализованный original_url, тот же, по которому
+    дубль ищется в базе (url.original_url_key), значение - готовое тело
+    ответа с уже существующей ссылкой. Запись удаляется при изменении
+    или удалении ссылки, в том числе истекшей, и живет не дольше
+    ttl секунд и не дольше самой ссылки, поэтому история переходов
+    в ответе отстает не больше чем на ttl.
+    '''
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl: float,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: OrderedDict[str, Tuple[str, bytes, float]] = (
+            OrderedDict()
+        )
+        self._keys: Dict[str, str] = {}
+
+    def get(self, original_url: str) -> Optional[bytes]:
+        '''Возвращает тело ответа для original_url или None.'''
+        key = normalize_url(original_url)
+        item = self._entries.get(key)
+        if item is None:
+            return None
+        short_url, body, expires = item
+        if expires <= self._clock():
+            self._pop(key)
+            return None
+        self._entries.move_to_end(key)
+        return body
+
+    def set(
+        self,
+        original_url: str,
+        short_url: str,
+        body: bytes,
+        expires_at: Optional[datetime] = None
+    ) -> None:
+        '''
+        Запоминает ответ, вытесняя самые давно использованные.
+
+        Запись ссылки с expires_at истекает вместе с ссылкой.
+        '''
+        if self.max_size <= 0:
+            return
+        ttl = self.ttl
+        if expires_at is not None:
+            ttl = min(
+                ttl, (expires_at - datetime.utcnow()).total_seconds()
+            )
+        key = normalize_url(original_url)
+        self._pop(key)
+        if ttl <= 0:
+            return
+        self._entries[key] = (short_url, body, self._clock() + ttl)
+        self._keys[short_url] = key
+        while len(self._entries) > self.max_size:
+            self._pop(next(iter(self._entries)))
+
+    def evict(self, short_url: str) -> None:
+        '''Удаляет запись после изменения или удаления ссылки.'''
+        key = self._keys.get(short_url)
+        if key is not None:
+            self._pop(key)
+
+    def _pop(self, key: str) -> None:
+        item = self._entries.pop(key, None)
+        if item is not None:
+            self._keys.pop(item[0], None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._keys.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+anonymous_urls = AnonymousUrlCache(
+    max_size=app_settings.DEDUP_CACHE_SIZE,
+    ttl=app_settings.DEDUP_CACHE_TTL
+)
+
+
+def _on_invalidation(event: Event) -> None:
+    if event['event'] != InvalidationEvents.CREATE and event['short_url']:
+        anonymous_urls.evict(event['short_url'])
+
+
+invalidation_bus.subscribe(_on_invalidation, on_flush=anonymous_urls.clear)
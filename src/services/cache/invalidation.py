@@ -0,0 +1,192 @@
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+import asyncpg
+import orjson
+from sqlalchemy import String, bindparam, func, select
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import app_settings, pg_dsn
+
+logger = logging.getLogger(__name__)
+
+Event = Dict[str, Any]
+
+# запрос собирается один раз, канал и текст передаются параметрами
+NOTIFY_STATEMENT = select(
+    func.pg_notify(
+        bindparam('channel', type_=String),
+        bindparam('payload', type_=String)
+    )
+)
+
+
+class InvalidationEvents:
+    '''Типы событий шины инвалидации.'''
+    CREATE = 'create'
+    UPDATE = 'update'
+    DELETE = 'delete'
+    # массовое изменение, подписчики полностью очищают кэши
+    FLUSH = 'flush'
+
+
+class InvalidationBus:
+    '''
+    Шина инвалидации кэшей между процессами через LISTEN/NOTIFY.
+
+    Изменения ссылок отправляют NOTIFY в той же транзакции, поэтому
+    уведомление приходит только после коммита. Каждый процесс держит
+    одно выделенное соединение asyncpg с LISTEN и передает события
+    подписчикам. После переподключения уведомления могли потеряться,
+    поэтому подписчики получают команду полной очистки.
+    '''
+
+    def __init__(
+        self,
+        dsn: str,
+        channel: str,
+        reconnect_delay: float = 1,
+        max_reconnect_delay: float = 30,
+        healthcheck_interval: float = 15
+    ):
+        self.dsn = dsn
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.healthcheck_interval = healthcheck_interval
+        self.ready = asyncio.Event()
+        self._handlers: List[Callable[[Event], None]] = []
+        self._flush_handlers: List[Callable[[], None]] = []
+
+    def subscribe(
+        self,
+        handler: Callable[[Event], None],
+        on_flush: Optional[Callable[[], None]] = None
+    ) -> None:
+        '''Подписывает обработчик событий и обработчик полной очистки.'''
+        self._handlers.append(handler)
+        if on_flush is not None:
+            self._flush_handlers.append(on_flush)
+
+    async def notify(
+        self,
+        db: AsyncSession,
+        event: str,
+        short_url: Optional[str] = None,
+        user_id: Optional[int] = None
+    ) -> None:
+        '''Отправляет уведомление в текущей транзакции сессии.'''
+        payload = orjson.dumps(
+            {'event': event, 'short_url': short_url, 'user_id': user_id}
+        ).decode()
+        await db.execute(
+            NOTIFY_STATEMENT, {'channel': self.channel, 'payload': payload}
+        )
+
+    async def notify_many(
+        self,
+        db: AsyncSession,
+        event: str,
+        short_urls: List[str],
+        user_id: Optional[int] = None
+    ) -> None:
+        '''Отправляет уведомления о нескольких ссылках одним запросом.'''
+        if not short_urls:
+            return
+        payloads = [
+            orjson.dumps(
+                {'event': event, 'short_url': short_url, 'user_id': user_id}
+            ).decode()
+            for short_url in short_urls
+        ]
+        payload = func.unnest(
+            bindparam('payloads', payloads, type_=ARRAY(String))
+        ).column_valued('payload')
+        await db.execute(select(func.pg_notify(self.channel, payload)))
+
+    def dispatch(self, event: Event) -> None:
+        '''Передает событие всем подписчикам.'''
+        for handler in self._handlers:
+            try:
+                handler(event)
+            except Exception as err:
+                logger.error(
+                    f'Error handling invalidation {event}: {err}',
+                    exc_info=True
+                )
+
+    def flush(self) -> None:
+        '''Полностью очищает кэши подписчиков.'''
+        logger.warning('Flushing local caches after invalidation gap.')
+        for handler in self._flush_handlers:
+            handler()
+
+    def _on_notification(self, connection, pid, channel, payload) -> None:
+        try:
+            event = orjson.loads(payload)
+        except orjson.JSONDecodeError:
+            logger.error(f'Malformed invalidation payload {payload}')
+            return
+        if event.get('event') == InvalidationEvents.FLUSH:
+            self.flush()
+            return
+        self.dispatch(event)
+
+    async def _listen(
+        self,
+        connection: asyncpg.Connection,
+        flush: bool
+    ) -> None:
+        '''
+        Слушает канал, пока соединение живо.
+
+        Очистка после переподключения выполняется уже после LISTEN,
+        чтобы не пропустить изменения между очисткой и подпиской.
+        '''
+        closed = asyncio.Event()
+        connection.add_termination_listener(lambda _: closed.set())
+        await connection.add_listener(self.channel, self._on_notification)
+        if flush:
+            self.flush()
+        self.ready.set()
+        logger.info(f'Listening for invalidations on {self.channel}')
+        while not closed.is_set():
+            try:
+                await asyncio.wait_for(
+                    closed.wait(),
+                    timeout=self.healthcheck_interval
+                )
+            except asyncio.TimeoutError:
+                await connection.execute('SELECT 1')
+
+    async def run(self) -> None:
+        '''Поддерживает LISTEN-соединение, переподключаясь при обрыве.'''
+        delay = self.reconnect_delay
+        listened_before = False
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(self.dsn)
+                delay = self.reconnect_delay
+                await self._listen(connection, flush=listened_before)
+            except Exception as err:
+                logger.error(f'Invalidation listener error: {err}')
+            finally:
+                if self.ready.is_set():
+                    listened_before = True
+                    self.ready.clear()
+                    logger.warning('Invalidation listener disconnected.')
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+
+invalidation_bus = InvalidationBus(
+    dsn=pg_dsn,
+    channel=app_settings.INVALIDATION_CHANNEL,
+    reconnect_delay=app_settings.INVALIDATION_RECONNECT_SECONDS,
+    healthcheck_interval=app_settings.INVALIDATION_HEALTHCHECK_SECONDS
+)
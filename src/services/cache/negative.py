@@ -0,0 +1,51 @@
+import time
+from collections import OrderedDict
+from typing import Callable
+
+
+class NegativeCache:
+    '''
+    Кэш ключей, которых точно нет в базе.
+
+    Каждый ключ живет ttl секунд, при переполнении
+    вытесняются самые старые записи.
+    '''
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl: float,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: OrderedDict[str, float] = OrderedDict()
+
+    def add(self, key: str) -> None:
+        '''Запоминает отсутствующий ключ.'''
+        if self.max_size <= 0:
+            return
+        self._entries[key] = self._clock() + self.ttl
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def discard(self, key: str) -> None:
+        '''Удаляет ключ, например после создания ссылки с этим кодом.'''
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __contains__(self, key: str) -> bool:
+        expires = self._entries.get(key)
+        if expires is None:
+            return False
+        if expires <= self._clock():
+            del self._entries[key]
+            return False
+        return True
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,131 @@
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, NamedTuple, Optional, Tuple
+
+from .invalidation import Event, InvalidationEvents, invalidation_bus
+from .sketch import hot_urls
+from core.config import app_settings
+
+
+class CachedUrl(NamedTuple):
+    '''Минимальные данные ссылки, нужные для переадресации.'''
+    id: int
+    short_url: str
+    original_url: str
+    url_type: str
+    user_id: Optional[int]
+    deleted: bool = False
+    redirect_type: str = 'temporary'
+    cache_max_age: Optional[int] = None
+    expires_at: Optional[datetime] = None
+
+
+def entry_ttl(entry: CachedUrl, ttl: float) -> float:
+    '''Ограничивает время жизни записи временем истечения ссылки.'''
+    if entry.expires_at is None:
+        return ttl
+    return min(ttl, (entry.expires_at - datetime.utcnow()).total_seconds())
+
+
+class RedirectCache:
+    '''
+    LRU-кэш ссылок для переадресации в памяти процесса.
+
+    Записи живут не дольше ttl секунд, поэтому изменения ссылки,
+    сделанные другим процессом, видны не позже чем через ttl.
+    Запись истекающей ссылки живет не дольше самой ссылки.
+    Если задана политика admission, в заполненный кэш новая запись
+    попадает, только если политика предпочитает ее вытесняемой.
+    '''
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl: float,
+        clock: Callable[[], float] = time.monotonic,
+        admission: Optional[Callable[[str, str], bool]] = None
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self._admission = admission
+        self._entries: OrderedDict[str, Tuple[CachedUrl, float]] = (
+            OrderedDict()
+        )
+
+    def get(self, short_url: str) -> Optional[CachedUrl]:
+        '''Возвращает запись из кэша или None.'''
+        item = self._entries.get(short_url)
+        if item is None:
+            return None
+        entry, expires = item
+        if expires <= self._clock():
+            del self._entries[short_url]
+            return None
+        self._entries.move_to_end(short_url)
+        return entry
+
+    def set(self, entry: CachedUrl, ttl: Optional[float] = None) -> None:
+        '''Сохраняет запись, вытесняя самые давно использованные.'''
+        ttl = entry_ttl(entry, self.ttl if ttl is None else ttl)
+        if self.max_size <= 0 or ttl <= 0:
+            return
+        if (
+            self._admission is not None
+            and entry.short_url not in self._entries
+            and len(self._entries) >= self.max_size
+        ):
+            victim = next(iter(self._entries))
+            if not self._admission(entry.short_url, victim):
+                return
+        expires = self._clock() + ttl
+        self._entries[entry.short_url] = (entry, expires)
+        self._entries.move_to_end(entry.short_url)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def evict(self, short_url: str) -> None:
+        '''Удаляет запись после изменения или удаления ссылки.'''
+        self._entries.pop(short_url, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def create_redirect_cache():
+    '''
+    Создает кэш переадресаций по настройке REDIRECT_CACHE_BACKEND.
+
+    local - отдельный кэш в памяти каждого процесса,
+    shared - общий для всех воркеров хоста кэш в разделяемой памяти.
+    Вытеснение в обоих случаях проходит через политику TinyLFU.
+    '''
+    if app_settings.REDIRECT_CACHE_BACKEND == 'shared':
+        from .shared import SharedRedirectCache
+        return SharedRedirectCache(
+            path=app_settings.SHARED_CACHE_PATH,
+            slots=app_settings.SHARED_CACHE_SLOTS,
+            arena_bytes=app_settings.SHARED_CACHE_ARENA_BYTES,
+            ttl=app_settings.REDIRECT_CACHE_TTL,
+            admission=hot_urls.admit
+        )
+    return RedirectCache(
+        max_size=app_settings.REDIRECT_CACHE_SIZE,
+        ttl=app_settings.REDIRECT_CACHE_TTL,
+        admission=hot_urls.admit
+    )
+
+
+redirect_cache = create_redirect_cache()
+
+
+def _on_invalidation(event: Event) -> None:
+    if event['event'] != InvalidationEvents.CREATE and event['short_url']:
+        redirect_cache.evict(event['short_url'])
+
+
+invalidation_bus.subscribe(_on_invalidation, on_flush=redirect_cache.clear)
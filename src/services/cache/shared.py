@@ -0,0 +1,309 @@
+import fcntl
+import mmap
+import os
+import struct
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from hashlib import blake2b
+from typing import Callable, Iterator, Optional, Tuple
+
+from .redirect import CachedUrl, entry_ttl
+
+MAGIC = b'URC3'
+# magic, число слотов, размер области строк, занято в области строк,
+# поколение (нечетное во время полной очистки), число занятых слотов
+# (включая истекшие, но еще не перезаписанные)
+HEADER = struct.Struct('<4sIQQQQ')
+HEADER_SIZE = 64
+# seq, хэш ключа, истечение, id, user_id, смещение и длина ключа,
+# смещение и длина адреса, флаги, max-age постоянной переадресации,
+# время истечения ссылки (0 - бессрочная)
+SLOT = struct.Struct('<IQdqqQIQIB3xid')
+SEQ = struct.Struct('<I')
+GENERATION_OFFSET = 4 + 4 + 8 + 8
+
+MAX_PROBES = 16
+READ_RETRIES = 8
+PRIVATE_FLAG = 1
+PERMANENT_FLAG = 2
+NO_USER = -1
+NO_MAX_AGE = -1
+
+
+def key_hash(key: bytes) -> int:
+    '''Одинаковый во всех процессах ненулевой хэш ключа.'''
+    value = int.from_bytes(blake2b(key, digest_size=8).digest(), 'little')
+    return value or 1
+
+
+class SharedRedirectCache:
+    '''
+    Кэш переадресаций в общей памяти для всех воркеров хоста.
+
+    Файл (по умолчанию в /dev/shm) отображается в память каждого процесса.
+    В нем хранится хэш-таблица с открытой адресацией из слотов
+    фиксированного размера; короткая ссылка и адрес переадресации
+    дописываются в общую область строк, слот хранит их смещения.
+
+    Читатели не берут блокировок: каждый слот защищен seqlock-счетчиком,
+    нечетное значение означает, что слот сейчас пишется, а изменившееся
+    значение - что прочитанные данные надо перечитать.
+    Писатели разных процессов сериализуются через flock на файле.
+    Когда область строк заполняется, таблица очищается целиком
+    со сменой поколения в заголовке. Если в окне пробирования нет
+    свободного слота, живая запись вытесняется только с согласия
+    политики admission.
+    Порядок записей в память гарантирует модель памяти x86-64.
+    '''
+
+    def __init__(
+        self,
+        path: str,
+        slots: int,
+        arena_bytes: int,
+        ttl: float,
+        clock=time.time,
+        admission: Optional[Callable[[str, str], bool]] = None
+    ):
+        self.path = path
+        self.slots = slots
+        self.arena_bytes = arena_bytes
+        self.ttl = ttl
+        self._clock = clock
+        self._admission = admission
+        self._slots_offset = HEADER_SIZE
+        self._arena_offset = HEADER_SIZE + slots * SLOT.size
+        self._size = self._arena_offset + arena_bytes
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        with self._locked():
+            if os.fstat(self._fd).st_size != self._size:
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, self._size)
+            self._mm = mmap.mmap(self._fd, self._size)
+            magic, stored_slots, stored_arena, *_ = HEADER.unpack_from(
+                self._mm, 0
+            )
+            if (magic, stored_slots, stored_arena) != (
+                MAGIC, slots, arena_bytes
+            ):
+                self._mm[:self._arena_offset] = bytes(self._arena_offset)
+                HEADER.pack_into(
+                    self._mm, 0, MAGIC, slots, arena_bytes, 0, 0, 0
+                )
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _header(self) -> Tuple:
+        return HEADER.unpack_from(self._mm, 0)
+
+    def _generation(self) -> int:
+        return struct.unpack_from('<Q', self._mm, GENERATION_OFFSET)[0]
+
+    def _slot_offset(self, index: int) -> int:
+        return self._slots_offset + index * SLOT.size
+
+    def _probe(self, hashed: int) -> Iterator[int]:
+        start = hashed % self.slots
+        for step in range(min(MAX_PROBES, self.slots)):
+            yield self._slot_offset((start + step) % self.slots)
+
+    def _read_slot(self, offset: int, key: bytes) -> Tuple:
+        '''
+        Читает слот без блокировки.
+
+        Возвращает поля слота и адрес, если слот занят ключом key,
+        иначе пустой кортеж.
+        '''
+        for _ in range(READ_RETRIES):
+            generation = self._generation()
+            seq = SEQ.unpack_from(self._mm, offset)[0]
+            if seq & 1 or generation & 1:
+                continue
+            fields = SLOT.unpack_from(self._mm, offset)
+            hashed, key_off, key_len = fields[1], fields[5], fields[6]
+            stored_key = self._mm[key_off:key_off + key_len]
+            target = self._mm[fields[7]:fields[7] + fields[8]]
+            if (
+                SEQ.unpack_from(self._mm, offset)[0] != seq
+                or self._generation() != generation
+            ):
+                continue
+            if hashed == 0 or stored_key != key:
+                return ()
+            return fields, target
+        return ()
+
+    def get(self, short_url: str) -> Optional[CachedUrl]:
+        '''Возвращает запись из общей памяти или None.'''
+        key = short_url.encode()
+        for offset in self._probe(key_hash(key)):
+            found = self._read_slot(offset, key)
+            if not found:
+                continue
+            fields, target = found
+            _, _, expires, url_id, user_id, *_, flags, max_age, expires_at = (
+                fields
+            )
+            if expires <= self._clock():
+                return None
+            return CachedUrl(
+                id=url_id,
+                short_url=short_url,
+                original_url=target.decode(),
+                url_type='private' if flags & PRIVATE_FLAG else 'public',
+                user_id=None if user_id == NO_USER else user_id,
+                redirect_type=(
+                    'permanent' if flags & PERMANENT_FLAG else 'temporary'
+                ),
+                cache_max_age=None if max_age == NO_MAX_AGE else max_age,
+                expires_at=(
+                    datetime.fromtimestamp(expires_at, timezone.utc).
+                    replace(tzinfo=None) if expires_at else None
+                )
+            )
+        return None
+
+    def _write_slot(self, offset: int, *fields) -> None:
+        '''Пишет слот под seqlock; вызывается под блокировкой файла.'''
+        seq = SEQ.unpack_from(self._mm, offset)[0]
+        SEQ.pack_into(self._mm, offset, seq + 1)
+        SLOT.pack_into(self._mm, offset, seq + 1, *fields)
+        SEQ.pack_into(self._mm, offset, seq + 2)
+
+    def _find_slot(
+        self,
+        key: bytes,
+        hashed: int
+    ) -> Tuple[int, bool, Optional[bytes]]:
+        '''
+        Ищет слот для записи ключа.
+
+        Просматривает все слоты окна пробирования: сначала слот
+        с этим ключом, затем свободный или истекший, иначе слот,
+        который истекает раньше остальных. Возвращает смещение слота,
+        был ли он уже занят какой-либо записью и ключ живой записи,
+        которую придется вытеснить.
+        '''
+        now = self._clock()
+        free, free_used = None, False
+        victim, victim_expires = None, None
+        for offset in self._probe(hashed):
+            fields = SLOT.unpack_from(self._mm, offset)
+            if fields[1] == hashed:
+                stored_key = self._mm[fields[5]:fields[5] + fields[6]]
+                if stored_key == key:
+                    return offset, True, None
+            if fields[1] == 0 or fields[2] <= now:
+                if free is None or (free_used and fields[1] == 0):
+                    free, free_used = offset, fields[1] != 0
+            elif victim is None or fields[2] < victim_expires:
+                victim, victim_expires = offset, fields[2]
+        if free is not None:
+            return free, free_used, None
+        fields = SLOT.unpack_from(self._mm, victim)
+        return victim, True, self._mm[fields[5]:fields[5] + fields[6]]
+
+    def _allocate(self, data: bytes) -> Optional[int]:
+        '''Дописывает data в область строк и возвращает смещение.'''
+        magic, slots, arena, used, generation, count = self._header()
+        if used + len(data) > arena:
+            return None
+        offset = self._arena_offset + used
+        self._mm[offset:offset + len(data)] = data
+        HEADER.pack_into(
+            self._mm, 0, magic, slots, arena, used + len(data),
+            generation, count
+        )
+        return offset
+
+    def _set_count(self, delta: int) -> None:
+        magic, slots, arena, used, generation, count = self._header()
+        HEADER.pack_into(
+            self._mm, 0, magic, slots, arena, used, generation,
+            max(count + delta, 0)
+        )
+
+    def set(self, entry: CachedUrl, ttl: Optional[float] = None) -> None:
+        '''Сохраняет запись в общей памяти.'''
+        key = entry.short_url.encode()
+        target = entry.original_url.encode()
+        if len(key) + len(target) > self.arena_bytes:
+            return
+        ttl = entry_ttl(entry, self.ttl if ttl is None else ttl)
+        if ttl <= 0:
+            return
+        hashed = key_hash(key)
+        expires = self._clock() + ttl
+        expires_at = (
+            entry.expires_at.replace(tzinfo=timezone.utc).timestamp()
+            if entry.expires_at else 0
+        )
+        flags = PRIVATE_FLAG if entry.url_type == 'private' else 0
+        if entry.redirect_type == 'permanent':
+            flags |= PERMANENT_FLAG
+        with self._locked():
+            offset, occupied, victim = self._find_slot(key, hashed)
+            if (
+                victim is not None
+                and self._admission is not None
+                and not self._admission(entry.short_url, victim.decode())
+            ):
+                return
+            key_off = self._allocate(key + target)
+            if key_off is None:
+                self._flush()
+                occupied = False
+                key_off = self._allocate(key + target)
+            self._write_slot(
+                offset, hashed, expires, entry.id,
+                NO_USER if entry.user_id is None else entry.user_id,
+                key_off, len(key), key_off + len(key), len(target), flags,
+                NO_MAX_AGE if entry.cache_max_age is None
+                else entry.cache_max_age,
+                expires_at
+            )
+            if not occupied:
+                self._set_count(1)
+
+    def evict(self, short_url: str) -> None:
+        '''Удаляет запись из общей памяти.'''
+        key = short_url.encode()
+        hashed = key_hash(key)
+        with self._locked():
+            for offset in self._probe(hashed):
+                fields = SLOT.unpack_from(self._mm, offset)
+                stored_key = self._mm[fields[5]:fields[5] + fields[6]]
+                if fields[1] == hashed and stored_key == key:
+                    self._write_slot(offset, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0)
+                    self._set_count(-1)
+
+    def _flush(self) -> None:
+        '''Очищает таблицу целиком; вызывается под блокировкой файла.'''
+        magic, slots, arena, _, generation, _ = self._header()
+        HEADER.pack_into(
+            self._mm, 0, magic, slots, arena, 0, generation + 1, 0
+        )
+        self._mm[self._slots_offset:self._arena_offset] = bytes(
+            self._arena_offset - self._slots_offset
+        )
+        HEADER.pack_into(
+            self._mm, 0, magic, slots, arena, 0, generation + 2, 0
+        )
+
+    def clear(self) -> None:
+        with self._locked():
+            self._flush()
+
+    def close(self) -> None:
+        self._mm.close()
+        os.close(self._fd)
+
+    def __len__(self) -> int:
+        return self._header()[5]
@@ -0,0 +1,127 @@
+import asyncio
+import logging
+import time
+from typing import Callable, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .bloom import BloomFilter
+from .invalidation import Event, InvalidationEvents, invalidation_bus
+from .negative import NegativeCache
+from core.config import app_settings
+from services.entities import url_crud
+
+logger = logging.getLogger(__name__)
+
+
+class ShortUrlFilter:
+    '''
+    Фильтр Блума существующих коротких ссылок процесса.
+
+    Пока фильтр не построен, любая ссылка считается возможно существующей.
+    Удаленные ссылки остаются в фильтре до следующей перестройки.
+    '''
+
+    def __init__(
+        self,
+        capacity: int,
+        error_rate: float,
+        max_bytes: Optional[int] = None
+    ):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.max_bytes = max_bytes
+        self._filter: Optional[BloomFilter] = None
+        self._pending: Optional[List[str]] = None
+        self._rebuild_requested = asyncio.Event()
+
+    @property
+    def ready(self) -> bool:
+        return self._filter is not None
+
+    def add(self, short_url: str) -> None:
+        '''Добавляет созданную ссылку в фильтр.'''
+        if self._filter is not None:
+            self._filter.add(short_url)
+        if self._pending is not None:
+            self._pending.append(short_url)
+
+    def might_contain(self, short_url: str) -> bool:
+        '''False означает, что ссылки точно нет в базе.'''
+        return self._filter is None or short_url in self._filter
+
+    def invalidate(self) -> None:
+        '''
+        Отключает фильтр и просит перестроить его.
+
+        Нужна, если уведомления о созданных ссылках могли потеряться.
+        '''
+        self._filter = None
+        self._rebuild_requested.set()
+
+    async def rebuild(self, db: AsyncSession) -> None:
+        '''Строит новый фильтр потоковым запросом и подменяет текущий.'''
+        start = time.perf_counter()
+        fresh = BloomFilter(self.capacity, self.error_rate, self.max_bytes)
+        self._pending = []
+        try:
+            async for short_url in url_crud.stream_short_urls(db=db):
+                fresh.add(short_url)
+            for short_url in self._pending:
+                fresh.add(short_url)
+        finally:
+            self._pending = None
+        self._filter = fresh
+        logger.info(
+            f'Bloom filter rebuilt with {fresh.count} urls, '
+            f'{fresh.nbytes} bytes, {fresh.hashes} hashes '
+            f'in {time.perf_counter() - start:.3f}s'
+        )
+
+    async def run_periodic_rebuild(
+        self,
+        session_factory: Callable[[], AsyncSession],
+        interval: float
+    ) -> None:
+        '''Перестраивает фильтр каждые interval секунд или по запросу.'''
+        while True:
+            try:
+                await asyncio.wait_for(
+                    self._rebuild_requested.wait(),
+                    timeout=interval
+                )
+            except asyncio.TimeoutError:
+                pass
+            self._rebuild_requested.clear()
+            try:
+                async with session_factory() as db:
+                    await self.rebuild(db=db)
+            except Exception as err:
+                logger.error(
+                    f'Error rebuilding bloom filter: {err}', exc_info=True
+                )
+
+
+short_url_filter = ShortUrlFilter(
+    capacity=app_settings.BLOOM_CAPACITY,
+    error_rate=app_settings.BLOOM_ERROR_RATE,
+    max_bytes=app_settings.BLOOM_MAX_BYTES
+)
+negative_cache = NegativeCache(
+    max_size=app_settings.NEGATIVE_CACHE_SIZE,
+    ttl=app_settings.NEGATIVE_CACHE_TTL
+)
+
+
+def _on_invalidation(event: Event) -> None:
+    if event['event'] == InvalidationEvents.CREATE and event['short_url']:
+        short_url_filter.add(event['short_url'])
+        negative_cache.discard(event['short_url'])
+
+
+def _on_flush() -> None:
+    negative_cache.clear()
+    short_url_filter.invalidate()
+
+
+invalidation_bus.subscribe(_on_invalidation, on_flush=_on_flush)
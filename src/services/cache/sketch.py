@@ -0,0 +1,236 @@
+import heapq
+import math
+import sys
+from array import array
+from hashlib import blake2b
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from core.config import app_settings
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class CountMinSketch:
+    '''
+    Count-min sketch для приблизительного подсчета частот ключей.
+
+    Оценка никогда не меньше настоящего значения; ошибка сверху
+    ограничена шириной таблицы, вероятность ошибки - ее глубиной.
+    '''
+
+    def __init__(self, width: int, depth: int):
+        self.width = width
+        self.depth = depth
+        self._rows = [array('L', [0]) * width for _ in range(depth)]
+        # маска снимает старший бит каждого счетчика: при сдвиге всей
+        # строки как длинного числа туда попадает младший бит соседа
+        low = b'\xff' * (self._rows[0].itemsize - 1)
+        word = low + b'\x7f' if sys.byteorder == 'little' else b'\x7f' + low
+        self._halve_mask = int.from_bytes(word * width, sys.byteorder)
+
+    def _indexes(self, key: str) -> List[int]:
+        digest = blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [
+            (first + row * second) % self.width for row in range(self.depth)
+        ]
+
+    def add(self, key: str) -> int:
+        '''
+        Увеличивает счетчик ключа и возвращает новую оценку.
+
+        Консервативное обновление увеличивает только минимальные счетчики,
+        что уменьшает завышение оценок.
+        '''
+        indexes = self._indexes(key)
+        estimate = min(
+            row[index] for row, index in zip(self._rows, indexes)
+        ) + 1
+        for row, index in zip(self._rows, indexes):
+            if row[index] < estimate:
+                row[index] = estimate
+        return estimate
+
+    def estimate(self, key: str) -> int:
+        return min(
+            row[index] for row, index in zip(self._rows, self._indexes(key))
+        )
+
+    def halve(self) -> None:
+        '''
+        Уменьшает все счетчики вдвое, старые обращения весят меньше.
+
+        Вызывается посреди переадресации, поэтому строка сдвигается
+        целиком, а не циклом по счетчикам: с numpy на месте, без него
+        одной операцией над длинным числом.
+        '''
+        if np is not None:
+            for row in self._rows:
+                counters = np.frombuffer(row, dtype=f'u{row.itemsize}')
+                counters >>= 1
+            return
+        for number, row in enumerate(self._rows):
+            halved = int.from_bytes(row, sys.byteorder) >> 1
+            self._rows[number] = array(
+                row.typecode,
+                (halved & self._halve_mask).to_bytes(
+                    len(row) * row.itemsize, sys.byteorder
+                )
+            )
+
+
+class HeavyHitters:
+    '''
+    Самые частые ключи за последнее время.
+
+    Частоты считаются в count-min sketch, top_k самых частых ключей
+    хранятся в куче. Каждые window обращений все счетчики делятся
+    пополам, поэтому старые всплески постепенно забываются.
+    '''
+
+    def __init__(self, width: int, depth: int, top_k: int, window: int):
+        self.sketch = CountMinSketch(width=width, depth=depth)
+        self.top_k = top_k
+        self.window = window
+        self._counts: Dict[str, int] = {}
+        self._heap: List[Tuple[int, str]] = []
+        self._additions = 0
+
+    def record(self, key: str) -> None:
+        '''Учитывает обращение к ключу.'''
+        estimate = self.sketch.add(key)
+        if key in self._counts or len(self._counts) < self.top_k:
+            self._counts[key] = estimate
+            heapq.heappush(self._heap, (estimate, key))
+        elif estimate > self._min_count():
+            _, evicted = heapq.heappop(self._heap)
+            del self._counts[evicted]
+            self._counts[key] = estimate
+            heapq.heappush(self._heap, (estimate, key))
+        if len(self._heap) > 4 * self.top_k:
+            self._rebuild_heap()
+        self._additions += 1
+        if self._additions >= self.window:
+            self.decay()
+
+    def _min_count(self) -> int:
+        '''Минимальная частота в топе, устаревшие записи кучи удаляются.'''
+        while self._heap:
+            count, key = self._heap[0]
+            if self._counts.get(key) == count:
+                return count
+            heapq.heappop(self._heap)
+        return 0
+
+    def _rebuild_heap(self) -> None:
+        self._heap = [(count, key) for key, count in self._counts.items()]
+        heapq.heapify(self._heap)
+
+    def decay(self) -> None:
+        '''Делит все частоты пополам.'''
+        self.sketch.halve()
+        self._counts = {
+            key: count >> 1 for key, count in self._counts.items()
+            if count >> 1
+        }
+        self._rebuild_heap()
+        self._additions = 0
+
+    def estimate(self, key: str) -> int:
+        return self.sketch.estimate(key)
+
+    def admit(self, candidate: str, victim: str) -> bool:
+        '''
+        Политика допуска TinyLFU.
+
+        Новый ключ вытесняет старый из кэша, только если к нему
+        обращались чаще, поэтому разовые обращения сканеров
+        не выбивают из кэша популярные ссылки.
+        '''
+        return self.estimate(candidate) > self.estimate(victim)
+
+    def top(self, limit: int) -> List[Tuple[str, int]]:
+        '''Возвращает limit самых частых ключей по убыванию частоты.'''
+        return sorted(
+            self._counts.items(), key=lambda item: item[1], reverse=True
+        )[:limit]
+
+
+class HyperLogLog:
+    '''
+    HyperLogLog для оценки числа различных ключей.
+
+    Хранит 2 ** precision однобайтовых регистров (4 КБ при precision 12),
+    стандартная ошибка оценки около 1.04 / sqrt(2 ** precision).
+    Скетчи с одной точностью объединяются поэлементным максимумом,
+    и объединение оценивает число различных ключей во всех скетчах.
+    '''
+
+    def __init__(self, precision: int = 12, registers: Optional[bytes] = None):
+        self.precision = precision
+        self.size = 1 << precision
+        if registers is not None and len(registers) != self.size:
+            raise ValueError(f'Expected {self.size} registers')
+        self.registers = bytearray(registers or self.size)
+
+    def add(self, key: str) -> None:
+        hashed = int.from_bytes(
+            blake2b(key.encode(), digest_size=8).digest(), 'little'
+        )
+        index = hashed >> (64 - self.precision)
+        rest = hashed & ((1 << (64 - self.precision)) - 1)
+        rank = 64 - self.precision - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: 'HyperLogLog') -> 'HyperLogLog':
+        '''Добавляет в скетч ключи другого скетча.'''
+        if other.precision != self.precision:
+            raise ValueError('Cannot merge sketches of different precision')
+        # Поэлементный максимум сразу по всем регистрам как по длинным
+        # числам: регистр меньше 128, поэтому (a | 128) - b не занимает
+        # из соседнего байта, а старший бит байта равен a >= b.
+        mine = int.from_bytes(self.registers, 'little')
+        theirs = int.from_bytes(other.registers, 'little')
+        high_bits = int.from_bytes(b'\x80' * self.size, 'little')
+        mine_wins = (((mine | high_bits) - theirs) & high_bits) >> 7
+        merged = theirs ^ ((mine ^ theirs) & (mine_wins * 0xFF))
+        self.registers = bytearray(merged.to_bytes(self.size, 'little'))
+        return self
+
+    @classmethod
+    def union(
+        cls,
+        sketches: Iterable['HyperLogLog'],
+        precision: int = 12
+    ) -> 'HyperLogLog':
+        result = cls(precision)
+        for sketch in sketches:
+            result.merge(sketch)
+        return result
+
+    def count(self) -> int:
+        '''Оценивает число различных ключей.'''
+        alpha = 0.7213 / (1 + 1.079 / self.size)
+        estimate = alpha * self.size ** 2 / math.fsum(
+            2.0 ** -register for register in self.registers
+        )
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.size and zeros:
+            estimate = self.size * math.log(self.size / zeros)
+        return round(estimate)
+
+    def to_bytes(self) -> bytes:
+        return bytes(self.registers)
+
+
+hot_urls = HeavyHitters(
+    width=app_settings.HOT_SKETCH_WIDTH,
+    depth=app_settings.HOT_SKETCH_DEPTH,
+    top_k=app_settings.HOT_TOP_K,
+    window=app_settings.HOT_WINDOW
+)
@@ -0,0 +1,62 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from core.config import app_settings
+
+SummaryKey = Tuple[int, int, int]
+
+
+class SummaryCache:
+    '''
+    Кэш сводной статистики переходов по ссылкам.
+
+    Ключ - id и версия ссылки и размер топа user-agent, поэтому
+    изменение ссылки сразу делает запись ненужной. Новые переходы
+    запись не сбрасывают: сводка отстает не больше чем на ttl секунд.
+    '''
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl: float,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: OrderedDict[
+            SummaryKey, Tuple[Dict[str, Any], float]
+        ] = OrderedDict()
+
+    def get(self, key: SummaryKey) -> Optional[Dict[str, Any]]:
+        item = self._entries.get(key)
+        if item is None:
+            return None
+        summary, expires = item
+        if expires <= self._clock():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return summary
+
+    def set(self, key: SummaryKey, summary: Dict[str, Any]) -> None:
+        '''Запоминает сводку, вытесняя самые давно использованные.'''
+        if self.max_size <= 0:
+            return
+        self._entries[key] = (summary, self._clock() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+click_summaries = SummaryCache(
+    max_size=app_settings.SUMMARY_CACHE_SIZE,
+    ttl=app_settings.SUMMARY_CACHE_TTL
+)
@@ -0,0 +1,155 @@
+import asyncio
+import logging
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, Optional, Set
+
+import orjson
+
+from core.config import app_settings
+from services.cache.invalidation import (
+    Event, InvalidationEvents, invalidation_bus
+)
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    '''
+    Очередь событий одного зрителя.
+
+    Очередь ограничена max_size событиями: если зритель не успевает
+    читать, самые старые события вытесняются и учитываются в dropped,
+    а публикующий переход никогда не ждет медленного клиента.
+    '''
+
+    def __init__(self, max_size: int):
+        self.dropped = 0
+        self.closed = False
+        self._events: Deque[bytes] = deque(maxlen=max_size)
+        self._ready = asyncio.Event()
+
+    def put(self, payload: bytes) -> None:
+        if len(self._events) == self._events.maxlen:
+            self.dropped += 1
+        self._events.append(payload)
+        self._ready.set()
+
+    def close(self) -> None:
+        self.closed = True
+        self._ready.set()
+
+    async def get(self, timeout: float) -> Optional[bytes]:
+        '''
+        Ждет следующее событие не дольше timeout секунд.
+
+        Возвращает None, если событий не было или подписка закрыта.
+        '''
+        if not self._events and not self.closed:
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                return None
+        if not self._events:
+            return None
+        payload = self._events.popleft()
+        if not self._events:
+            self._ready.clear()
+        return payload
+
+
+class ClickFeed:
+    '''
+    Раздача переходов по ссылкам подписчикам внутри процесса.
+
+    Переадресация публикует переход, и он копируется в очереди всех
+    зрителей ссылки без обращения к базе. Событие сериализуется один
+    раз на всех зрителей. Переходы, обработанные другими процессами,
+    сюда не попадают, а изменение и удаление ссылки в любом процессе
+    приходят через шину инвалидации и завершают трансляции.
+    '''
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self._channels: Dict[str, Set[Subscription]] = {}
+
+    def publish(self, short_url: str, event: Dict) -> int:
+        '''Рассылает событие зрителям ссылки и возвращает их число.'''
+        subscribers = self._channels.get(short_url)
+        if not subscribers:
+            return 0
+        payload = orjson.dumps(event)
+        for subscription in subscribers:
+            subscription.put(payload)
+        return len(subscribers)
+
+    def subscribe(self, short_url: str) -> Subscription:
+        subscription = Subscription(self.queue_size)
+        self._channels.setdefault(short_url, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, short_url: str, subscription: Subscription) -> None:
+        subscribers = self._channels.get(short_url)
+        if subscribers is None:
+            return
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self._channels[short_url]
+
+    def close(self, short_url: str) -> None:
+        '''
+        Завершает все трансляции ссылки после ее изменения или удаления.
+
+        Клиент переподключается, и права на ссылку проверяются заново.
+        '''
+        for subscription in self._channels.pop(short_url, ()):
+            subscription.close()
+
+    def close_all(self) -> None:
+        '''Завершает все трансляции, если события инвалидации потеряны.'''
+        for short_url in list(self._channels):
+            self.close(short_url)
+
+    def subscribers(self, short_url: str) -> int:
+        return len(self._channels.get(short_url, ()))
+
+    async def stream(
+        self,
+        short_url: str,
+        heartbeat: float
+    ) -> AsyncIterator[bytes]:
+        '''
+        Отдает переходы по ссылке в формате Server-Sent Events.
+
+        Без переходов раз в heartbeat секунд отправляется комментарий,
+        чтобы прокси не закрывали соединение. Подписка снимается,
+        когда клиент отключается.
+        '''
+        subscription = self.subscribe(short_url)
+        dropped = 0
+        try:
+            yield b'retry: 3000\n\n'
+            while not subscription.closed:
+                payload = await subscription.get(timeout=heartbeat)
+                if subscription.dropped != dropped:
+                    lost = subscription.dropped - dropped
+                    dropped = subscription.dropped
+                    yield b'event: dropped\ndata: %d\n\n' % lost
+                if payload is None:
+                    if not subscription.closed:
+                        yield b': keepalive\n\n'
+                    continue
+                yield b'event: click\ndata: ' + payload + b'\n\n'
+            yield b'event: closed\ndata: {}\n\n'
+        finally:
+            self.unsubscribe(short_url, subscription)
+
+
+click_feed = ClickFeed(queue_size=app_settings.STREAM_QUEUE_SIZE)
+
+
+def _on_invalidation(event: Event) -> None:
+    if event['event'] != InvalidationEvents.CREATE and event['short_url']:
+        click_feed.close(event['short_url'])
+
+
+invalidation_bus.subscribe(_on_invalidation, on_flush=click_feed.close_all)
@@ -0,0 +1,188 @@
+import asyncio
+import math
+import sys
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from services.cold_storage import (
+    ColdClicks, from_micros, load_url_clicks, to_micros
+)
+from services.entities import client_con_crud
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+PERCENTILES = (50, 90, 99)
+
+
+def to_naive_utc(moment: Optional[datetime]) -> Optional[datetime]:
+    '''Переводит время с поясом в UTC без пояса, как в базе.'''
+    if moment is not None and moment.tzinfo is not None:
+        return moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def decode_times(data: Optional[bytes]) -> Any:
+    '''
+    Раскодирует столбец времени из базы без создания объектов.
+
+    data - склеенные значения int8send, то есть микросекунды от начала
+    эпохи в big-endian int64. С numpy возвращается массив datetime64[us],
+    без него - array('q') с микросекундами.
+    '''
+    data = data or b''
+    if np is not None:
+        return np.frombuffer(data, dtype='>i8').astype('<i8').view(
+            'datetime64[us]'
+        )
+    times = array('q')
+    times.frombytes(data)
+    if sys.byteorder == 'little':
+        times.byteswap()
+    return times
+
+
+def _micros(times: Any) -> Any:
+    if np is not None:
+        return np.asarray(times).view('<i8')
+    return times
+
+
+def _merge(hot: Any, cold: List[ColdClicks], start: int, end: int) -> Any:
+    '''Объединяет время из базы и из холодных файлов в один столбец.'''
+    if np is not None:
+        parts = [_micros(hot)] + [
+            clicks.times[
+                np.searchsorted(clicks.times, start):
+                np.searchsorted(clicks.times, end)
+            ]
+            for clicks in cold
+        ]
+        return np.sort(np.concatenate(parts), kind='stable')
+    merged = list(hot)
+    for clicks in cold:
+        merged.extend(
+            clicks.times[
+                bisect_left(clicks.times, start):
+                bisect_left(clicks.times, end)
+            ]
+        )
+    return sorted(merged)
+
+
+def _nearest_rank(values: Sequence[int], pcts: Sequence[float]) -> List[int]:
+    '''Перцентили отсортированных значений по методу ближайшего ранга.'''
+    ranks = [max(math.ceil(pct / 100 * len(values)), 1) - 1 for pct in pcts]
+    if np is not None:
+        return np.asarray(values)[ranks].tolist()
+    return [values[rank] for rank in ranks]
+
+
+def _edges(start: int, end: int, bins: int) -> List[int]:
+    '''Границы bins равных интервалов в целых микросекундах.'''
+    return [start + (end - start) * index // bins for index in range(bins + 1)]
+
+
+def _counts(times: Any, edges: List[int]) -> List[int]:
+    '''Число значений отсортированного столбца в каждом интервале.'''
+    if np is not None:
+        return np.diff(np.searchsorted(times, edges)).tolist()
+    positions = [bisect_left(times, edge) for edge in edges]
+    return [high - low for low, high in zip(positions, positions[1:])]
+
+
+def _gaps(times: Any) -> Optional[Dict[str, float]]:
+    '''Статистика интервалов между соседними переходами в секундах.'''
+    if len(times) < 2:
+        return None
+    if np is not None:
+        gaps = np.sort(np.diff(times))
+        mean = float(gaps.mean())
+    else:
+        gaps = sorted(
+            following - previous
+            for previous, following in zip(times, times[1:])
+        )
+        mean = sum(gaps) / len(gaps)
+    p50, p90, p99 = _nearest_rank(gaps, PERCENTILES)
+    return {
+        'mean': round(mean / 1e6, 6),
+        'p50': p50 / 1e6,
+        'p90': p90 / 1e6,
+        'p99': p99 / 1e6,
+        'max': int(gaps[-1]) / 1e6,
+    }
+
+
+def histogram(
+    times: Any,
+    bins: int,
+    start: Optional[int] = None,
+    end: Optional[int] = None
+) -> Dict[str, Any]:
+    '''
+    Гистограмма, перцентили и интервалы по отсортированному столбцу.
+
+    times - микросекунды от начала эпохи по возрастанию. Без start
+    и end интервал берется от первого до последнего перехода.
+    Все подсчеты идут по всему столбцу сразу: границы интервалов
+    ищутся двоичным поиском, а не проходом по переходам.
+    '''
+    if not len(times):
+        return {
+            'clicks': 0, 'bins': [], 'percentiles': {}, 'inter_arrival': None
+        }
+    start = int(times[0]) if start is None else start
+    end = int(times[-1]) + 1 if end is None else end
+    edges = _edges(start, end, bins)
+    return {
+        'clicks': len(times),
+        'bins': [
+            {'start': from_micros(edge), 'clicks': count}
+            for edge, count in zip(edges, _counts(times, edges))
+        ],
+        'percentiles': {
+            f'p{pct}': from_micros(value)
+            for pct, value in zip(
+                PERCENTILES, _nearest_rank(times, PERCENTILES)
+            )
+        },
+        'inter_arrival': _gaps(times),
+    }
+
+
+async def click_histogram(
+    db: AsyncSession,
+    url_id: int,
+    has_cold: bool,
+    bins: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+) -> Dict[str, Any]:
+    '''
+    Гистограмма переходов по ссылке за интервал [start, end).
+
+    Время переходов приходит из базы одним бинарным значением
+    и дополняется переходами из холодного хранения.
+    '''
+    start, end = to_naive_utc(start), to_naive_utc(end)
+    hot = decode_times(
+        await client_con_crud.get_click_times(
+            db=db, url_id=url_id, start=start, end=end
+        )
+    )
+    cold = await load_url_clicks(db=db, url_id=url_id, has_cold=has_cold)
+    lower = None if start is None else to_micros(start)
+    upper = None if end is None else to_micros(end)
+    times = _merge(
+        hot, cold,
+        -sys.maxsize if lower is None else lower,
+        sys.maxsize if upper is None else upper
+    )
+    return await asyncio.to_thread(histogram, times, bins, lower, upper)
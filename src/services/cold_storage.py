@@ -0,0 +1,463 @@
+import asyncio
+import logging
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta
+from itertools import accumulate
+from typing import (
+    Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+)
+from uuid import uuid4
+
+import orjson
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import app_settings
+from services.entities import client_con_crud, cold_crud
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'CLK1'
+# сигнатура, число переходов и размеры сжатых столбцов:
+# время, коды user-agent и словарь user-agent
+HEADER = struct.Struct('<4sIIII')
+EPOCH = datetime(1970, 1, 1)
+MICROSECONDS_PER_DAY = 86_400_000_000
+LITTLE_ENDIAN = sys.byteorder == 'little'
+
+
+def to_micros(moment: datetime) -> int:
+    '''Переводит время в UTC без пояса в микросекунды от начала эпохи.'''
+    delta = moment - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + (
+        delta.microseconds
+    )
+
+
+def from_micros(value: int) -> datetime:
+    return EPOCH + timedelta(microseconds=int(value))
+
+
+def month_start(moment: date) -> date:
+    return date(moment.year, moment.month, 1)
+
+
+def months_before(moment: date, months: int) -> date:
+    '''Первое число месяца за months месяцев до месяца moment.'''
+    index = moment.year * 12 + moment.month - 1 - months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _pack(values: array) -> bytes:
+    if not LITTLE_ENDIAN:
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _unpack(typecode: str, data: bytes) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    if not LITTLE_ENDIAN:
+        values.byteswap()
+    return values
+
+
+def encode_clicks(
+    times: Sequence[int],
+    agents: Sequence[Optional[str]]
+) -> bytes:
+    '''
+    Кодирует переходы в столбцовый формат.
+
+    Время в микросекундах сортируется и хранится разностями соседних
+    значений в int64, user-agent - кодами uint32 в словаре. Каждый
+    столбец сжимается zlib: разности времени почти одинаковы, а коды
+    повторяются, поэтому оба столбца сжимаются в разы.
+    '''
+    order = sorted(range(len(times)), key=times.__getitem__)
+    dictionary: Dict[Optional[str], int] = {}
+    codes = array(
+        'I', (dictionary.setdefault(agents[index], len(dictionary))
+              for index in order)
+    )
+    previous = 0
+    deltas = array('q')
+    for index in order:
+        deltas.append(times[index] - previous)
+        previous = times[index]
+    columns = (
+        zlib.compress(_pack(deltas)),
+        zlib.compress(_pack(codes)),
+        zlib.compress(orjson.dumps(list(dictionary)))
+    )
+    return HEADER.pack(
+        MAGIC, len(times), *(len(column) for column in columns)
+    ) + b''.join(columns)
+
+
+class ColdClicks(NamedTuple):
+    '''
+    Столбцы переходов одного файла.
+
+    times - время в микросекундах по возрастанию, codes - номера
+    user-agent в dictionary. С numpy столбцы - массивы numpy,
+    без него - array из стандартной библиотеки.
+    '''
+    times: Any
+    codes: Any
+    dictionary: List[Optional[str]]
+
+    def agents(self) -> List[Optional[str]]:
+        return [self.dictionary[code] for code in self.codes]
+
+
+def decode_clicks(buffer: Any) -> ColdClicks:
+    '''Раскодирует столбцы из буфера, например отображенного файла.'''
+    with memoryview(buffer) as view:
+        magic, count, *sizes = HEADER.unpack_from(view)
+        if magic != MAGIC:
+            raise ValueError('Not a cold clicks file')
+        offset = HEADER.size
+        columns = []
+        for size in sizes:
+            columns.append(zlib.decompress(view[offset:offset + size]))
+            offset += size
+    deltas, codes, dictionary = columns
+    if np is not None:
+        times = np.cumsum(np.frombuffer(deltas, dtype='<i8'))
+        codes = np.frombuffer(codes, dtype='<u4')
+    else:
+        times = array('q', accumulate(_unpack('q', deltas)))
+        codes = _unpack('I', codes)
+    if len(times) != count:
+        raise ValueError('Corrupted cold clicks file')
+    return ColdClicks(times, codes, orjson.loads(dictionary))
+
+
+def daily_counts(files: Iterable[ColdClicks]) -> Dict[date, int]:
+    '''Число переходов по дням во всех файлах.'''
+    files = [clicks for clicks in files if len(clicks.times)]
+    if not files:
+        return {}
+    if np is not None:
+        days, counts = np.unique(
+            np.concatenate([clicks.times for clicks in files])
+            // MICROSECONDS_PER_DAY,
+            return_counts=True
+        )
+    else:
+        counter = Counter(
+            time // MICROSECONDS_PER_DAY
+            for clicks in files for time in clicks.times
+        )
+        days, counts = list(counter), list(counter.values())
+    epoch = EPOCH.date()
+    return {
+        epoch + timedelta(days=int(day)): int(count)
+        for day, count in zip(days, counts)
+    }
+
+
+def agent_counts(files: Iterable[ColdClicks]) -> Dict[Optional[str], int]:
+    '''Число переходов с каждым user-agent во всех файлах.'''
+    totals: Dict[Optional[str], int] = defaultdict(int)
+    for clicks in files:
+        if np is not None:
+            counts = np.bincount(
+                clicks.codes, minlength=len(clicks.dictionary)
+            ).tolist()
+        else:
+            counter = Counter(clicks.codes)
+            counts = [counter[code] for code in range(len(clicks.dictionary))]
+        for agent, count in zip(clicks.dictionary, counts):
+            if count:
+                totals[agent] += count
+    return dict(totals)
+
+
+def merge_top(
+    hot: Iterable[Tuple[Optional[str], int]],
+    files: Iterable[ColdClicks],
+    limit: int
+) -> List[Tuple[Optional[str], int]]:
+    '''
+    Топ user-agent по переходам из базы и из холодных файлов.
+
+    hot должен содержать все user-agent ссылки из базы, иначе
+    user-agent, частый в холодных файлах, может получить неполную сумму.
+    '''
+    totals = agent_counts(files)
+    for agent, count in hot:
+        totals[agent] = totals.get(agent, 0) + count
+    return sorted(
+        totals.items(),
+        key=lambda item: (-item[1], item[0] is None, item[0] or '')
+    )[:limit]
+
+
+def merge_daily(
+    hot: Iterable[Tuple[date, int]],
+    files: Iterable[ColdClicks]
+) -> List[Tuple[date, int]]:
+    '''Переходы по дням из базы и из холодных файлов.'''
+    totals = daily_counts(files)
+    for day, count in hot:
+        totals[day] = totals.get(day, 0) + count
+    return sorted(totals.items())
+
+
+def newest_clicks(
+    files: Iterable[ColdClicks],
+    skip: int,
+    limit: Optional[int]
+) -> List[Tuple[datetime, Optional[str]]]:
+    '''
+    Переходы из файлов от новых к старым без первых skip.
+
+    Файлы должны идти от новых месяцев к старым. Без limit
+    возвращаются все оставшиеся переходы.
+    '''
+    result = []
+    for clicks in files:
+        stop = len(clicks.times) - skip
+        if stop <= 0:
+            skip = -stop
+            continue
+        skip = 0
+        start = 0 if limit is None else max(0, stop - limit + len(result))
+        for index in reversed(range(start, stop)):
+            result.append((
+                from_micros(clicks.times[index]),
+                clicks.dictionary[clicks.codes[index]]
+            ))
+        if limit is not None and len(result) >= limit:
+            break
+    return result
+
+
+class ColdStorage:
+    '''
+    Файлы холодного хранения переходов.
+
+    Переходы ссылки за месяц лежат в файле root/<url_id>/<месяц>.*.clicks.
+    Файл не изменяется: при дозаписи месяца пишется новый файл,
+    и таблица client_connection_cold переключается на него
+    в той же транзакции, в которой переходы удаляются из базы.
+    Таблица общая для всех процессов, поэтому root должен быть общим
+    хранилищем, смонтированным во всех процессах по одному пути.
+    Пустой root отключает холодное хранение.
+    '''
+
+    def __init__(self, root: str):
+        self.root = root
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.root)
+
+    def write(
+        self,
+        url_id: int,
+        month: date,
+        times: Sequence[int],
+        agents: Sequence[Optional[str]]
+    ) -> str:
+        '''Записывает новый файл месяца и возвращает его путь от root.'''
+        path = os.path.join(
+            str(url_id), f'{month:%Y-%m}.{uuid4().hex[:12]}.clicks'
+        )
+        full_path = os.path.join(self.root, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(f'{full_path}.tmp', 'wb') as file:
+            file.write(encode_clicks(times, agents))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(f'{full_path}.tmp', full_path)
+        return path
+
+    def read(self, path: str) -> ColdClicks:
+        '''Читает файл через отображение в память.'''
+        with open(os.path.join(self.root, path), 'rb') as file:
+            with mmap.mmap(
+                file.fileno(), 0, access=mmap.ACCESS_READ
+            ) as buffer:
+                return decode_clicks(buffer)
+
+    def load(self, paths: Iterable[str]) -> List[ColdClicks]:
+        return [self.read(path) for path in paths]
+
+    def remove(self, path: str) -> None:
+        try:
+            os.remove(os.path.join(self.root, path))
+        except FileNotFoundError:
+            pass
+
+
+cold_storage = ColdStorage(root=app_settings.COLD_STORAGE_DIR)
+
+
+async def load_url_clicks(
+    db: AsyncSession,
+    url_id: int,
+    has_cold: bool,
+    storage: ColdStorage = cold_storage
+) -> List[ColdClicks]:
+    '''
+    Читает все холодные переходы ссылки.
+
+    has_cold берется из версии ссылки (UrlStamp), поэтому для ссылки
+    без выгруженных месяцев база не используется.
+    '''
+    if not has_cold:
+        return []
+    paths = await cold_crud.get_paths(db=db, url_id=url_id)
+    return await asyncio.to_thread(storage.load, paths)
+
+
+async def load_cold_details(
+    db: AsyncSession,
+    url_id: int,
+    offset: int,
+    limit: Optional[int],
+    storage: ColdStorage = cold_storage
+) -> List[Tuple[datetime, Optional[str]]]:
+    '''
+    Страница холодных переходов ссылки от новых к старым.
+
+    Число переходов в месяце берется из client_connection_cold,
+    поэтому читаются только файлы месяцев, попавших в страницу.
+    '''
+    paths, skip, seen = [], 0, 0
+    for clicks, path in await cold_crud.get_months(db=db, url_id=url_id):
+        if limit is not None and seen >= offset + limit:
+            break
+        if seen + clicks > offset:
+            if not paths:
+                skip = offset - seen
+            paths.append(path)
+        seen += clicks
+    if not paths:
+        return []
+    files = await asyncio.to_thread(storage.load, paths)
+    return newest_clicks(files, skip, limit)
+
+
+def _write_months(
+    storage: ColdStorage,
+    months: Dict[Tuple[int, date], List[Tuple[int, Optional[str]]]],
+    existing: Dict[Tuple[int, date], str],
+    written: List[str]
+) -> List[Dict[str, Any]]:
+    '''Пишет файлы месяцев, дополняя уже выгруженные месяцы.'''
+    manifest = []
+    for (url_id, month), clicks in months.items():
+        times = [time for time, _ in clicks]
+        agents = [agent for _, agent in clicks]
+        if (url_id, month) in existing:
+            try:
+                old = storage.read(existing[url_id, month])
+            except FileNotFoundError:
+                logger.error(
+                    f'Cold file {existing[url_id, month]} is missing, '
+                    'COLD_STORAGE_DIR must be shared by all processes.'
+                )
+                raise
+            times.extend(int(time) for time in old.times)
+            agents.extend(old.agents())
+        path = storage.write(url_id, month, times, agents)
+        written.append(path)
+        manifest.append({
+            'url_id': url_id,
+            'month': month,
+            'clicks': len(times),
+            'first_click': from_micros(min(times)),
+            'last_click': from_micros(max(times)),
+            'path': path,
+            'exported_at': datetime.utcnow()
+        })
+    return manifest
+
+
+async def _export_batch(
+    session_factory: Callable[[], AsyncSession],
+    storage: ColdStorage,
+    before: datetime,
+    batch_size: int
+) -> Tuple[int, int]:
+    '''Выгружает переходы пачки ссылок, возвращает число ссылок и строк.'''
+    async with session_factory() as db:
+        url_ids, rows = await client_con_crud.take_aged(
+            db=db, before=before, batch_size=batch_size
+        )
+        if not rows:
+            await db.rollback()
+            return len(url_ids), 0
+        months = defaultdict(list)
+        for url_id, time, agent in rows:
+            months[url_id, month_start(time)].append(
+                (to_micros(time), agent)
+            )
+        existing = await cold_crud.lock_months(db=db, keys=list(months))
+        written = []
+        try:
+            manifest = await asyncio.to_thread(
+                _write_months, storage, months, existing, written
+            )
+            await cold_crud.save_months(db=db, rows=manifest)
+        except BaseException:
+            for path in written:
+                storage.remove(path)
+            raise
+    for path in existing.values():
+        storage.remove(path)
+    return len(url_ids), len(rows)
+
+
+async def export_cold_clicks(
+    session_factory: Callable[[], AsyncSession],
+    months: int,
+    batch_size: int,
+    storage: ColdStorage = cold_storage,
+    now: Optional[datetime] = None
+) -> int:
+    '''
+    Переносит переходы старше months полных месяцев в холодные файлы.
+
+    Ссылки разбираются пачками по batch_size, каждая пачка - одна
+    транзакция: строки удаляются из базы, файлы пишутся, и таблица
+    client_connection_cold обновляется до коммита. Если транзакция
+    не удалась, новые файлы удаляются, а строки остаются в базе.
+    Выгрузку ведет один процесс: остальные не получают рекомендательную
+    блокировку и пропускают запуск. Возвращает число перенесенных
+    переходов.
+    '''
+    before = datetime.combine(
+        months_before((now or datetime.utcnow()).date(), months),
+        datetime.min.time()
+    )
+    total = 0
+    async with session_factory() as lock:
+        if not await cold_crud.try_lock_export(db=lock):
+            logger.info('Cold storage export is running in another process.')
+            return 0
+        while True:
+            urls, clicks = await _export_batch(
+                session_factory, storage, before, batch_size
+            )
+            total += clicks
+            if urls < batch_size:
+                break
+    if total:
+        logger.info(f'Moved {total} clicks to cold storage.')
+    return total
@@ -0,0 +1,87 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from services.cold_storage import ColdStorage, cold_storage
+from services.entities import url_crud
+
+logger = logging.getLogger(__name__)
+
+
+async def compact_deleted(
+    session_factory: Callable[[], AsyncSession],
+    grace: float,
+    batch_size: int,
+    storage: ColdStorage = cold_storage
+) -> Tuple[int, int]:
+    '''
+    Переносит в архив все ссылки, удаленные больше grace секунд назад.
+
+    Каждая пачка из batch_size ссылок переносится в своей транзакции,
+    поэтому блокировки держатся недолго. Файлы холодного хранения
+    ссылок удаляются после коммита пачки. Возвращает число перенесенных
+    ссылок и переходов.
+    '''
+    deleted_before = datetime.utcnow() - timedelta(seconds=grace)
+    urls, connections = 0, 0
+    while True:
+        async with session_factory() as db:
+            batch_urls, batch_connections, paths = (
+                await url_crud.archive_deleted(
+                    db=db,
+                    deleted_before=deleted_before,
+                    batch_size=batch_size
+                )
+            )
+        for path in paths:
+            storage.remove(path)
+        urls += batch_urls
+        connections += batch_connections
+        if batch_urls < batch_size:
+            if urls:
+                logger.info(
+                    f'Compaction archived {urls} urls '
+                    f'and {connections} connections.'
+                )
+            return urls, connections
+
+
+async def sweep_expired(
+    session_factory: Callable[[], AsyncSession],
+    batch_size: int
+) -> int:
+    '''
+    Помечает удаленными все истекшие ссылки пачками по batch_size.
+
+    Дальше они попадают в архив вместе с остальными удаленными.
+    '''
+    expired_before = datetime.utcnow()
+    total = 0
+    while True:
+        async with session_factory() as db:
+            deleted = await url_crud.delete_expired(
+                db=db,
+                expired_before=expired_before,
+                batch_size=batch_size
+            )
+        total += deleted
+        if deleted < batch_size:
+            return total
+
+
+async def run_periodically(
+    job: Callable[[], Awaitable],
+    interval: float
+) -> None:
+    '''Запускает фоновую задачу обслуживания раз в interval секунд.'''
+    while True:
+        try:
+            await job()
+        except Exception as err:
+            logger.error(
+                f'Error running maintenance job: {err}', exc_info=True
+            )
+        await asyncio.sleep(interval)
@@ -1,18 +1,97 @@
 import logging
-from typing import List, Optional
+from datetime import date, datetime
+from typing import (
+    Any, AsyncIterator, Dict, List, NamedTuple, Optional, Tuple, Union
+)
 
-from sqlalchemy import select
+from sqlalchemy import (
+    BigInteger, Date, DateTime, Integer, LargeBinary, String, and_, any_,
+    bindparam, cast, column, delete, func, insert, literal, or_, select,
+    tuple_, update
+)
+from sqlalchemy.dialects.postgresql import (
+    ARRAY, aggregate_order_by, insert as pg_insert
+)
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import raiseload
 
-from .manager import DBManager
-from models import ClientConnection, Url, User
+from .cache.dedup import anonymous_urls
+from .cache.invalidation import InvalidationEvents, invalidation_bus
+from .cache.redirect import CachedUrl, redirect_cache
+from .cache.sketch import HyperLogLog
+from .manager import DBManager, unit_of_work
+from models import (
+    ClientConnection, ClientConnectionArchive, ClientConnectionCold, Url,
+    UrlArchive, UrlVisitorSketch, User
+)
+from models.schemas.utils import (
+    BatchStatuses, RedirectTypes, UrlTypes, normalize_url
+)
 from models.schemas.db_schemas import (
-    CreateClientConnection, CreateUrl, CreateUser, UpdateClientConnection,
-    UpdateUrl, UpdateUser
+    ClientConnectionColdBase, CreateClientConnection, CreateUrl, CreateUser,
+    UpdateClientConnection, UpdateUrl, UpdateUrlVisitorSketch, UpdateUser,
+    UrlVisitorSketchBase
 )
 
 logger = logging.getLogger(__name__)
 
+# запрос собирается один раз на процесс: он выполняется при каждой
+# записи ссылки с владельцем
+BUMP_OWNER_VERSION = (
+    update(User.__table__).
+    where(User.__table__.c.id == bindparam('owner_id')).
+    values(version=User.__table__.c.version + 1)
+)
+
+# ключ рекомендательной блокировки, под которой выгрузку переходов
+# в холодное хранение ведет только один процесс
+COLD_EXPORT_LOCK = 0x636f6c64
+
+
+class UrlStamp(NamedTuple):
+    '''Версия ссылки и данные для проверки доступа к ней.'''
+    id: int
+    version: int
+    deleted: bool
+    url_type: str
+    owner: Optional[str]
+    last_click: Optional[int]
+    expires_at: Optional[datetime]
+    has_cold: bool
+
+
+class UserStamp(NamedTuple):
+    '''Версия списка ссылок пользователя.'''
+    id: int
+    version: int
+    last_click: Optional[int]
+
+
+def last_click_id(url_id) -> Any:
+    '''
+    Подзапрос с id последнего перехода по ссылке.
+
+    Индекс (url_id, id) позволяет взять его одним чтением индекса.
+    '''
+    return (
+        select(func.max(ClientConnection.id)).
+        where(ClientConnection.url_id == url_id).
+        scalar_subquery()
+    )
+
+
+def has_cold_clicks(url_id) -> Any:
+    '''
+    Подзапрос о наличии у ссылки месяцев в холодном хранении.
+
+    Читает только начало первичного ключа client_connection_cold.
+    '''
+    return (
+        select(ClientConnectionCold.url_id).
+        where(ClientConnectionCold.url_id == url_id).
+        exists()
+    )
+
 
 class UrlDBManager(DBManager[Url, CreateUrl, UpdateUrl]):
     '''Класс для CRUD операций над объектами Url.'''
@@ -22,14 +101,278 @@ class UrlDBManager(DBManager[Url, CreateUrl, UpdateUrl]):
         db: AsyncSession,
         short_url: str
     ) -> Url:
-        '''Возвращает объект url по полю short_url.'''
+        '''
+        Возвращает объект url по полю short_url.
+
+        Найденная живая ссылка заодно попадает в кэш переадресаций.
+        '''
         stmnt = (
             select(self._model).
             where(self._model.short_url == short_url)
         )
         result = await db.execute(statement=stmnt)
         logger.info(f'Getting url obj {self.__class__.__name__}')
-        return result.scalar_one_or_none()
+        url_obj = result.scalar_one_or_none()
+        if url_obj is not None and not url_obj.deleted:
+            redirect_cache.set(
+                CachedUrl(
+                    id=url_obj.id,
+                    short_url=url_obj.short_url,
+                    original_url=url_obj.original_url,
+                    url_type=url_obj.url_type,
+                    user_id=url_obj.user_id,
+                    redirect_type=url_obj.redirect_type,
+                    cache_max_age=url_obj.cache_max_age,
+                    expires_at=url_obj.expires_at
+                )
+            )
+        return url_obj
+
+    def _redirect_columns(self) -> tuple:
+        return (
+            self._model.id,
+            self._model.short_url,
+            self._model.original_url,
+            self._model.url_type,
+            self._model.user_id,
+            self._model.deleted,
+            self._model.redirect_type,
+            self._model.cache_max_age,
+            self._model.expires_at,
+        )
+
+    async def get_redirect_target(
+        self,
+        db: AsyncSession,
+        short_url: str
+    ) -> Optional[CachedUrl]:
+        '''
+        Возвращает данные ссылки для переадресации.
+
+        Сначала ищет ссылку в кэше, при промахе читает из базы только
+        нужные колонки, без истории переходов, и кэширует живую ссылку.
+        '''
+        entry = redirect_cache.get(short_url)
+        if entry is not None:
+            return entry
+        stmnt = (
+            select(*self._redirect_columns()).
+            where(self._model.short_url == short_url)
+        )
+        result = await db.execute(statement=stmnt)
+        row = result.one_or_none()
+        if row is None:
+            return None
+        entry = CachedUrl(*row)
+        if not entry.deleted:
+            redirect_cache.set(entry)
+        return entry
+
+    async def get_top_clicked(
+        self,
+        db: AsyncSession,
+        limit: int
+    ) -> List[CachedUrl]:
+        '''Возвращает limit живых ссылок с наибольшим числом переходов.'''
+        stmnt = (
+            select(*self._redirect_columns()).
+            join(ClientConnection, ClientConnection.url_id == self._model.id).
+            where(self._model.deleted.is_not(True)).
+            group_by(self._model.id).
+            order_by(func.count(ClientConnection.id).desc()).
+            limit(limit)
+        )
+        result = await db.execute(statement=stmnt)
+        logger.info(f'Getting top clicked urls {self.__class__.__name__}')
+        return [CachedUrl(*row) for row in result.all()]
+
+    async def _before_commit(
+        self,
+        db: AsyncSession,
+        db_obj: Url,
+        data: Dict[str, Any],
+        created: bool
+    ) -> None:
+        '''
+        Сообщает другим процессам об изменении ссылки.
+
+        Заодно увеличивает версию списка ссылок владельца.
+        '''
+        if db_obj.user_id is not None:
+            await db.execute(
+                BUMP_OWNER_VERSION, {'owner_id': db_obj.user_id}
+            )
+        if created:
+            event = InvalidationEvents.CREATE
+        elif data.get('deleted'):
+            event = InvalidationEvents.DELETE
+        else:
+            event = InvalidationEvents.UPDATE
+        await invalidation_bus.notify(
+            db=db,
+            event=event,
+            short_url=db_obj.short_url,
+            user_id=db_obj.user_id
+        )
+
+    async def create(
+        self,
+        db: AsyncSession,
+        data_in: Union[CreateUrl, Dict[str, Any]],
+        **kwargs
+    ) -> Url:
+        '''
+        Создает ссылку вместе с ключом поиска дублей.
+
+        original_url сохраняется как есть, нормализованный url
+        записывается в original_url_key.
+        '''
+        original_url = (
+            data_in['original_url'] if isinstance(data_in, Dict)
+            else data_in.original_url
+        )
+        return await super().create(
+            db=db,
+            data_in=data_in,
+            original_url_key=normalize_url(original_url),
+            **kwargs
+        )
+
+    async def update(
+        self,
+        db: AsyncSession,
+        db_obj: Url,
+        data_in: Union[UpdateUrl, Dict[str, Any]]
+    ) -> Url:
+        '''
+        Обновляет ссылку, увеличивает ее версию
+        и удаляет ее из кэшей переадресаций и создания ссылок.
+
+        Для удаляемой ссылки запоминается время удаления.
+        '''
+        dict_data = (
+            data_in if isinstance(data_in, Dict) else data_in.changes()
+        )
+        dict_data = {**dict_data, 'version': self._model.version + 1}
+        if dict_data.get('deleted'):
+            dict_data.setdefault('deleted_at', datetime.utcnow())
+        db_obj = await super().update(db=db, db_obj=db_obj, data_in=dict_data)
+        redirect_cache.evict(db_obj.short_url)
+        anonymous_urls.evict(db_obj.short_url)
+        return db_obj
+
+    async def get_status_stamp(
+        self,
+        db: AsyncSession,
+        short_url: str
+    ) -> Optional[UrlStamp]:
+        '''
+        Возвращает версию ссылки одним легким запросом.
+
+        Версия меняется при обновлении и удалении ссылки,
+        новый переход меняет id последнего перехода.
+        '''
+        stmnt = (
+            select(
+                self._model.id,
+                self._model.version,
+                self._model.deleted,
+                self._model.url_type,
+                User.username,
+                last_click_id(self._model.id),
+                self._model.expires_at,
+                has_cold_clicks(self._model.id)
+            ).
+            outerjoin(User, User.id == self._model.user_id).
+            where(self._model.short_url == short_url)
+        )
+        result = await db.execute(statement=stmnt)
+        row = result.one_or_none()
+        return None if row is None else UrlStamp(*row)
+
+    async def batch_update(
+        self,
+        db: AsyncSession,
+        short_urls: List[str],
+        values: Dict[str, Any],
+        username: Optional[str]
+    ) -> Dict[str, str]:
+        '''
+        Обновляет живые ссылки из списка одним запросом.
+
+        Права те же, что у check_update_permission: ссылку без владельца
+        может менять любой, остальные - только владелец. Приватной нельзя
+        сделать ссылку с постоянной переадресацией. Ссылки, версии
+        владельцев и уведомления пишутся в одном unit_of_work: внутри
+        внешнего блока коммит выполнит он. Возвращает статус для каждой
+        ссылки: обновлена, не найдена или запрещена.
+        '''
+        now = datetime.utcnow()
+        codes = bindparam('short_urls', short_urls, type_=ARRAY(String))
+        live = and_(
+            self._model.short_url == any_(codes),
+            self._model.deleted.is_not(True),
+            or_(
+                self._model.expires_at.is_(None),
+                self._model.expires_at > now
+            )
+        )
+        allowed = self._model.user_id.is_(None)
+        if username is not None:
+            owner_id = (
+                select(User.id).
+                where(User.username == username).
+                scalar_subquery()
+            )
+            allowed = or_(allowed, self._model.user_id == owner_id)
+        if values.get('url_type') == UrlTypes.PRIVATE:
+            allowed = and_(
+                allowed,
+                self._model.redirect_type == RedirectTypes.TEMPORARY
+            )
+        values = {**values, 'version': self._model.version + 1}
+        if values.get('deleted'):
+            values['deleted_at'] = now
+
+        async with unit_of_work(db):
+            result = await db.execute(
+                update(self._model).
+                where(live, allowed).
+                values(**values).
+                returning(self._model.short_url, self._model.user_id)
+            )
+            rows = result.all()
+            updated = [short_url for short_url, _ in rows]
+            statuses = dict.fromkeys(short_urls, BatchStatuses.NOT_FOUND)
+            statuses.update(dict.fromkeys(updated, BatchStatuses.UPDATED))
+            if len(updated) < len(statuses):
+                forbidden = await db.execute(
+                    select(self._model.short_url).where(live)
+                )
+                for short_url in forbidden.scalars():
+                    if statuses[short_url] == BatchStatuses.NOT_FOUND:
+                        statuses[short_url] = BatchStatuses.FORBIDDEN
+
+            owners = {user_id for _, user_id in rows if user_id}
+            if owners:
+                await db.execute(
+                    update(User).
+                    where(User.id.in_(owners)).
+                    values(version=User.version + 1)
+                )
+            await invalidation_bus.notify_many(
+                db=db,
+                event=(
+                    InvalidationEvents.DELETE if values.get('deleted')
+                    else InvalidationEvents.UPDATE
+                ),
+                short_urls=updated
+            )
+        for short_url in updated:
+            redirect_cache.evict(short_url)
+            anonymous_urls.evict(short_url)
+        logger.info(f'Batch updated {len(updated)} urls')
+        return statuses
 
     async def get_obj_by_original_url(
         self,
@@ -37,18 +380,191 @@ class UrlDBManager(DBManager[Url, CreateUrl, UpdateUrl]):
         original_url: str,
         user_id: Optional[int]
     ) -> Url:
-        '''Возвращает список объектов url по полю original_url.'''
+        '''
+        Возвращает список объектов url владельца с тем же original_url.
+
+        Url сравниваются по нормализованному ключу original_url_key,
+        как и в кэше ссылок без владельца. Поиск идет по индексу
+        (original_url_key, user_id), ссылки других владельцев
+        не загружаются.
+        '''
+        owner = (
+            self._model.user_id.is_(None) if user_id is None
+            else self._model.user_id == user_id
+        )
         stmnt = (
             select(self._model).
             where(
-                self._model.original_url == original_url
-                and self._model.user_id == user_id
+                self._model.original_url_key == normalize_url(original_url),
+                owner
             )
         )
         result = await db.execute(statement=stmnt)
         logger.info(f'Getting url objs {self.__class__.__name__}')
         return result.scalars().all()
 
+    async def delete_expired(
+        self,
+        db: AsyncSession,
+        expired_before: datetime,
+        batch_size: int
+    ) -> int:
+        '''
+        Помечает удаленными пачку истекших ссылок.
+
+        Истекшие ссылки ищутся по частичному индексу на expires_at.
+        В той же транзакции отправляется уведомление DELETE
+        о каждой ссылке, чтобы все воркеры убрали ее из кэшей.
+        Возвращает число удаленных ссылок.
+        '''
+        expired = (
+            select(self._model.id).
+            where(
+                self._model.expires_at <= expired_before,
+                self._model.deleted.is_not(True)
+            ).
+            order_by(self._model.expires_at).
+            limit(batch_size).
+            with_for_update(skip_locked=True)
+        )
+        result = await db.execute(
+            update(self._model).
+            where(self._model.id.in_(expired.scalar_subquery())).
+            values(
+                deleted=True,
+                deleted_at=expired_before,
+                version=self._model.version + 1
+            ).
+            returning(self._model.short_url, self._model.user_id)
+        )
+        rows = result.all()
+        owners = {user_id for _, user_id in rows if user_id}
+        if owners:
+            await db.execute(
+                update(User).
+                where(User.id.in_(owners)).
+                values(version=User.version + 1)
+            )
+        await invalidation_bus.notify_many(
+            db=db,
+            event=InvalidationEvents.DELETE,
+            short_urls=[short_url for short_url, _ in rows]
+        )
+        await db.commit()
+        for short_url, _ in rows:
+            redirect_cache.evict(short_url)
+            anonymous_urls.evict(short_url)
+        if rows:
+            logger.info(f'Deleted {len(rows)} expired urls')
+        return len(rows)
+
+    async def archive_deleted(
+        self,
+        db: AsyncSession,
+        deleted_before: datetime,
+        batch_size: int
+    ) -> Tuple[int, int, List[str]]:
+        '''
+        Переносит пачку давно удаленных ссылок и их переходы в архив.
+
+        Строки ссылок блокируются с SKIP LOCKED, поэтому несколько
+        воркеров разбирают разные пачки и не ждут друг друга, а выгрузка
+        в холодное хранение не берет эти ссылки. Переходы и ссылки
+        удаляются и вставляются в архив одним запросом на таблицу,
+        месяцы холодного хранения удаляются в той же транзакции.
+        Возвращает число перенесенных ссылок и переходов и файлы
+        холодного хранения, которые нужно удалить после коммита.
+        '''
+        stmnt = (
+            select(self._model.id).
+            where(
+                self._model.deleted.is_(True),
+                self._model.deleted_at < deleted_before
+            ).
+            order_by(self._model.id).
+            limit(batch_size).
+            with_for_update(skip_locked=True)
+        )
+        url_ids = (await db.execute(statement=stmnt)).scalars().all()
+        if not url_ids:
+            await db.rollback()
+            return 0, 0, []
+        archived_at = literal(datetime.utcnow(), DateTime)
+
+        connection_columns = ('id', 'time', 'client_info', 'url_id')
+        moved_connections = (
+            delete(ClientConnection).
+            where(ClientConnection.url_id.in_(url_ids)).
+            returning(
+                *(ClientConnection.__table__.c[name]
+                  for name in connection_columns)
+            ).
+            cte('moved_connections')
+        )
+        connections = await db.execute(
+            insert(ClientConnectionArchive).
+            from_select(
+                [*connection_columns, 'archived_at'],
+                select(moved_connections, archived_at)
+            ).
+            add_cte(moved_connections)
+        )
+
+        url_columns = (
+            'id', 'original_url', 'short_url', 'created', 'deleted_at',
+            'expires_at', 'url_type', 'redirect_type', 'cache_max_age',
+            'user_id'
+        )
+        moved_urls = (
+            delete(self._model).
+            where(self._model.id.in_(url_ids)).
+            returning(
+                *(self._model.__table__.c[name] for name in url_columns)
+            ).
+            cte('moved_urls')
+        )
+        result = await db.execute(
+            insert(UrlArchive).
+            from_select(
+                [*url_columns, 'archived_at'],
+                select(moved_urls, archived_at)
+            ).
+            add_cte(moved_urls).
+            returning(UrlArchive.user_id)
+        )
+        user_ids = {user_id for user_id in result.scalars() if user_id}
+        if user_ids:
+            await db.execute(
+                update(User).
+                where(User.id.in_(user_ids)).
+                values(version=User.version + 1)
+            )
+        cold = await db.execute(
+            delete(ClientConnectionCold).
+            where(ClientConnectionCold.url_id.in_(url_ids)).
+            returning(ClientConnectionCold.path)
+        )
+        paths = cold.scalars().all()
+        await db.commit()
+        logger.info(f'Archived {len(url_ids)} deleted urls')
+        return len(url_ids), connections.rowcount, paths
+
+    async def stream_short_urls(
+        self,
+        db: AsyncSession,
+        batch_size: int = 10000
+    ) -> AsyncIterator[str]:
+        '''Построчно отдает short_url всех неудаленных ссылок.'''
+        stmnt = (
+            select(self._model.short_url).
+            where(self._model.deleted.is_not(True)).
+            execution_options(yield_per=batch_size)
+        )
+        logger.info(f'Streaming short urls {self.__class__.__name__}')
+        result = await db.stream_scalars(statement=stmnt)
+        async for short_url in result:
+            yield short_url
+
 
 class ClientConnectionDBManager(
     DBManager[
@@ -65,9 +581,16 @@ class ClientConnectionDBManager(
         offset: int = 0,
         max_result: int = 10
     ) -> List[ClientConnection]:
+        '''
+        Возвращает страницу переходов по ссылке от новых к старым.
+
+        Порядок задает индекс (url_id, time), поэтому страницы
+        не пересекаются и продолжаются переходами из холодного хранения.
+        '''
         stmnt = (
             select(self._model).
             where(self._model.url_id == url_id).
+            order_by(self._model.time.desc(), self._model.id.desc()).
             offset(offset=offset).
             limit(limit=max_result)
         )
@@ -75,6 +598,390 @@ class ClientConnectionDBManager(
         logger.info(f'Getting connection obj {self.__class__.__name__}')
         return results.scalars().all()
 
+    async def count_by_url_id(
+        self,
+        db: AsyncSession,
+        url_id: int,
+        with_cold: bool = True
+    ) -> int:
+        '''
+        Возвращает число переходов по ссылке.
+
+        Переходы в холодном хранении учитываются по client_connection_cold,
+        без with_cold считаются только строки базы.
+        '''
+        count = func.count(self._model.id)
+        if with_cold:
+            count = count + (
+                select(
+                    func.coalesce(func.sum(ClientConnectionCold.clicks), 0)
+                ).
+                where(ClientConnectionCold.url_id == url_id).
+                scalar_subquery()
+            )
+        stmnt = select(count).where(self._model.url_id == url_id)
+        result = await db.execute(statement=stmnt)
+        return result.scalar_one()
+
+    async def get_top_clients(
+        self,
+        db: AsyncSession,
+        url_id: int,
+        limit: Optional[int]
+    ) -> List[Tuple[Optional[str], int]]:
+        '''
+        Возвращает limit самых частых user-agent ссылки с числом переходов.
+
+        Группировка идет по индексу (url_id, client_info).
+        Без limit возвращаются все user-agent.
+        '''
+        clicks = func.count()
+        stmnt = (
+            select(self._model.client_info, clicks).
+            where(self._model.url_id == url_id).
+            group_by(self._model.client_info).
+            order_by(clicks.desc(), self._model.client_info).
+            limit(limit)
+        )
+        result = await db.execute(statement=stmnt)
+        return result.tuples().all()
+
+    async def get_daily_clicks(
+        self,
+        db: AsyncSession,
+        url_id: int
+    ) -> List[Tuple[date, int]]:
+        '''
+        Возвращает число переходов по ссылке за каждый день с переходами.
+
+        Переходы ссылки читаются из индекса (url_id, time).
+        '''
+        day = cast(self._model.time, Date)
+        stmnt = (
+            select(day, func.count()).
+            where(self._model.url_id == url_id).
+            group_by(day).
+            order_by(day)
+        )
+        result = await db.execute(statement=stmnt)
+        return result.tuples().all()
+
+    async def get_click_range(
+        self,
+        db: AsyncSession,
+        url_id: int
+    ) -> Tuple[Optional[datetime], Optional[datetime]]:
+        '''
+        Возвращает время первого и последнего перехода по ссылке.
+
+        Оба значения берутся с краев индекса (url_id, time)
+        и из client_connection_cold для переходов в холодном хранении.
+        '''
+        hot = self._model
+        cold = ClientConnectionCold
+
+        def edge(aggregate, model) -> Any:
+            return (
+                select(aggregate).
+                where(model.url_id == url_id).
+                scalar_subquery()
+            )
+
+        stmnt = select(
+            func.least(
+                edge(func.min(hot.time), hot),
+                edge(func.min(cold.first_click), cold)
+            ),
+            func.greatest(
+                edge(func.max(hot.time), hot),
+                edge(func.max(cold.last_click), cold)
+            )
+        )
+        result = await db.execute(statement=stmnt)
+        return result.tuples().one()
+
+    async def get_click_times(
+        self,
+        db: AsyncSession,
+        url_id: int,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+    ) -> Optional[bytes]:
+        '''
+        Возвращает время переходов по ссылке за [start, end) одним значением.
+
+        Каждое время переводится в микросекунды и int8send в 8 байт
+        big-endian, string_agg склеивает их по возрастанию в один bytea.
+        Драйвер получает одну строку вместо строки на переход,
+        объекты ClientConnection не создаются.
+        '''
+        micros = cast(
+            func.extract('epoch', self._model.time) * 1_000_000, BigInteger
+        )
+        stmnt = (
+            select(
+                func.string_agg(
+                    func.int8send(micros),
+                    aggregate_order_by(
+                        literal(b'', LargeBinary), self._model.time
+                    ),
+                    type_=LargeBinary
+                )
+            ).
+            where(self._model.url_id == url_id)
+        )
+        if start is not None:
+            stmnt = stmnt.where(self._model.time >= start)
+        if end is not None:
+            stmnt = stmnt.where(self._model.time < end)
+        result = await db.execute(statement=stmnt)
+        return result.scalar_one()
+
+    async def take_aged(
+        self,
+        db: AsyncSession,
+        before: datetime,
+        batch_size: int
+    ) -> Tuple[List[int], List[Tuple[int, datetime, Optional[str]]]]:
+        '''
+        Удаляет переходы до before у пачки из batch_size ссылок.
+
+        Ссылки со старыми переходами находятся по BRIN-индексу на time.
+        Строки ссылок блокируются FOR NO KEY UPDATE SKIP LOCKED: новые
+        переходы по ним не ждут, а два воркера не выгружают одну ссылку.
+        Версии ссылок и их владельцев увеличиваются: списки переходов
+        в ответах меняются, и старые ETag не должны совпасть.
+        Транзакция не коммитится, удаленные переходы возвращаются
+        для записи в холодное хранение вместе с id ссылок.
+        '''
+        candidates = (
+            select(self._model.url_id).
+            where(self._model.time < before).
+            distinct().
+            limit(batch_size).
+            scalar_subquery()
+        )
+        locked = await db.execute(
+            select(Url.id).
+            where(Url.id.in_(candidates)).
+            with_for_update(skip_locked=True, key_share=True)
+        )
+        url_ids = locked.scalars().all()
+        if not url_ids:
+            return [], []
+        result = await db.execute(
+            delete(self._model).
+            where(
+                self._model.url_id.in_(url_ids),
+                self._model.time < before
+            ).
+            returning(
+                self._model.url_id, self._model.time, self._model.client_info
+            )
+        )
+        rows = result.tuples().all()
+        if rows:
+            owners = await db.execute(
+                update(Url).
+                where(Url.id.in_({url_id for url_id, _, _ in rows})).
+                values(version=Url.version + 1).
+                returning(Url.user_id)
+            )
+            owners = {user_id for user_id in owners.scalars() if user_id}
+            if owners:
+                await db.execute(
+                    update(User).
+                    where(User.id.in_(owners)).
+                    values(version=User.version + 1)
+                )
+        return url_ids, rows
+
+
+class ColdClickDBManager(
+    DBManager[
+        ClientConnectionCold,
+        ClientConnectionColdBase,
+        ClientConnectionColdBase
+    ]
+):
+    '''Класс для операций над списком файлов холодного хранения.'''
+
+    async def try_lock_export(self, db: AsyncSession) -> bool:
+        '''
+        Берет блокировку выгрузки до конца транзакции сессии.
+
+        Возвращает False, если выгрузку уже ведет другой процесс.
+        '''
+        return await db.scalar(
+            select(func.pg_try_advisory_xact_lock(COLD_EXPORT_LOCK))
+        )
+
+    async def get_paths(self, db: AsyncSession, url_id: int) -> List[str]:
+        '''Возвращает файлы всех выгруженных месяцев ссылки.'''
+        stmnt = (
+            select(self._model.path).
+            where(self._model.url_id == url_id).
+            order_by(self._model.month)
+        )
+        result = await db.execute(statement=stmnt)
+        return result.scalars().all()
+
+    async def get_months(
+        self,
+        db: AsyncSession,
+        url_id: int
+    ) -> List[Tuple[int, str]]:
+        '''Возвращает число переходов и файл месяцев от новых к старым.'''
+        stmnt = (
+            select(self._model.clicks, self._model.path).
+            where(self._model.url_id == url_id).
+            order_by(self._model.month.desc())
+        )
+        result = await db.execute(statement=stmnt)
+        return result.tuples().all()
+
+    async def lock_months(
+        self,
+        db: AsyncSession,
+        keys: List[Tuple[int, date]]
+    ) -> Dict[Tuple[int, date], str]:
+        '''Блокирует уже выгруженные месяцы и возвращает их файлы.'''
+        result = await db.execute(
+            select(self._model.url_id, self._model.month, self._model.path).
+            where(tuple_(self._model.url_id, self._model.month).in_(keys)).
+            with_for_update()
+        )
+        return {
+            (url_id, month): path for url_id, month, path in result.all()
+        }
+
+    async def save_months(
+        self,
+        db: AsyncSession,
+        rows: List[Dict[str, Any]]
+    ) -> None:
+        '''Сохраняет выгруженные месяцы и коммитит транзакцию.'''
+        stmnt = pg_insert(self._model)
+        await db.execute(
+            stmnt.on_conflict_do_update(
+                index_elements=[self._model.url_id, self._model.month],
+                set_={
+                    name: stmnt.excluded[name] for name in (
+                        'clicks', 'first_click', 'last_click', 'path',
+                        'exported_at'
+                    )
+                }
+            ),
+            rows
+        )
+        await db.commit()
+
+
+class UrlVisitorDBManager(
+    DBManager[
+        UrlVisitorSketch,
+        UrlVisitorSketchBase,
+        UpdateUrlVisitorSketch
+    ]
+):
+    '''Класс для операций над дневными скетчами посетителей ссылок.'''
+
+    async def save_sketches(
+        self,
+        db: AsyncSession,
+        sketches: Dict[Tuple[int, date], HyperLogLog]
+    ) -> int:
+        '''
+        Объединяет скетчи с сохраненными в базе.
+
+        Новые дни вставляются одним запросом, скетчи ссылок, которых
+        уже нет в базе, пропускаются. Существующие строки блокируются,
+        объединяются в памяти и обновляются одним запросом, поэтому
+        процессы, сохраняющие один день одновременно, не теряют
+        посетителей друг друга. Возвращает число сохраненных скетчей.
+        '''
+        if not sketches:
+            return 0
+        keys = list(sketches)
+        rows = func.unnest(
+            bindparam('url_ids', [key[0] for key in keys], ARRAY(Integer)),
+            bindparam('days', [key[1] for key in keys], ARRAY(Date)),
+            bindparam(
+                'registers',
+                [sketches[key].to_bytes() for key in keys],
+                ARRAY(LargeBinary)
+            )
+        ).table_valued(
+            column('url_id', Integer),
+            column('day', Date),
+            column('registers', LargeBinary)
+        ).render_derived()
+        result = await db.execute(
+            pg_insert(self._model).
+            from_select(
+                ['url_id', 'day', 'registers'],
+                select(rows).join(Url, Url.id == rows.c.url_id)
+            ).
+            on_conflict_do_nothing().
+            returning(self._model.url_id, self._model.day)
+        )
+        inserted = set(result.all())
+        existing = [key for key in keys if key not in inserted]
+        updated = 0
+        if existing:
+            result = await db.execute(
+                select(self._model).
+                where(
+                    tuple_(self._model.url_id, self._model.day).in_(existing)
+                ).
+                with_for_update()
+            )
+            merged = [
+                {
+                    'url_id': row.url_id,
+                    'day': row.day,
+                    'registers': HyperLogLog(
+                        sketches[row.url_id, row.day].precision, row.registers
+                    ).merge(sketches[row.url_id, row.day]).to_bytes()
+                }
+                for row in result.scalars()
+            ]
+            if merged:
+                await db.execute(update(self._model), merged)
+            updated = len(merged)
+        await db.commit()
+        return len(inserted) + updated
+
+    async def get_union(
+        self,
+        db: AsyncSession,
+        url_id: int,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        precision: int = 12
+    ) -> HyperLogLog:
+        '''
+        Объединяет дневные скетчи ссылки за дни с start по end.
+
+        Объем работы зависит от числа дней, а не от числа переходов.
+        '''
+        stmnt = (
+            select(self._model.registers).
+            where(self._model.url_id == url_id)
+        )
+        if start is not None:
+            stmnt = stmnt.where(self._model.day >= start)
+        if end is not None:
+            stmnt = stmnt.where(self._model.day <= end)
+        result = await db.execute(statement=stmnt)
+        return HyperLogLog.union(
+            (
+                HyperLogLog(precision, registers)
+                for registers in result.scalars()
+            ),
+            precision=precision
+        )
+
 
 class UserDBManager(
     DBManager[User, CreateUser, UpdateUser]
@@ -83,15 +990,49 @@ class UserDBManager(
     async def get_user_by_username(
         self,
         db: AsyncSession,
-        username: str
+        username: str,
+        with_urls: bool = True
     ) -> User:
-        '''Получает объект User по username.'''
+        '''
+        Получает объект User по username.
+
+        Без with_urls ссылки и их переходы не загружаются,
+        а обращение к ним вызывает ошибку вместо скрытого запроса.
+        '''
         stmnt = select(self._model).where(self._model.username == username)
+        if not with_urls:
+            stmnt = stmnt.options(raiseload(self._model.urls))
         logger.info(f'Getting user {username} from database')
         result = await db.execute(statement=stmnt)
         return result.scalar_one_or_none()
 
+    async def get_status_stamp(
+        self,
+        db: AsyncSession,
+        username: str
+    ) -> Optional[UserStamp]:
+        '''
+        Возвращает версию списка ссылок пользователя без загрузки ссылок.
+
+        Версия пользователя меняется при создании, изменении и удалении
+        его ссылок, переходы учитываются по id последнего перехода.
+        '''
+        last_click = (
+            select(func.max(last_click_id(Url.id))).
+            where(Url.user_id == self._model.id).
+            scalar_subquery()
+        )
+        stmnt = (
+            select(self._model.id, self._model.version, last_click).
+            where(self._model.username == username)
+        )
+        result = await db.execute(statement=stmnt)
+        row = result.one_or_none()
+        return None if row is None else UserStamp(*row)
+
 
 url_crud = UrlDBManager(Url)
 client_con_crud = ClientConnectionDBManager(ClientConnection)
+visitor_crud = UrlVisitorDBManager(UrlVisitorSketch)
+cold_crud = ColdClickDBManager(ClientConnectionCold)
 user_crud = UserDBManager(User)
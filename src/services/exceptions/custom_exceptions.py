@@ -6,3 +6,13 @@ class UrlExistsError(BaseException):
 class AccessError(BaseException):
     '''Ошибка доступа к url.'''
     pass
+
+
+class RedirectPolicyError(BaseException):
+    '''Ошибка, если тип переадресации недопустим для ссылки.'''
+    pass
+
+
+class ClockSkewError(BaseException):
+    '''Ошибка, если часы узла отстали и id могут повториться.'''
+    pass
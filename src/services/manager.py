@@ -1,13 +1,42 @@
 import logging
-from typing import Any, Dict, Generic, List, Optional, Union
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Generic, List, Optional, Union
 
-from sqlalchemy import select, delete, update
+from sqlalchemy import delete, insert, inspect, select, update
+from sqlalchemy.engine import Row
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
 
 from .base import BaseDBManager, CreateSchemaType, ModelType, UpdateSchemaType
 
 logger = logging.getLogger(__name__)
 
+UNIT_OF_WORK = 'unit_of_work'
+
+
+@asynccontextmanager
+async def unit_of_work(db: AsyncSession) -> AsyncIterator[AsyncSession]:
+    '''
+    Объединяет несколько записей менеджеров в одну транзакцию.
+
+    Внутри блока менеджеры не коммитят сами, коммит выполняется
+    один раз при выходе, при исключении транзакция откатывается.
+    Вложенный блок присоединяется к внешнему.
+    '''
+    if db.info.get(UNIT_OF_WORK):
+        yield db
+        return
+    db.info[UNIT_OF_WORK] = True
+    try:
+        yield db
+        await db.commit()
+    except BaseException:
+        await db.rollback()
+        raise
+    finally:
+        db.info.pop(UNIT_OF_WORK, None)
+
 
 class DBManager(
     BaseDBManager,
@@ -15,6 +44,62 @@ class DBManager(
 ):
     def __init__(self, model: ModelType):
         self._model = model
+        mapper = inspect(model)
+        self._table = mapper.local_table
+        self._columns = {
+            attr.key: attr.columns[0] for attr in mapper.column_attrs
+        }
+        self._collections = [
+            relationship.key for relationship in mapper.relationships
+            if relationship.uselist
+        ]
+
+    async def _commit(self, db: AsyncSession) -> None:
+        '''Коммитит транзакцию, если запись идет не в unit_of_work.'''
+        if not db.info.get(UNIT_OF_WORK):
+            await db.commit()
+
+    def _load_row(
+        self,
+        db: AsyncSession,
+        row: Row,
+        keys: List[str],
+        db_obj: Optional[ModelType] = None
+    ) -> ModelType:
+        '''
+        Переносит строку из RETURNING в объект модели без запроса к базе.
+
+        keys - колонки, которые вернул RETURNING. Новый объект
+        добавляется в сессию как уже сохраненный, его коллекции
+        заведомо пусты. У существующего объекта обновляются только
+        записанные колонки, загруженные связи не трогаются.
+        '''
+        created = db_obj is None
+        if created:
+            db_obj = self._model()
+        for key in keys:
+            set_committed_value(db_obj, key, row._mapping[self._columns[key]])
+        if created:
+            for key in self._collections:
+                set_committed_value(db_obj, key, [])
+            make_transient_to_detached(db_obj)
+            db.add(db_obj)
+        return db_obj
+
+    async def _before_commit(
+        self,
+        db: AsyncSession,
+        db_obj: ModelType,
+        data: Dict[str, Any],
+        created: bool
+    ) -> None:
+        '''
+        Вызывается в транзакции create и update после записи
+        и перед коммитом.
+
+        Наследники могут добавить в транзакцию свои запросы.
+        '''
+        pass
 
     async def get(self, db: AsyncSession, id: int) -> Optional[ModelType]:
         '''Получает один объект из базы по его id.'''
@@ -41,17 +126,31 @@ class DBManager(
         data_in: CreateSchemaType,
         **kwargs,
     ) -> ModelType:
-        '''Создает объект в базе и возвращает его.'''
+        '''
+        Создает объект в базе и возвращает его.
+
+        Значения по умолчанию, выставленные базой, приходят
+        из RETURNING, поэтому повторно читать объект не нужно.
+        '''
         dict_data = (
             data_in if isinstance(data_in, Dict) else data_in.model_dump()
         )
         if kwargs:
             dict_data.update(kwargs)
-        db_obj = self._model(**dict_data)
-        db.add(db_obj)
+        stmnt = (
+            insert(self._table).
+            values(**dict_data).
+            returning(*self._columns.values())
+        )
         logger.info(f'Creating obj {self.__class__.__name__}.')
-        await db.commit()
-        await db.refresh(db_obj)
+        result = await db.execute(statement=stmnt)
+        db_obj = self._load_row(
+            db=db, row=result.one(), keys=list(self._columns)
+        )
+        await self._before_commit(
+            db=db, db_obj=db_obj, data=dict_data, created=True
+        )
+        await self._commit(db)
         return db_obj
 
     async def update(
@@ -60,19 +159,32 @@ class DBManager(
         db_obj: ModelType,
         data_in: Union[UpdateSchemaType, Dict[str, Any]]
     ) -> ModelType:
-        '''Обновляет объект в базе и возвращает его.'''
+        '''
+        Обновляет объект в базе и возвращает его.
+
+        Из схемы записываются только переданные поля. RETURNING
+        возвращает только записанные колонки: остальные у объекта
+        уже есть, а короткий запрос быстрее собирается.
+        '''
         dict_data = (
-            data_in if isinstance(data_in, Dict) else data_in.model_dump()
+            data_in if isinstance(data_in, Dict)
+            else data_in.model_dump(exclude_unset=True)
         )
         stmnt = (
-            update(self._model).
-            where(self._model.id == db_obj.id).
-            values(**dict_data)
+            update(self._table).
+            where(self._table.c.id == db_obj.id).
+            values(**dict_data).
+            returning(*(self._columns[key] for key in dict_data))
         )
         logger.info(f'Updating object {self.__class__.__name__}.')
-        await db.execute(statement=stmnt)
-        await db.commit()
-        await db.refresh(db_obj)
+        result = await db.execute(statement=stmnt)
+        db_obj = self._load_row(
+            db=db, row=result.one(), keys=list(dict_data), db_obj=db_obj
+        )
+        await self._before_commit(
+            db=db, db_obj=db_obj, data=dict_data, created=False
+        )
+        await self._commit(db)
         return db_obj
 
     async def delete(self, db: AsyncSession, id: int) -> bool:
@@ -80,5 +192,5 @@ class DBManager(
         stmnt = delete(self._model).where(self._model.id == id)
         logger.info(f'Delete obj {self.__class__.__name__}.')
         await db.execute(statement=stmnt)
-        await db.commit()
+        await self._commit(db)
         return True
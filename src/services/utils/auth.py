@@ -1,7 +1,7 @@
 import logging
 import re
 from datetime import datetime, timedelta
-from typing import Annotated
+from typing import Annotated, Optional
 
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status
@@ -62,14 +62,13 @@ def validate_password(password: str) -> bool:
         return True
 
 
-async def get_current_user(
-    token: Annotated[str, Depends(oauth2_scheme)],
-    db: Annotated[AsyncSession, Depends(get_session)]
-) -> FullUser:
+async def get_token_username(
+    token: Annotated[str, Depends(oauth2_scheme)]
+) -> Optional[str]:
     '''
-    Проверяет токен пользователя.
+    Проверяет токен пользователя без обращения к базе.
 
-    Если пользователь найден в базе, возвращает объект пользователя.
+    Возвращает имя пользователя из токена или None, если токена нет.
     '''
     credentials_error = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -90,22 +89,60 @@ async def get_current_user(
         token_data = TokenData(username=username)
     except JWTError:
         raise credentials_error
+    return token_data.username
+
+
+async def get_current_user(
+    username: Annotated[Optional[str], Depends(get_token_username)],
+    db: Annotated[AsyncSession, Depends(get_session)]
+) -> FullUser:
+    '''
+    Проверяет токен пользователя.
+
+    Если пользователь найден в базе, возвращает объект пользователя.
+    '''
+    if username is None:
+        return None
     user = await user_crud.get_user_by_username(
-        db=db,
-        username=token_data.username
+        db=db, username=username, with_urls=False
     )
     if user is None:
-        raise credentials_error
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail='Authentication credentials not found.',
+            headers={'WWW-Authenticate': 'Bearer'}
+        )
     return user
 
 
+async def get_admin_user(
+    current_user: Annotated[FullUser, Depends(get_current_user)]
+) -> FullUser:
+    '''Пропускает только пользователей из списка ADMIN_USERNAMES.'''
+    if current_user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail='Authentication credentials were not provided.',
+            headers={'WWW-Authenticate': 'Bearer'}
+        )
+    if current_user.username not in app_settings.ADMIN_USERNAMES.split():
+        logger.error(f'User {current_user.username} tried admin access.')
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail='Available for administrators only.'
+        )
+    return current_user
+
+
 async def authenticate_user(
     db: AsyncSession,
     username: str,
     password: str
 ) -> FullUser:
     '''Авторизует и возвращает пользователя.'''
-    user = await user_crud.get_user_by_username(db=db, username=username)
+    user = await user_crud.get_user_by_username(
+        db=db, username=username, with_urls=False
+    )
     if not user:
         return False
     if not verify_password(password, user.password):
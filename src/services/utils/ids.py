@@ -0,0 +1,164 @@
+import fcntl
+import logging
+import os
+import time
+from threading import Lock
+from typing import Callable, List, Optional, Tuple
+
+from core.config import app_settings
+from services.exceptions.custom_exceptions import ClockSkewError
+
+logger = logging.getLogger(__name__)
+
+BASE62_ALPHABET = (
+    '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+)
+TIMESTAMP_BITS = 41
+
+# дескрипторы файлов с занятыми номерами воркеров
+_slot_locks: List[int] = []
+
+
+def now_ms() -> int:
+    return time.time_ns() // 1_000_000
+
+
+def encode_base62(number: int) -> str:
+    '''Кодирует неотрицательное число в base62.'''
+    if number == 0:
+        return BASE62_ALPHABET[0]
+    digits = []
+    while number:
+        number, digit = divmod(number, 62)
+        digits.append(BASE62_ALPHABET[digit])
+    return ''.join(reversed(digits))
+
+
+def decode_base62(code: str) -> int:
+    number = 0
+    for char in code:
+        number = number * 62 + BASE62_ALPHABET.index(char)
+    return number
+
+
+class SnowflakeGenerator:
+    '''
+    Генератор уникальных id без обращения к базе.
+
+    id - 63-битное число: миллисекунды от epoch_ms, номер узла
+    и порядковый номер внутри миллисекунды. Пока номера узлов различны,
+    узлы не могут выдать одинаковый id и ни о чем не договариваются.
+
+    Если часы отстали (NTP, перевод времени) или номера в текущей
+    миллисекунде кончились, генератор продолжает выдавать id
+    от последней использованной миллисекунды, забегая вперед
+    не больше чем на max_skew_ms. Большее расхождение означает,
+    что id могут повториться, и вызывает ClockSkewError.
+    '''
+
+    def __init__(
+        self,
+        node_id: int,
+        node_bits: int = 10,
+        sequence_bits: int = 12,
+        epoch_ms: int = 0,
+        max_skew_ms: int = 50,
+        clock: Callable[[], int] = now_ms
+    ):
+        if TIMESTAMP_BITS + node_bits + sequence_bits > 63:
+            raise ValueError('Snowflake id must fit into 63 bits')
+        if not 0 <= node_id < 1 << node_bits:
+            raise ValueError(f'Node id must be in [0, {1 << node_bits})')
+        self.node_id = node_id
+        self.epoch_ms = epoch_ms
+        self.max_skew_ms = max_skew_ms
+        self.node_bits = node_bits
+        self.sequence_bits = sequence_bits
+        self.timestamp_shift = node_bits + sequence_bits
+        self._max_sequence = (1 << sequence_bits) - 1
+        self._clock = clock
+        self._last = -1
+        self._sequence = 0
+        self._lock = Lock()
+
+    def next_id(self) -> int:
+        with self._lock:
+            now = self._clock() - self.epoch_ms
+            if now > self._last:
+                self._last, self._sequence = now, 0
+            elif self._sequence < self._max_sequence:
+                self._sequence += 1
+            else:
+                self._last, self._sequence = self._last + 1, 0
+            if self._last - now > self.max_skew_ms:
+                raise ClockSkewError(
+                    f'Clock is {self._last - now} ms behind last id'
+                )
+            return (
+                self._last << self.timestamp_shift
+                | self.node_id << self.sequence_bits
+                | self._sequence
+            )
+
+    def next_code(self) -> str:
+        '''Возвращает следующий id в виде короткого кода для url.'''
+        return encode_base62(self.next_id())
+
+    def parse(self, snowflake: int) -> Tuple[int, int, int]:
+        '''Раскладывает id на время в мс, номер узла и порядковый номер.'''
+        return (
+            (snowflake >> self.timestamp_shift) + self.epoch_ms,
+            snowflake >> self.sequence_bits & (1 << self.node_bits) - 1,
+            snowflake & self._max_sequence
+        )
+
+
+def claim_worker_slot(lock_dir: str, node_id: int, slots: int) -> int:
+    '''
+    Занимает свободный номер воркера на этой машине.
+
+    Воркеры одного узла различаются номером, занятым через flock
+    файла в lock_dir. Блокировка снимается при завершении процесса,
+    поэтому номер перезапущенного воркера освобождается сам.
+    '''
+    for slot in range(slots):
+        path = os.path.join(lock_dir, f'url_shortener_node{node_id}.{slot}')
+        descriptor = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(descriptor, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(descriptor)
+            continue
+        # дескриптор держит блокировку до конца процесса
+        _slot_locks.append(descriptor)
+        return slot
+    raise RuntimeError(f'All {slots} worker slots of node {node_id} are busy')
+
+
+_generator: Optional[SnowflakeGenerator] = None
+
+
+def get_id_generator() -> SnowflakeGenerator:
+    '''
+    Возвращает генератор процесса.
+
+    Номер узла складывается из SNOWFLAKE_NODE_ID из настроек
+    и номера воркера, который занимается при первом вызове.
+    '''
+    global _generator
+    if _generator is None:
+        worker_bits = app_settings.SNOWFLAKE_WORKER_BITS
+        worker = claim_worker_slot(
+            lock_dir=app_settings.SNOWFLAKE_LOCK_DIR,
+            node_id=app_settings.SNOWFLAKE_NODE_ID,
+            slots=1 << worker_bits
+        ) if worker_bits else 0
+        _generator = SnowflakeGenerator(
+            node_id=app_settings.SNOWFLAKE_NODE_ID << worker_bits | worker,
+            node_bits=app_settings.SNOWFLAKE_NODE_BITS,
+            sequence_bits=app_settings.SNOWFLAKE_SEQUENCE_BITS,
+            epoch_ms=app_settings.SNOWFLAKE_EPOCH_MS,
+            max_skew_ms=app_settings.SNOWFLAKE_MAX_CLOCK_SKEW_MS
+        )
+        logger.info(f'Snowflake node id {_generator.node_id}')
+    return _generator
@@ -0,0 +1,132 @@
+from hashlib import blake2b
+from typing import Any, Dict, Iterable, Optional, Tuple
+from urllib.parse import urlencode
+
+from fastapi import status
+from fastapi.responses import ORJSONResponse, RedirectResponse, Response
+from sqlalchemy import inspect
+from sqlalchemy.orm.base import NO_VALUE
+
+from core.config import app_settings
+from models import Url
+from models.schemas.utils import RedirectTypes
+from services.cache.redirect import CachedUrl
+
+
+def url_to_dict(url_obj: Url) -> Dict[str, Any]:
+    '''
+    Собирает ответ по схеме FullUrl напрямую из атрибутов объекта url.
+
+    Незагруженный список соединений не подгружается из базы,
+    а отдается пустым: так бывает только у только что созданной ссылки.
+    Переходы из холодного хранения в список не входят.
+    '''
+    connections = inspect(url_obj).attrs.connections.loaded_value
+    if connections is NO_VALUE:
+        connections = []
+    return {
+        'original_url': url_obj.original_url,
+        'short_url': url_obj.short_url,
+        'created': url_obj.created,
+        'url_type': url_obj.url_type,
+        'redirect_type': url_obj.redirect_type,
+        'cache_max_age': url_obj.cache_max_age,
+        'expires_at': url_obj.expires_at,
+        'user_id': url_obj.user_id,
+        'connections': [
+            {
+                'time': connection.time,
+                'client_info': connection.client_info,
+                'url_id': connection.url_id
+            }
+            for connection in connections
+        ]
+    }
+
+
+def url_response(
+    url_obj: Url,
+    status_code: int = status.HTTP_200_OK
+) -> ORJSONResponse:
+    '''
+    Возвращает готовый ответ с данными url.
+
+    FastAPI не валидирует повторно возвращенный Response,
+    поэтому response_model ручки остается только для схемы OpenAPI.
+    '''
+    return ORJSONResponse(
+        content=url_to_dict(url_obj),
+        status_code=status_code
+    )
+
+
+def json_response(
+    body: bytes,
+    status_code: int = status.HTTP_200_OK
+) -> Response:
+    '''Возвращает ответ с уже отрендеренным телом json.'''
+    return Response(
+        content=body,
+        status_code=status_code,
+        media_type='application/json'
+    )
+
+
+def redirect_response(entry: CachedUrl) -> RedirectResponse:
+    '''
+    Возвращает переадресацию по политике ссылки.
+
+    Временная переадресация (307) не кэшируется, и каждый переход
+    доходит до сервиса. Постоянная (308) отдается с Cache-Control,
+    повторные переходы обслуживает кэш браузера или CDN.
+    '''
+    if entry.redirect_type != RedirectTypes.PERMANENT:
+        return RedirectResponse(url=entry.original_url)
+    max_age = (
+        app_settings.PERMANENT_REDIRECT_MAX_AGE
+        if entry.cache_max_age is None else entry.cache_max_age
+    )
+    return RedirectResponse(
+        url=entry.original_url,
+        status_code=status.HTTP_308_PERMANENT_REDIRECT,
+        headers={'Cache-Control': f'public, max-age={max_age}'}
+    )
+
+
+def make_etag(*parts: Any) -> str:
+    '''Собирает ETag из частей версии ресурса.'''
+    return '"' + '.'.join(
+        '0' if part is None else str(part) for part in parts
+    ) + '"'
+
+
+def query_tag(params: Iterable[Tuple[str, str]]) -> Optional[str]:
+    '''
+    Короткий отпечаток параметров запроса для ETag.
+
+    Параметры сортируются, поэтому их порядок в url не важен.
+    '''
+    items = sorted(params)
+    if not items:
+        return None
+    return blake2b(urlencode(items).encode(), digest_size=8).hexdigest()
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    '''Проверяет заголовок If-None-Match (слабое сравнение).'''
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    return any(
+        tag.strip().removeprefix('W/') == etag
+        for tag in if_none_match.split(',')
+    )
+
+
+def not_modified(etag: str) -> Response:
+    '''Возвращает пустой ответ 304 Not Modified.'''
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED,
+        headers={'ETag': etag}
+    )
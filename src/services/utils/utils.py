@@ -1,40 +1,50 @@
-from typing import Annotated, List
-from uuid import uuid4
+import logging
+from datetime import datetime
+from typing import List, Optional
 
-from fastapi import Depends
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import HTTPException, status
 
-from db.db import get_session
 from core.config import HOST_URL
 from models.schemas.db_schemas import FullUrl, FullUser
-from models.schemas.utils import UrlTypes
-from services.entities import url_crud
-
-
-async def shorten_url(
-    db: Annotated[AsyncSession, Depends(get_session)]
-) -> str:
-    '''Гененирует рандомную короткую ссылку.'''
-    random_name = str(uuid4())[:6]
-    short_url = f'{HOST_URL}/{random_name}'
-    url_in_db = await url_crud.get_obj_by_short_url(
-        db=db,
-        short_url=short_url
-    )
-    if url_in_db is not None:
-        shorten_url(db=db)
-    return short_url
+from models.schemas.utils import RedirectTypes, UrlTypes
+from services.entities import UrlStamp
+from services.exceptions.custom_exceptions import ClockSkewError
+from services.utils.ids import get_id_generator
+
+logger = logging.getLogger(__name__)
+
+
+async def shorten_url() -> str:
+    '''
+    Генерирует короткую ссылку без обращения к базе.
+
+    Код - snowflake id процесса в base62, коды разных узлов и воркеров
+    не пересекаются, поэтому проверять занятость кода в базе не нужно.
+    '''
+    try:
+        code = get_id_generator().next_code()
+    except ClockSkewError as err:
+        logger.error(f'Error generating short url: {err}')
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail='Error generating short url, try later.'
+        )
+    return f'{HOST_URL}/{code}'
 
 
 def check_url_exists(url_obj: FullUrl):
     '''
     Проверяет наличие url в базе.
 
-    Если url помечен как удаленный или он отсутствует,
+    Если url помечен как удаленный, истек или он отсутствует,
     вызывается исключение.
     '''
     if not url_obj or url_obj.deleted:
         return False
+    if url_obj.expires_at is not None and (
+        url_obj.expires_at <= datetime.utcnow()
+    ):
+        return False
     return True
 
 
@@ -68,6 +78,16 @@ def check_read_permission(url_obj: FullUrl, current_user: FullUser):
     return False
 
 
+def check_stamp_read_permission(stamp: UrlStamp, username: Optional[str]):
+    '''Проверяет доступ к ссылке по ее версии и имени пользователя.'''
+    if (
+        stamp.url_type == UrlTypes.PUBLIC
+        or (username is not None and username == stamp.owner)
+    ):
+        return True
+    return False
+
+
 def check_update_permission(url_obj: FullUrl, current_user: FullUser):
     '''Проверяет доступность объекта url для редактирования пользователем.'''
     if (
@@ -76,3 +96,23 @@ def check_update_permission(url_obj: FullUrl, current_user: FullUser):
     ):
         return True
     return False
+
+
+def check_redirect_policy(
+    url_type: Optional[str],
+    redirect_type: str,
+    expires_at: Optional[datetime] = None
+):
+    '''
+    Проверяет, допустим ли тип переадресации для ссылки.
+
+    Постоянную переадресацию браузеры и CDN кэшируют и больше
+    не спрашивают сервер, поэтому проверить доступ к приватной
+    ссылке или ее истечение было бы уже нельзя.
+    '''
+    if redirect_type != RedirectTypes.PERMANENT:
+        return True
+    return (
+        (url_type or UrlTypes.PUBLIC) == UrlTypes.PUBLIC
+        and expires_at is None
+    )
@@ -0,0 +1,120 @@
+import logging
+from datetime import date, datetime
+from typing import Callable, Dict, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import app_settings
+from services.cache.sketch import HyperLogLog
+from services.entities import visitor_crud
+
+logger = logging.getLogger(__name__)
+
+SketchKey = Tuple[int, date]
+
+
+def visitor_id(host: Optional[str], user_agent: Optional[str]) -> str:
+    '''Посетитель определяется адресом и user-agent клиента.'''
+    return f'{host or ""}|{user_agent or ""}'
+
+
+class VisitorCounter:
+    '''
+    Уникальные посетители ссылок, еще не сохраненные в базу.
+
+    Переход добавляет посетителя в скетч HyperLogLog ссылки за текущий
+    день в памяти процесса, база при переходе не используется.
+    Накопленные скетчи периодически объединяются с сохраненными.
+    '''
+
+    def __init__(self, precision: int):
+        self.precision = precision
+        self._pending: Dict[SketchKey, HyperLogLog] = {}
+
+    def add(
+        self,
+        url_id: int,
+        visitor: str,
+        now: Optional[datetime] = None
+    ) -> None:
+        '''Учитывает посетителя ссылки, visitor - адрес и user-agent.'''
+        key = (url_id, (now or datetime.utcnow()).date())
+        sketch = self._pending.get(key)
+        if sketch is None:
+            sketch = self._pending[key] = HyperLogLog(self.precision)
+        sketch.add(visitor)
+
+    def pending(
+        self,
+        url_id: int,
+        start: Optional[date] = None,
+        end: Optional[date] = None
+    ) -> HyperLogLog:
+        '''Объединение несохраненных скетчей ссылки за дни с start по end.'''
+        return HyperLogLog.union(
+            (
+                sketch for (key_id, day), sketch in self._pending.items()
+                if key_id == url_id
+                and (start is None or day >= start)
+                and (end is None or day <= end)
+            ),
+            precision=self.precision
+        )
+
+    def take(self) -> Dict[SketchKey, HyperLogLog]:
+        '''Забирает накопленные скетчи для сохранения.'''
+        pending, self._pending = self._pending, {}
+        return pending
+
+    def restore(self, sketches: Dict[SketchKey, HyperLogLog]) -> None:
+        '''Возвращает скетчи, которые не удалось сохранить.'''
+        for key, sketch in sketches.items():
+            current = self._pending.get(key)
+            self._pending[key] = (
+                sketch if current is None else current.merge(sketch)
+            )
+
+    async def unique_visitors(
+        self,
+        db: AsyncSession,
+        url_id: int,
+        start: Optional[date] = None,
+        end: Optional[date] = None
+    ) -> int:
+        '''Оценивает число уникальных посетителей за дни с start по end.'''
+        sketch = await visitor_crud.get_union(
+            db=db,
+            url_id=url_id,
+            start=start,
+            end=end,
+            precision=self.precision
+        )
+        return sketch.merge(self.pending(url_id, start, end)).count()
+
+
+visitor_counter = VisitorCounter(
+    precision=app_settings.VISITOR_SKETCH_PRECISION
+)
+
+
+async def flush_visitors(
+    session_factory: Callable[[], AsyncSession],
+    counter: VisitorCounter = visitor_counter
+) -> int:
+    '''
+    Сохраняет накопленные скетчи посетителей в базу.
+
+    При ошибке скетчи возвращаются в буфер и сохраняются
+    при следующем запуске. Возвращает число сохраненных скетчей.
+    '''
+    sketches = counter.take()
+    if not sketches:
+        return 0
+    try:
+        async with session_factory() as db:
+            saved = await visitor_crud.save_sketches(db=db, sketches=sketches)
+    except BaseException:
+        counter.restore(sketches)
+        raise
+    logger.info(f'Saved {saved} visitor sketches.')
+    return saved
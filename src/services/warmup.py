@@ -0,0 +1,80 @@
+import asyncio
+import logging
+import time
+
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from core.config import app_settings
+from db.db import async_session, engine
+from services.cache.redirect import redirect_cache
+from services.entities import url_crud, user_crud
+
+logger = logging.getLogger(__name__)
+
+# заведомо несуществующие значения для прогона горячих запросов
+WARMUP_SHORT_URL = '__warmup__'
+WARMUP_USERNAME = '__warmup__'
+
+
+async def _prepare_connection(connection: AsyncConnection) -> None:
+    '''Выполняет горячие запросы на соединении.'''
+    async with AsyncSession(bind=connection) as db:
+        await url_crud.get_redirect_target(db=db, short_url=WARMUP_SHORT_URL)
+        await url_crud.get_obj_by_short_url(
+            db=db,
+            short_url=WARMUP_SHORT_URL
+        )
+        await user_crud.get_user_by_username(
+            db=db,
+            username=WARMUP_USERNAME
+        )
+
+
+async def warm_pool(size: int) -> int:
+    '''
+    Открывает size соединений пула и готовит на них горячие запросы.
+
+    Компилированные запросы SQLAlchemy и подготовленные выражения asyncpg
+    кэшируются, поэтому первые запросы пользователей их не ждут.
+    Возвращает число открытых соединений.
+    '''
+    size = min(size, engine.pool.size())
+    if size <= 0:
+        return 0
+    connections = await asyncio.gather(
+        *(engine.connect() for _ in range(size))
+    )
+    try:
+        await asyncio.gather(
+            *(_prepare_connection(connection) for connection in connections)
+        )
+    finally:
+        for connection in connections:
+            await connection.close()
+    return size
+
+
+async def load_hot_urls(limit: int) -> int:
+    '''
+    Загружает самые популярные ссылки в кэш переадресаций.
+
+    Общий кэш, уже прогретый другим воркером, повторно не загружается.
+    '''
+    if limit <= 0 or len(redirect_cache) >= limit:
+        return 0
+    async with async_session() as db:
+        entries = await url_crud.get_top_clicked(db=db, limit=limit)
+    for entry in entries:
+        redirect_cache.set(entry)
+    return len(entries)
+
+
+async def warmup() -> None:
+    '''Прогревает пул соединений и кэш переадресаций.'''
+    start = time.perf_counter()
+    connections = await warm_pool(app_settings.WARMUP_POOL_CONNECTIONS)
+    urls = await load_hot_urls(app_settings.WARMUP_TOP_URLS)
+    logger.info(
+        f'Warmup finished in {time.perf_counter() - start:.3f}s: '
+        f'{connections} pool connections, {urls} hot urls cached.'
+    )
@@ -0,0 +1,84 @@
+import contextlib
+from typing import Any, AsyncGenerator, Callable, Iterator, List, Optional
+
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient
+from sqlalchemy import event
+
+from core.config import HOST_URL
+from db.db import engine
+from main import app
+
+
+@pytest_asyncio.fixture(scope='session')
+async def client() -> AsyncGenerator[AsyncClient, Any]:
+    '''Асинхронный клиент для pytest.'''
+    async with AsyncClient(app=app, base_url=HOST_URL) as client:
+        yield client
+
+
+class QueryCounter:
+    '''Запросы к базе и число полученных ими строк.'''
+
+    def __init__(self):
+        self.statements: List[str] = []
+        self.rows = 0
+
+    def before_execute(self, conn, cursor, statement, *args) -> None:
+        self.statements.append(' '.join(statement.split()))
+
+    def after_execute(self, conn, cursor, *args) -> None:
+        self.rows += max(cursor.rowcount, 0)
+
+    @contextlib.contextmanager
+    def listen(self) -> Iterator['QueryCounter']:
+        sync_engine = engine.sync_engine
+        event.listen(sync_engine, 'before_cursor_execute', self.before_execute)
+        event.listen(sync_engine, 'after_cursor_execute', self.after_execute)
+        try:
+            yield self
+        finally:
+            event.remove(
+                sync_engine, 'before_cursor_execute', self.before_execute
+            )
+            event.remove(
+                sync_engine, 'after_cursor_execute', self.after_execute
+            )
+
+    def report(self) -> str:
+        return '\n'.join(
+            f'{number}. {statement}'
+            for number, statement in enumerate(self.statements, start=1)
+        )
+
+
+@pytest.fixture
+def query_budget() -> Callable[..., Any]:
+    '''
+    Проверяет, что код укладывается в бюджет запросов к базе.
+
+        with query_budget(queries=1, rows=10):
+            await client.get(short_url)
+
+    При превышении тест падает со списком выполненных запросов.
+    '''
+    @contextlib.contextmanager
+    def budget(
+        queries: int,
+        rows: Optional[int] = None
+    ) -> Iterator[QueryCounter]:
+        with QueryCounter().listen() as counter:
+            yield counter
+        if len(counter.statements) > queries:
+            pytest.fail(
+                f'Expected at most {queries} queries, '
+                f'got {len(counter.statements)}:\n{counter.report()}'
+            )
+        if rows is not None and counter.rows > rows:
+            pytest.fail(
+                f'Expected at most {rows} rows, '
+                f'got {counter.rows}:\n{counter.report()}'
+            )
+
+    return budget
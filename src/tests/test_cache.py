@@ -0,0 +1,389 @@
+import multiprocessing
+from array import array
+from datetime import datetime, timedelta
+
+import pytest
+
+from models.schemas.utils import normalize_url
+from services.cache import sketch as sketch_module
+from services.cache.bloom import BloomFilter
+from services.cache.dedup import AnonymousUrlCache
+from services.cache.negative import NegativeCache
+from services.cache.redirect import CachedUrl, RedirectCache
+from services.cache.shared import SharedRedirectCache
+from services.cache.short_urls import ShortUrlFilter
+from services.cache.sketch import CountMinSketch, HeavyHitters, HyperLogLog
+from services.cache.summary import SummaryCache
+
+
+class FakeClock:
+    '''Управляемые часы для проверки времени жизни записей.'''
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestBloomFilter:
+    '''Класс с тестами фильтра Блума.'''
+
+    def test_no_false_negatives(self):
+        '''Проверяет, что добавленные ключи всегда находятся.'''
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        keys = [f'http://127.0.0.1:8080/{i:06x}' for i in range(1000)]
+        for key in keys:
+            bloom.add(key)
+        assert all(key in bloom for key in keys)
+
+    def test_false_positive_rate(self):
+        '''Проверяет долю ложноположительных ответов.'''
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add(f'present-{i}')
+        false_positives = sum(f'absent-{i}' in bloom for i in range(10000))
+        assert false_positives < 300
+
+    def test_max_bytes(self):
+        '''Проверяет ограничение памяти фильтра.'''
+        bloom = BloomFilter(capacity=10 ** 6, error_rate=0.001, max_bytes=1024)
+        assert bloom.nbytes == 1024
+
+
+class TestNegativeCache:
+    '''Класс с тестами кэша отсутствующих ссылок.'''
+
+    def test_ttl(self):
+        '''Проверяет, что запись истекает через ttl секунд.'''
+        clock = FakeClock()
+        cache = NegativeCache(max_size=10, ttl=5, clock=clock)
+        cache.add('missing')
+        assert 'missing' in cache
+        clock.now = 5
+        assert 'missing' not in cache
+        assert len(cache) == 0
+
+    def test_max_size(self):
+        '''Проверяет вытеснение самых старых записей.'''
+        cache = NegativeCache(max_size=2, ttl=60)
+        for key in ('a', 'b', 'c'):
+            cache.add(key)
+        assert 'a' not in cache
+        assert 'b' in cache and 'c' in cache
+
+    def test_discard(self):
+        '''Проверяет удаление записи при создании ссылки.'''
+        cache = NegativeCache(max_size=10, ttl=60)
+        cache.add('code')
+        cache.discard('code')
+        assert 'code' not in cache
+
+
+class TestAnonymousUrlCache:
+    '''Класс с тестами кэша создания ссылок без владельца.'''
+
+    def test_normalized_key(self):
+        '''Проверяет, что варианты записи одного url дают один ключ.'''
+        assert normalize_url('HTTPS://Example.COM:443') == (
+            normalize_url('https://example.com/')
+        )
+        assert normalize_url('https://example.com/A') != (
+            normalize_url('https://example.com/a')
+        )
+        cache = AnonymousUrlCache(max_size=10, ttl=60)
+        cache.set('http://Example.com:80/x', 'short', b'{}')
+        assert cache.get('http://example.com/x') == b'{}'
+
+    def test_evict_by_short_url_and_ttl(self):
+        '''Проверяет удаление записи по ссылке и истечение записи.'''
+        clock = FakeClock()
+        cache = AnonymousUrlCache(max_size=10, ttl=5, clock=clock)
+        cache.set('https://a.com/', 'short-a', b'a')
+        cache.set('https://b.com/', 'short-b', b'b')
+        cache.evict('short-a')
+        assert cache.get('https://a.com/') is None
+        clock.now = 5
+        assert cache.get('https://b.com/') is None
+        assert len(cache) == 0
+
+    def test_expires_with_url(self):
+        '''Проверяет, что запись не переживает истекающую ссылку.'''
+        clock = FakeClock()
+        cache = AnonymousUrlCache(max_size=10, ttl=60, clock=clock)
+        expires_at = datetime.utcnow() + timedelta(seconds=10)
+        cache.set('https://a.com/', 'short-a', b'a', expires_at)
+        cache.set('https://b.com/', 'short-b', b'b', datetime.utcnow())
+        assert cache.get('https://a.com/') == b'a'
+        assert cache.get('https://b.com/') is None
+        clock.now = 10
+        assert cache.get('https://a.com/') is None
+
+    def test_max_size(self):
+        '''Проверяет вытеснение давно использованных записей.'''
+        cache = AnonymousUrlCache(max_size=2, ttl=60)
+        for key in ('a', 'b', 'c'):
+            cache.set(f'https://{key}.com/', f'short-{key}', key.encode())
+        assert cache.get('https://a.com/') is None
+        cache.evict('short-a')
+        assert len(cache) == 2
+
+
+class TestSummaryCache:
+    '''Класс с тестами кэша сводной статистики.'''
+
+    def test_ttl_and_version(self):
+        '''Проверяет срок жизни сводки и новую версию ссылки.'''
+        clock = FakeClock()
+        cache = SummaryCache(max_size=2, ttl=10, clock=clock)
+        cache.set((1, 1, 10), {'first_click': None})
+        assert cache.get((1, 1, 10)) == {'first_click': None}
+        assert cache.get((1, 2, 10)) is None
+        clock.now += 10
+        assert cache.get((1, 1, 10)) is None
+
+    def test_max_size(self):
+        '''Проверяет вытеснение давно использованных сводок.'''
+        cache = SummaryCache(max_size=2, ttl=10, clock=FakeClock())
+        for url_id in (1, 2):
+            cache.set((url_id, 1, 10), {})
+        cache.get((1, 1, 10))
+        cache.set((3, 1, 10), {})
+        assert cache.get((2, 1, 10)) is None
+        assert len(cache) == 2
+
+
+class TestShortUrlFilter:
+    '''Класс с тестами фильтра коротких ссылок.'''
+
+    def test_not_ready_passes_everything(self):
+        '''Проверяет, что непостроенный фильтр не отсекает ссылки.'''
+        url_filter = ShortUrlFilter(capacity=100, error_rate=0.01)
+        assert not url_filter.ready
+        assert url_filter.might_contain('anything')
+
+
+def make_entry(code: str) -> CachedUrl:
+    '''Создает запись кэша переадресаций.'''
+    return CachedUrl(
+        id=1,
+        short_url=f'http://127.0.0.1:8080/{code}',
+        original_url='https://docs.python.org',
+        url_type='public',
+        user_id=None
+    )
+
+
+class TestRedirectCache:
+    '''Класс с тестами кэша переадресаций.'''
+
+    def test_lru_eviction(self):
+        '''Проверяет вытеснение давно не использованной записи.'''
+        cache = RedirectCache(max_size=2, ttl=60)
+        first, second, third = (make_entry(code) for code in 'abc')
+        cache.set(first)
+        cache.set(second)
+        assert cache.get(first.short_url) == first
+        cache.set(third)
+        assert cache.get(second.short_url) is None
+        assert cache.get(first.short_url) == first
+
+    def test_ttl_and_evict(self):
+        '''Проверяет истечение и явное удаление записи.'''
+        clock = FakeClock()
+        cache = RedirectCache(max_size=10, ttl=5, clock=clock)
+        entry = make_entry('a')
+        cache.set(entry, ttl=1)
+        clock.now = 1
+        assert cache.get(entry.short_url) is None
+        cache.set(entry)
+        cache.evict(entry.short_url)
+        assert cache.get(entry.short_url) is None
+
+    def test_ttl_capped_by_expiry(self):
+        '''Проверяет, что запись не живет дольше истекающей ссылки.'''
+        clock = FakeClock()
+        cache = RedirectCache(max_size=10, ttl=60, clock=clock)
+        expired = make_entry('a')._replace(
+            expires_at=datetime.utcnow() - timedelta(seconds=1)
+        )
+        cache.set(expired)
+        assert cache.get(expired.short_url) is None
+        expiring = make_entry('b')._replace(
+            expires_at=datetime.utcnow() + timedelta(seconds=30)
+        )
+        cache.set(expiring)
+        assert cache.get(expiring.short_url) == expiring
+        clock.now = 31
+        assert cache.get(expiring.short_url) is None
+
+    def test_admission_keeps_hot_entry(self):
+        '''Проверяет, что редкая ссылка не вытесняет популярную.'''
+        hitters = HeavyHitters(width=256, depth=4, top_k=4, window=1000)
+        cache = RedirectCache(max_size=1, ttl=60, admission=hitters.admit)
+        hot, cold = make_entry('hot'), make_entry('cold')
+        for _ in range(3):
+            hitters.record(hot.short_url)
+        cache.set(hot)
+        hitters.record(cold.short_url)
+        cache.set(cold)
+        assert cache.get(cold.short_url) is None
+        assert cache.get(hot.short_url) == hot
+
+
+class TestHeavyHitters:
+    '''Класс с тестами поиска популярных ссылок.'''
+
+    def test_sketch_never_underestimates(self):
+        '''Проверяет, что оценка не меньше настоящей частоты.'''
+        sketch = CountMinSketch(width=16, depth=3)
+        counts = {f'key-{number}': number for number in range(50)}
+        for key, count in counts.items():
+            for _ in range(count):
+                sketch.add(key)
+        assert all(
+            sketch.estimate(key) >= count for key, count in counts.items()
+        )
+
+    @pytest.mark.parametrize('vectorized', [True, False])
+    def test_halve(self, vectorized, monkeypatch):
+        '''Проверяет, что деление не переносит биты между счетчиками.'''
+        if vectorized:
+            pytest.importorskip('numpy')
+        else:
+            monkeypatch.setattr(sketch_module, 'np', None)
+        sketch = CountMinSketch(width=4, depth=2)
+        top = 1 << (sketch._rows[0].itemsize * 8 - 1)
+        sketch._rows[0][:] = array('L', [1, 3, top + 1, 0])
+        sketch._rows[1][:] = array('L', [5, 1, 1, top * 2 - 1])
+        sketch.halve()
+        assert list(sketch._rows[0]) == [0, 1, top >> 1, 0]
+        assert list(sketch._rows[1]) == [2, 0, 0, top - 1]
+
+    def test_top_and_decay(self):
+        '''Проверяет топ ссылок и забывание старых переходов.'''
+        hitters = HeavyHitters(width=1024, depth=4, top_k=2, window=1000)
+        for key, count in (('a', 5), ('b', 3), ('c', 1)):
+            for _ in range(count):
+                hitters.record(key)
+        assert hitters.top(2) == [('a', 5), ('b', 3)]
+        hitters.decay()
+        assert hitters.top(2) == [('a', 2), ('b', 1)]
+        assert hitters.estimate('a') == 2
+
+
+class TestHyperLogLog:
+    '''Класс с тестами оценки числа уникальных посетителей.'''
+
+    def test_count(self):
+        '''Проверяет точность оценки на малых и больших множествах.'''
+        for total in (10, 1000, 50000):
+            sketch = HyperLogLog(precision=12)
+            for number in range(total):
+                sketch.add(f'visitor-{number}')
+                sketch.add(f'visitor-{number}')
+            assert abs(sketch.count() - total) <= max(total * 0.05, 1)
+
+    def test_merge_matches_union(self):
+        '''Проверяет, что объединение скетчей равно скетчу объединения.'''
+        first, second, both = (HyperLogLog(precision=8) for _ in range(3))
+        for number in range(3000):
+            key = f'visitor-{number}'
+            (first if number % 3 else second).add(key)
+            both.add(key)
+        merged = HyperLogLog.union([first, second], precision=8)
+        assert merged.to_bytes() == both.to_bytes()
+        assert merged.to_bytes() == bytes(
+            map(max, first.to_bytes(), second.to_bytes())
+        )
+        restored = HyperLogLog(precision=8, registers=merged.to_bytes())
+        assert restored.count() == both.count()
+
+
+def write_entries(path: str, count: int) -> None:
+    '''Пишет записи в общий кэш из другого процесса.'''
+    cache = SharedRedirectCache(path, slots=64, arena_bytes=4096, ttl=60)
+    for number in range(count):
+        cache.set(
+            CachedUrl(
+                id=number,
+                short_url=f'code-{number % 8}',
+                original_url=f'https://example.com/{number}',
+                url_type='private' if number % 2 else 'public',
+                user_id=number
+            )
+        )
+    cache.close()
+
+
+class TestSharedRedirectCache:
+    '''Класс с тестами кэша переадресаций в общей памяти.'''
+
+    def test_set_get_evict(self, tmp_path):
+        '''Проверяет запись, чтение и удаление записи.'''
+        cache = SharedRedirectCache(
+            str(tmp_path / 'cache'), slots=16, arena_bytes=1024, ttl=60
+        )
+        entry = make_entry('a')
+        cache.set(entry)
+        assert cache.get(entry.short_url) == entry
+        assert len(cache) == 1
+        cache.evict(entry.short_url)
+        assert cache.get(entry.short_url) is None
+        assert len(cache) == 0
+
+    def test_redirect_policy_roundtrip(self, tmp_path):
+        '''Проверяет сохранение политики переадресации в слоте.'''
+        cache = SharedRedirectCache(
+            str(tmp_path / 'cache'), slots=16, arena_bytes=1024, ttl=60
+        )
+        entry = make_entry('a')._replace(
+            redirect_type='permanent', cache_max_age=3600
+        )
+        cache.set(entry)
+        assert cache.get(entry.short_url) == entry
+        expiring = make_entry('b')._replace(
+            expires_at=datetime(2100, 1, 1, 12, 30, 15, 123456)
+        )
+        cache.set(expiring)
+        assert cache.get(expiring.short_url) == expiring
+
+    def test_ttl(self, tmp_path):
+        '''Проверяет истечение записи.'''
+        clock = FakeClock()
+        cache = SharedRedirectCache(
+            str(tmp_path / 'cache'), slots=16, arena_bytes=1024, ttl=5,
+            clock=clock
+        )
+        entry = make_entry('a')
+        cache.set(entry)
+        clock.now = 5
+        assert cache.get(entry.short_url) is None
+
+    def test_arena_overflow_flushes(self, tmp_path):
+        '''Проверяет полную очистку при переполнении области строк.'''
+        cache = SharedRedirectCache(
+            str(tmp_path / 'cache'), slots=16, arena_bytes=64, ttl=60
+        )
+        first, second = make_entry('a'), make_entry('b')
+        cache.set(first)
+        cache.set(second)
+        assert cache.get(first.short_url) is None
+        assert cache.get(second.short_url) == second
+
+    def test_visible_across_processes(self, tmp_path):
+        '''Проверяет, что записи другого процесса видны без блокировок.'''
+        path = str(tmp_path / 'cache')
+        cache = SharedRedirectCache(path, slots=64, arena_bytes=4096, ttl=60)
+        context = multiprocessing.get_context('fork')
+        writer = context.Process(target=write_entries, args=(path, 2000))
+        writer.start()
+        while writer.is_alive():
+            for code in range(8):
+                entry = cache.get(f'code-{code}')
+                if entry is not None:
+                    assert entry.original_url.endswith(f'/{entry.id}')
+                    assert entry.user_id == entry.id
+        writer.join()
+        assert writer.exitcode == 0
+        assert cache.get('code-7').id == 1999
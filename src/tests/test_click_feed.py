@@ -0,0 +1,146 @@
+import asyncio
+from uuid import uuid4
+
+import orjson
+import pytest
+from fastapi import status
+from httpx import AsyncClient
+
+from services import click_feed as click_feed_module
+from services.cache.invalidation import (
+    InvalidationBus, InvalidationEvents, invalidation_bus
+)
+from services.click_feed import ClickFeed, Subscription, click_feed
+from tests.test_invalidation import wait_for
+
+pytestmark = pytest.mark.asyncio(scope='session')
+
+
+async def collect(stream, count: int) -> list:
+    return [await anext(stream) for _ in range(count)]
+
+
+class TestClickFeed:
+    '''Класс с тестами трансляции переходов.'''
+
+    async def test_drop_oldest(self):
+        '''Проверяет вытеснение старых событий у медленного зрителя.'''
+        subscription = Subscription(max_size=2)
+        for payload in (b'1', b'2', b'3'):
+            subscription.put(payload)
+        assert subscription.dropped == 1
+        assert await subscription.get(timeout=0) == b'2'
+        assert await subscription.get(timeout=0) == b'3'
+        assert await subscription.get(timeout=0) is None
+
+    async def test_stream_and_unsubscribe(self):
+        '''Проверяет формат событий, keepalive и снятие подписки.'''
+        feed = ClickFeed(queue_size=1)
+        stream = feed.stream('short', heartbeat=0.01)
+        assert await anext(stream) == b'retry: 3000\n\n'
+        assert feed.publish('short', {'client': 'a'}) == 1
+        feed.publish('short', {'client': 'b'})
+        assert await collect(stream, 3) == [
+            b'event: dropped\ndata: 1\n\n',
+            b'event: click\ndata: {"client":"b"}\n\n',
+            b': keepalive\n\n'
+        ]
+        await stream.aclose()
+        assert feed.subscribers('short') == 0
+        assert feed.publish('short', {'client': 'c'}) == 0
+
+    async def test_endpoint(self, client: AsyncClient, query_budget):
+        '''Проверяет трансляцию перехода и завершение при удалении.'''
+        response = await client.post(
+            '/',
+            json={
+                'original_url': f'https://example.org/stream/{uuid4()}',
+                'url_type': 'public'
+            }
+        )
+        short_url = response.json()['short_url']
+        with query_budget(queries=1):
+            viewer = asyncio.create_task(
+                client.get(f'{short_url}/status/stream')
+            )
+            while not click_feed.subscribers(short_url):
+                await asyncio.sleep(0.01)
+        await client.get(short_url, headers={'user-agent': 'viewer-test'})
+        click_feed.close(short_url)
+        response = await asyncio.wait_for(viewer, timeout=5)
+        assert response.headers['content-type'].startswith(
+            'text/event-stream'
+        )
+        events = response.text.strip().split('\n\n')
+        assert events[0] == 'retry: 3000'
+        assert events[-1] == 'event: closed\ndata: {}'
+        click = orjson.loads(events[1].split('data: ', 1)[1])
+        assert click['client'] == 'viewer-test'
+
+    async def test_endpoint_not_found(self, client: AsyncClient):
+        response = await client.get(f'/{uuid4().hex}/status/stream')
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    async def test_per_process(self):
+        '''Проверяет, что переходы другого процесса не транслируются.'''
+        worker, other_worker = ClickFeed(queue_size=2), ClickFeed(queue_size=2)
+        subscription = worker.subscribe('short')
+        assert other_worker.publish('short', {'client': 'a'}) == 0
+        assert await subscription.get(timeout=0) is None
+
+    async def test_closed_after_update(self, client: AsyncClient):
+        '''
+        Проверяет завершение трансляции после изменения ссылки.
+
+        Уведомление приходит через LISTEN/NOTIFY, как в другом процессе,
+        а переподключение к ставшей приватной ссылке запрещено.
+        '''
+        user = {'username': f'feed{uuid4().hex[:8]}', 'password': 'Changeme1!'}
+        await client.post('/auth/users/create', json=user)
+        token = (await client.post('/auth/token', data=user)).json()
+        headers = {'Authorization': f'Bearer {token["access_token"]}'}
+        response = await client.post(
+            '/',
+            headers=headers,
+            json={
+                'original_url': f'https://example.org/stream/{uuid4()}',
+                'url_type': 'public'
+            }
+        )
+        short_url = response.json()['short_url']
+        bus = InvalidationBus(
+            dsn=invalidation_bus.dsn, channel=invalidation_bus.channel
+        )
+        bus.subscribe(click_feed_module._on_invalidation)
+        task = asyncio.create_task(bus.run())
+        try:
+            await asyncio.wait_for(bus.ready.wait(), timeout=5)
+            viewer = asyncio.create_task(
+                client.get(f'{short_url}/status/stream')
+            )
+            await wait_for(lambda: click_feed.subscribers(short_url))
+            response = await client.put(
+                f'{short_url}/update',
+                headers=headers,
+                json={'url_type': 'private'}
+            )
+            assert response.status_code == status.HTTP_200_OK
+            response = await asyncio.wait_for(viewer, timeout=5)
+        finally:
+            task.cancel()
+        assert response.text.strip().endswith('event: closed\ndata: {}')
+        response = await client.get(f'{short_url}/status/stream')
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    async def test_flush_closes_all(self):
+        '''Проверяет завершение трансляций после потери событий.'''
+        subscription = click_feed.subscribe('flushed')
+        invalidation_bus.dispatch({
+            'event': InvalidationEvents.CREATE,
+            'short_url': 'flushed',
+            'user_id': None
+        })
+        assert not subscription.closed
+        invalidation_bus.flush()
+        assert subscription.closed
+        assert click_feed.subscribers('flushed') == 0
@@ -0,0 +1,114 @@
+import struct
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+import pytest
+from fastapi import status
+from httpx import AsyncClient
+
+from services import click_stats
+from services.click_stats import decode_times, histogram
+from services.cold_storage import EPOCH, from_micros, to_micros
+
+pytestmark = pytest.mark.asyncio(scope='session')
+
+
+@pytest.fixture(params=['numpy', 'array'])
+def vectorized(request, monkeypatch):
+    '''Проверяет код с numpy, если он установлен, и без него.'''
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(click_stats, 'np', None)
+    return request.param
+
+
+class TestClickStats:
+    '''Класс с тестами гистограммы переходов.'''
+
+    async def test_decode_times(self, vectorized):
+        '''Проверяет разбор столбца int8send из базы.'''
+        moment = datetime(2026, 1, 2, 3, 4, 5, 6)
+        times = decode_times(struct.pack('>2q', 0, to_micros(moment)))
+        if vectorized == 'numpy':
+            assert times.dtype.name == 'datetime64[us]'
+            assert times[1].astype(datetime) == moment
+        else:
+            assert list(times) == [0, to_micros(moment)]
+        assert len(decode_times(None)) == 0
+
+    async def test_histogram(self, vectorized):
+        '''Проверяет интервалы, перцентили и промежутки между переходами.'''
+        result = histogram([0, 10, 20, 30, 100], bins=2)
+        assert result['clicks'] == 5
+        assert result['bins'] == [
+            {'start': EPOCH, 'clicks': 4},
+            {'start': from_micros(50), 'clicks': 1}
+        ]
+        assert result['percentiles'] == {
+            'p50': from_micros(20), 'p90': from_micros(100),
+            'p99': from_micros(100)
+        }
+        assert result['inter_arrival'] == {
+            'mean': 0.000025, 'p50': 0.00001, 'p90': 0.00007,
+            'p99': 0.00007, 'max': 0.00007
+        }
+        result = histogram([5], bins=3, start=0, end=3)
+        assert [item['clicks'] for item in result['bins']] == [0, 0, 0]
+        assert result['inter_arrival'] is None
+
+    async def test_endpoint(self, client: AsyncClient, vectorized):
+        '''Проверяет раздел histogram в статистике ссылки.'''
+        response = await client.post(
+            '/',
+            json={
+                'original_url': f'https://example.org/histogram/{uuid4()}',
+                'url_type': 'public'
+            }
+        )
+        short_url = response.json()['short_url']
+        for _ in range(3):
+            await client.get(short_url)
+        response = await client.get(
+            f'{short_url}/status',
+            params={'histogram': 1, 'histogram_bins': 4}
+        )
+        result = response.json()['histogram']
+        assert result['clicks'] == 3
+        assert sum(item['clicks'] for item in result['bins']) == 3
+        assert len(result['bins']) == 4
+
+        tomorrow = datetime.utcnow() + timedelta(days=1)
+        response = await client.get(
+            f'{short_url}/status',
+            params={
+                'histogram': 1,
+                'histogram_from': f'{tomorrow.isoformat()}Z'
+            }
+        )
+        assert response.json()['histogram']['clicks'] == 0
+
+    async def test_endpoint_empty_range(self, client: AsyncClient):
+        '''Проверяет отказ в гистограмме за пустой интервал.'''
+        response = await client.post(
+            '/',
+            json={
+                'original_url': f'https://example.org/histogram/{uuid4()}',
+                'url_type': 'public'
+            }
+        )
+        short_url = response.json()['short_url']
+        moment = datetime(2026, 1, 2, 3)
+        for start, end in (
+            (moment.isoformat(), moment.isoformat()),
+            (moment.isoformat(), f'{moment.isoformat()}+03:00')
+        ):
+            response = await client.get(
+                f'{short_url}/status',
+                params={
+                    'histogram': 1,
+                    'histogram_from': start,
+                    'histogram_to': end
+                }
+            )
+            assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
@@ -0,0 +1,233 @@
+import os
+from datetime import date, datetime
+from uuid import uuid4
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import func, select
+
+from core.config import HOST_URL
+from db.db import async_session
+from models import ClientConnection, ClientConnectionCold
+from services import cold_storage as cold_module
+from services.cold_storage import (
+    ColdStorage, agent_counts, cold_storage, daily_counts, decode_clicks,
+    encode_clicks, export_cold_clicks, merge_top, months_before,
+    newest_clicks, to_micros
+)
+from services.entities import (
+    client_con_crud, cold_crud, url_crud, user_crud
+)
+
+pytestmark = pytest.mark.asyncio(scope='session')
+
+CLICKS = [
+    (datetime(1999, 12, 31, 23, 59, 59, 999999), 'first'),
+    (datetime(1999, 12, 1, 8), None),
+    (datetime(2000, 1, 2, 10), 'second'),
+    (datetime(2000, 1, 2, 11), 'first'),
+]
+
+
+@pytest.fixture(params=['numpy', 'array'])
+def vectorized(request, monkeypatch):
+    '''Проверяет код с numpy, если он установлен, и без него.'''
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(cold_module, 'np', None)
+    return request.param
+
+
+async def create_url(clicks, user_id=None) -> int:
+    async with async_session() as db:
+        url_obj = await url_crud.create(
+            db=db,
+            data_in={
+                'original_url': f'https://example.com/cold/{uuid4()}',
+                'short_url': f'{HOST_URL}/cold-{uuid4().hex}',
+                'url_type': 'public',
+                'user_id': user_id
+            }
+        )
+        for time, agent in clicks:
+            await client_con_crud.create(
+                db=db,
+                data_in={'client_info': agent, 'url_id': url_obj.id,
+                         'time': time}
+            )
+        return url_obj.id
+
+
+class TestColdStorage:
+    '''Класс с тестами холодного хранения переходов.'''
+
+    async def test_roundtrip_and_counts(self, vectorized):
+        '''Проверяет кодирование столбцов и подсчеты по ним.'''
+        clicks = decode_clicks(encode_clicks(
+            [to_micros(time) for time, _ in CLICKS],
+            [agent for _, agent in CLICKS]
+        ))
+        assert list(clicks.times) == sorted(
+            to_micros(time) for time, _ in CLICKS
+        )
+        assert clicks.agents() == [None, 'first', 'second', 'first']
+        assert daily_counts([clicks]) == {
+            date(1999, 12, 1): 1, date(1999, 12, 31): 1, date(2000, 1, 2): 2
+        }
+        assert agent_counts([clicks, clicks]) == {
+            'first': 4, None: 2, 'second': 2
+        }
+        assert merge_top([('second', 3)], [clicks], limit=2) == [
+            ('second', 4), ('first', 2)
+        ]
+
+    async def test_newest_clicks(self, vectorized):
+        '''Проверяет страницы переходов по файлам от новых к старым.'''
+        files = [
+            decode_clicks(encode_clicks(
+                [to_micros(time) for time, _ in clicks],
+                [agent for _, agent in clicks]
+            ))
+            for clicks in (CLICKS[2:], CLICKS[:2])
+        ]
+        newest = sorted(CLICKS, reverse=True)
+        assert newest_clicks(files, 0, None) == newest
+        assert newest_clicks(files, 1, 2) == newest[1:3]
+        assert newest_clicks(files, 3, 5) == newest[3:]
+        assert newest_clicks(files, 4, 1) == []
+
+    async def test_months_before(self):
+        assert months_before(date(2000, 3, 15), 3) == date(1999, 12, 1)
+        assert months_before(date(2000, 3, 1), 0) == date(2000, 3, 1)
+
+    async def test_export(
+        self, client: AsyncClient, tmp_path, monkeypatch, vectorized
+    ):
+        '''Проверяет выгрузку, дозапись месяца и статистику ссылки.'''
+        monkeypatch.setattr(cold_storage, 'root', str(tmp_path))
+        recent = datetime.utcnow()
+        url_id = await create_url([*CLICKS, (recent, 'first')])
+        export = dict(
+            session_factory=async_session,
+            months=1,
+            batch_size=100,
+            storage=ColdStorage(str(tmp_path)),
+            now=datetime(2000, 3, 15)
+        )
+        assert await export_cold_clicks(**export) >= 4
+        async with async_session() as db:
+            await client_con_crud.create(
+                db=db,
+                data_in={'client_info': 'third', 'url_id': url_id,
+                         'time': datetime(2000, 1, 20)}
+            )
+        assert await export_cold_clicks(**export) >= 1
+
+        async with async_session() as db:
+            hot = await db.scalar(
+                select(func.count()).where(ClientConnection.url_id == url_id)
+            )
+            cold = ClientConnectionCold
+            months = (await db.execute(
+                select(cold.month, cold.clicks).
+                where(cold.url_id == url_id).
+                order_by(cold.month)
+            )).all()
+            url_obj = await url_crud.get(db=db, id=url_id)
+        assert hot == 1
+        assert months == [(date(1999, 12, 1), 2), (date(2000, 1, 1), 3)]
+        assert len(os.listdir(tmp_path / str(url_id))) == 2
+
+        response = await client.get(
+            f'{url_obj.short_url}/status', params={'summary': 1}
+        )
+        data = response.json()
+        assert data['number_of_calls'] == 6
+        assert data['summary']['top_clients'][0] == {
+            'client': 'first', 'clicks': 3
+        }
+        assert data['summary']['first_click'] == '1999-12-01T08:00:00'
+        assert data['summary']['clicks_per_day'][:3] == [
+            {'day': '1999-12-01', 'clicks': 1},
+            {'day': '1999-12-31', 'clicks': 1},
+            {'day': '2000-01-02', 'clicks': 2}
+        ]
+
+    async def test_export_single_leader(self, tmp_path):
+        '''Проверяет, что выгрузку одновременно ведет один процесс.'''
+        url_id = await create_url(CLICKS)
+        async with async_session() as db:
+            short_url = (await url_crud.get(db=db, id=url_id)).short_url
+            stamp = await url_crud.get_status_stamp(db=db, short_url=short_url)
+        assert not stamp.has_cold
+        export = dict(
+            session_factory=async_session,
+            months=1,
+            batch_size=100,
+            storage=ColdStorage(str(tmp_path)),
+            now=datetime(2000, 3, 15)
+        )
+        async with async_session() as leader:
+            assert await cold_crud.try_lock_export(db=leader)
+            assert await export_cold_clicks(**export) == 0
+        assert await export_cold_clicks(**export) >= len(CLICKS)
+        async with async_session() as db:
+            stamp = await url_crud.get_status_stamp(db=db, short_url=short_url)
+        assert stamp.has_cold
+
+    async def test_export_details_and_versions(
+        self, client: AsyncClient, tmp_path, monkeypatch
+    ):
+        '''
+        Проверяет, что details продолжаются холодными переходами,
+        а выгрузка меняет версии ссылки и владельца.
+        '''
+        monkeypatch.setattr(cold_storage, 'root', str(tmp_path))
+        async with async_session() as db:
+            owner = await user_crud.create(
+                db=db,
+                data_in={'username': f'cold{uuid4().hex[:8]}', 'password': 'p'}
+            )
+            owner_id, owner_version = owner.id, owner.version
+        recent = datetime.utcnow().replace(microsecond=0)
+        url_id = await create_url([*CLICKS, (recent, 'recent')], owner_id)
+        async with async_session() as db:
+            short_url = (await url_crud.get(db=db, id=url_id)).short_url
+        status_url = f'{short_url}/status'
+        before = await client.get(status_url, params={'full_info': 1})
+
+        assert await export_cold_clicks(
+            session_factory=async_session,
+            months=1,
+            batch_size=100,
+            storage=cold_storage,
+            now=datetime(2000, 3, 15)
+        ) >= len(CLICKS)
+        async with async_session() as db:
+            owner = await user_crud.get(db=db, id=owner_id)
+            url_obj = await url_crud.get(db=db, id=url_id)
+        assert owner.version > owner_version
+        assert url_obj.version > 1
+
+        response = await client.get(
+            status_url,
+            params={'full_info': 1},
+            headers={'If-None-Match': before.headers['ETag']}
+        )
+        assert response.status_code == 200
+        newest = [
+            (time.isoformat(), agent)
+            for time, agent in sorted(
+                [*CLICKS, (recent, 'recent')], reverse=True
+            )
+        ]
+        pages = {(0, 10): newest, (1, 2): newest[1:3], (3, 2): newest[3:5],
+                 (4, 10): newest[4:], (5, 10): []}
+        for (offset, max_result), expected in pages.items():
+            details = (await client.get(status_url, params={
+                'full_info': 1, 'offset': offset, 'max_result': max_result
+            })).json()['details']
+            assert [
+                (item['datetime'], item['client']) for item in details
+            ] == expected
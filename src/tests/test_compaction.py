@@ -0,0 +1,170 @@
+from datetime import date, datetime, timedelta
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import func, select
+
+from db.db import async_session
+from models import (
+    ClientConnection, ClientConnectionArchive, ClientConnectionCold, Url,
+    UrlArchive
+)
+from services.cache.dedup import anonymous_urls
+from services.cold_storage import ColdStorage, to_micros
+from services.compaction import compact_deleted, sweep_expired
+from services.entities import client_con_crud, cold_crud, url_crud
+from services.utils.utils import check_url_exists
+
+pytestmark = pytest.mark.asyncio(scope='session')
+
+
+async def create_deleted_url(clicks: int, deleted_ago: timedelta) -> int:
+    '''Создает удаленную ссылку с переходами и возвращает ее id.'''
+    async with async_session() as db:
+        url_obj = await url_crud.create(
+            db=db,
+            data_in={
+                'original_url': f'https://example.com/{uuid4()}',
+                'short_url': f'compaction-{uuid4()}',
+                'url_type': 'public'
+            }
+        )
+        for _ in range(clicks):
+            await client_con_crud.create(
+                db=db,
+                data_in={'client_info': 'pytest', 'url_id': url_obj.id}
+            )
+        await url_crud.update(
+            db=db,
+            db_obj=url_obj,
+            data_in={
+                'deleted': True,
+                'deleted_at': datetime.utcnow() - deleted_ago
+            }
+        )
+        return url_obj.id
+
+
+async def count(model, **filters) -> int:
+    async with async_session() as db:
+        stmnt = select(func.count()).select_from(model).filter_by(**filters)
+        return (await db.execute(stmnt)).scalar_one()
+
+
+class TestCompaction:
+    '''Класс с тестами переноса удаленных ссылок в архив.'''
+
+    async def test_moves_urls_and_connections(self):
+        '''Проверяет перенос старых удаленных ссылок пачками.'''
+        old_ids = [
+            await create_deleted_url(clicks=2, deleted_ago=timedelta(days=2))
+            for _ in range(3)
+        ]
+        recent_id = await create_deleted_url(
+            clicks=1, deleted_ago=timedelta(0)
+        )
+        urls, connections = await compact_deleted(
+            session_factory=async_session,
+            grace=timedelta(days=1).total_seconds(),
+            batch_size=2
+        )
+        assert urls >= 3 and connections >= 6
+        for url_id in old_ids:
+            assert await count(Url, id=url_id) == 0
+            assert await count(ClientConnection, url_id=url_id) == 0
+            assert await count(UrlArchive, id=url_id) == 1
+            assert await count(ClientConnectionArchive, url_id=url_id) == 2
+        assert await count(Url, id=recent_id) == 1
+
+    async def test_removes_cold_months(self, tmp_path):
+        '''Проверяет удаление месяцев и файлов холодного хранения.'''
+        url_id = await create_deleted_url(
+            clicks=0, deleted_ago=timedelta(days=2)
+        )
+        storage = ColdStorage(str(tmp_path))
+        path = storage.write(
+            url_id, date(2000, 1, 1), [to_micros(datetime(2000, 1, 2))],
+            ['pytest']
+        )
+        async with async_session() as db:
+            await cold_crud.save_months(db=db, rows=[{
+                'url_id': url_id,
+                'month': date(2000, 1, 1),
+                'clicks': 1,
+                'first_click': datetime(2000, 1, 2),
+                'last_click': datetime(2000, 1, 2),
+                'path': path,
+                'exported_at': datetime.utcnow()
+            }])
+        await compact_deleted(
+            session_factory=async_session,
+            grace=timedelta(days=1).total_seconds(),
+            batch_size=10,
+            storage=storage
+        )
+        assert await count(UrlArchive, id=url_id) == 1
+        assert await count(ClientConnectionCold, url_id=url_id) == 0
+        assert not (tmp_path / path).exists()
+
+    async def test_skips_locked_rows(self):
+        '''Проверяет, что заблокированная ссылка пропускается.'''
+        url_id = await create_deleted_url(
+            clicks=0, deleted_ago=timedelta(days=2)
+        )
+        async with async_session() as locker:
+            await locker.execute(
+                select(Url).where(Url.id == url_id).with_for_update()
+            )
+            await compact_deleted(
+                session_factory=async_session,
+                grace=timedelta(days=1).total_seconds(),
+                batch_size=10
+            )
+            await locker.rollback()
+        assert await count(Url, id=url_id) == 1
+        await compact_deleted(
+            session_factory=async_session,
+            grace=timedelta(days=1).total_seconds(),
+            batch_size=10
+        )
+        assert await count(UrlArchive, id=url_id) == 1
+
+
+class TestExpirySweep:
+    '''Класс с тестами удаления истекших ссылок.'''
+
+    async def test_expired_url_is_gone_and_swept(self):
+        '''Проверяет, что истекшая ссылка недоступна и удаляется.'''
+        async with async_session() as db:
+            expired = await url_crud.create(
+                db=db,
+                data_in={
+                    'original_url': f'https://example.com/{uuid4()}',
+                    'short_url': f'expired-{uuid4()}',
+                    'url_type': 'public',
+                    'expires_at': datetime.utcnow() - timedelta(seconds=1)
+                }
+            )
+            live = await url_crud.create(
+                db=db,
+                data_in={
+                    'original_url': f'https://example.com/{uuid4()}',
+                    'short_url': f'expiring-{uuid4()}',
+                    'url_type': 'public',
+                    'expires_at': datetime.utcnow() + timedelta(days=1)
+                }
+            )
+            target = await url_crud.get_redirect_target(
+                db=db,
+                short_url=expired.short_url
+            )
+            assert not check_url_exists(target)
+            assert check_url_exists(live)
+        anonymous_urls.set(expired.original_url, expired.short_url, b'{}')
+        assert await sweep_expired(
+            session_factory=async_session,
+            batch_size=1
+        ) >= 1
+        assert await count(Url, id=expired.id, deleted=True) == 1
+        assert await count(Url, id=live.id, deleted=False) == 1
+        assert anonymous_urls.get(expired.original_url) is None
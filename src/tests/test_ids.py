@@ -0,0 +1,102 @@
+import random
+
+import pytest
+
+from core.config import AppSettings
+from services.exceptions.custom_exceptions import ClockSkewError
+from services.utils.ids import (
+    SnowflakeGenerator, claim_worker_slot, decode_base62, encode_base62
+)
+
+
+class FakeClock:
+    '''Часы узла, которые тест двигает вручную.'''
+
+    def __init__(self, now: int = 1000):
+        self.now = now
+
+    def __call__(self) -> int:
+        return self.now
+
+
+class TestSnowflake:
+    '''Класс с тестами генератора snowflake id.'''
+
+    def test_many_nodes_never_collide(self):
+        '''
+        Проверяет уникальность id узлов с расходящимися часами.
+
+        Часы узлов идут вразнобой, иногда отстают, а некоторые узлы
+        выдают больше id в миллисекунду, чем вмещает порядковый номер.
+        '''
+        chance = random.Random(42)
+        clocks = [FakeClock() for _ in range(32)]
+        nodes = [
+            SnowflakeGenerator(
+                node_id=node_id,
+                sequence_bits=4,
+                max_skew_ms=1000,
+                clock=clock
+            )
+            for node_id, clock in enumerate(clocks)
+        ]
+        ids = set()
+        issued = 0
+        for _ in range(20000):
+            node = chance.randrange(len(nodes))
+            clocks[node].now += chance.choice((-3, 0, 0, 0, 1, 2))
+            for _ in range(chance.choice((1, 1, 30))):
+                ids.add(nodes[node].next_id())
+                issued += 1
+        assert len(ids) == issued
+
+    def test_ids_grow_within_node(self):
+        '''Проверяет рост id и перенос в следующую миллисекунду.'''
+        clock = FakeClock()
+        generator = SnowflakeGenerator(node_id=3, sequence_bits=2, clock=clock)
+        ids = [generator.next_id() for _ in range(6)]
+        assert ids == sorted(ids)
+        assert [generator.parse(value) for value in ids[3:5]] == [
+            (1000, 3, 3), (1001, 3, 0)
+        ]
+        clock.now -= 10
+        assert generator.next_id() > ids[-1]
+
+    def test_clock_skew_limit(self):
+        '''Проверяет ошибку при отставании часов больше допустимого.'''
+        clock = FakeClock()
+        generator = SnowflakeGenerator(node_id=0, max_skew_ms=5, clock=clock)
+        generator.next_id()
+        clock.now -= 6
+        with pytest.raises(ClockSkewError):
+            generator.next_id()
+        clock.now += 6
+        generator.next_id()
+
+    def test_invalid_node_id(self):
+        with pytest.raises(ValueError):
+            SnowflakeGenerator(node_id=1024)
+
+    def test_settings_node_id(self):
+        '''Проверяет, что неверный номер узла не проходит настройки.'''
+        assert AppSettings(SNOWFLAKE_NODE_ID=63).SNOWFLAKE_NODE_ID == 63
+        for node_id in (64, -1):
+            with pytest.raises(ValueError):
+                AppSettings(SNOWFLAKE_NODE_ID=node_id)
+        with pytest.raises(ValueError):
+            AppSettings(SNOWFLAKE_WORKER_BITS=11)
+
+    def test_base62_roundtrip(self):
+        for number in (0, 61, 62, 2 ** 63 - 1):
+            code = encode_base62(number)
+            assert code.isalnum() and decode_base62(code) == number
+
+    def test_worker_slots(self, tmp_path):
+        '''Проверяет, что воркеры узла занимают разные номера.'''
+        slots = [
+            claim_worker_slot(lock_dir=str(tmp_path), node_id=1, slots=2)
+            for _ in range(2)
+        ]
+        assert slots == [0, 1]
+        with pytest.raises(RuntimeError):
+            claim_worker_slot(lock_dir=str(tmp_path), node_id=1, slots=2)
@@ -0,0 +1,131 @@
+import asyncio
+import csv
+from uuid import uuid4
+
+import orjson
+import pytest
+from sqlalchemy import func, select
+
+from core.config import HOST_URL
+from db.db import async_session
+from importer.bulk import import_file, read_checkpoint
+from models import Url, User
+from services.cache.invalidation import InvalidationBus, invalidation_bus
+from services.entities import url_crud, user_crud
+from tests.test_invalidation import wait_for
+
+pytestmark = pytest.mark.asyncio(scope='session')
+
+
+def write_csv(path, rows) -> None:
+    with open(path, 'w', newline='') as target:
+        writer = csv.DictWriter(
+            target, fieldnames=('original_url', 'code', 'owner', 'type')
+        )
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+async def count_urls(**filters) -> int:
+    async with async_session() as db:
+        stmnt = select(func.count()).select_from(Url).filter_by(**filters)
+        return (await db.execute(stmnt)).scalar_one()
+
+
+class TestBulkImport:
+    '''Класс с тестами массового импорта ссылок.'''
+
+    async def test_import_csv(self, tmp_path):
+        '''Проверяет вставку, пропуск дублей и отбраковку строк.'''
+        async with async_session() as db:
+            owner = await user_crud.create(
+                db=db,
+                data_in={'username': f'imp{uuid4().hex[:8]}', 'password': 'p'}
+            )
+        prefix = f'https://example.org/import/{uuid4()}'
+        code = f'imp-{uuid4().hex[:8]}'
+        path = tmp_path / 'links.csv'
+        write_csv(path, [
+            {'original_url': f'{prefix}/1', 'code': code},
+            {'original_url': f'{prefix}/1'},
+            {'original_url': f'{prefix}/2', 'owner': owner.username,
+             'type': 'private'},
+            {'original_url': f'{prefix}/3', 'type': 'secret'},
+            {'original_url': f'{prefix}/4', 'owner': 'no-such-user'},
+            {'original_url': f'{prefix}/5', 'code': 'bad code'},
+        ])
+        bus = InvalidationBus(
+            dsn=invalidation_bus.dsn, channel=invalidation_bus.channel
+        )
+        created = []
+        bus.subscribe(lambda event: created.append(event['short_url']))
+        task = asyncio.create_task(bus.run())
+        try:
+            await asyncio.wait_for(bus.ready.wait(), timeout=5)
+            stats = await import_file(str(path), chunk_size=4)
+            await wait_for(lambda: f'{HOST_URL}/{code}' in created)
+        finally:
+            task.cancel()
+        assert (stats.rows, stats.inserted) == (6, 2)
+        assert (stats.skipped, stats.rejected) == (1, 3)
+        assert await count_urls(short_url=f'{HOST_URL}/{code}') == 1
+        assert await count_urls(
+            original_url=f'{prefix}/2', user_id=owner.id, url_type='private'
+        ) == 1
+        async with async_session() as db:
+            version = await db.scalar(
+                select(User.version).where(User.id == owner.id)
+            )
+        assert version == owner.version + 1
+        with open(f'{path}.rejects', 'rb') as rejects:
+            rejected = [orjson.loads(line) for line in rejects]
+        assert [reject['line'] for reject in rejected] == [4, 6, 5]
+        assert rejected[2]['error'] == 'Unknown owner'
+        assert rejected[2]['row']['owner'] == 'no-such-user'
+
+    async def test_normalized_duplicates(self, tmp_path):
+        '''Проверяет пропуск вариантов записи уже сохраненного url.'''
+        path = f'/import/{uuid4()}'
+        async with async_session() as db:
+            await url_crud.create(
+                db=db,
+                data_in={
+                    'original_url': f'https://example.org{path}',
+                    'short_url': f'{HOST_URL}/imp-{uuid4().hex[:8]}',
+                    'url_type': 'public'
+                }
+            )
+        links = tmp_path / 'links.csv'
+        write_csv(links, [
+            {'original_url': f'HTTPS://Example.ORG:443{path}'},
+            {'original_url': f'HTTPS://Example.ORG{path}/new'},
+            {'original_url': f'https://example.org{path}/new'},
+        ])
+        stats = await import_file(str(links))
+        assert (stats.inserted, stats.skipped) == (1, 2)
+        assert await count_urls(
+            original_url=f'HTTPS://Example.ORG{path}/new'
+        ) == 1
+
+    async def test_resume_from_checkpoint(self, tmp_path):
+        '''Проверяет продолжение импорта с контрольной точки.'''
+        prefix = f'https://example.org/import/{uuid4()}'
+        path = tmp_path / 'links.ndjson'
+        with open(path, 'wb') as target:
+            for number in range(5):
+                target.write(
+                    orjson.dumps({'original_url': f'{prefix}/{number}'})
+                    + b'\n'
+                )
+            target.write(b'{not json\n')
+        checkpoint = tmp_path / 'links.checkpoint'
+        checkpoint.write_bytes(orjson.dumps({'rows': 3, 'inserted': 3}))
+        stats = await import_file(str(path), checkpoint_path=str(checkpoint))
+        assert (stats.rows, stats.inserted, stats.rejected) == (6, 5, 1)
+        assert await count_urls(original_url=f'{prefix}/0') == 0
+        assert await count_urls(original_url=f'{prefix}/4') == 1
+        assert read_checkpoint(str(checkpoint)) == stats
+        stats = await import_file(
+            str(path), checkpoint_path=str(checkpoint), restart=True
+        )
+        assert (stats.inserted, stats.skipped) == (3, 2)
@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+from sqlalchemy import text
+
+from db.db import async_session
+from services.cache.invalidation import InvalidationBus, invalidation_bus
+
+pytestmark = pytest.mark.asyncio(scope='session')
+
+TEST_CHANNEL = 'test_url_invalidation'
+
+
+async def wait_for(condition, timeout: float = 5) -> None:
+    '''Ждет выполнения условия не дольше timeout секунд.'''
+    async def poll():
+        while not condition():
+            await asyncio.sleep(0.02)
+    await asyncio.wait_for(poll(), timeout=timeout)
+
+
+class TestInvalidationBus:
+    '''Класс с тестами шины инвалидации через LISTEN/NOTIFY.'''
+
+    async def test_delivered_after_commit_only(self):
+        '''Проверяет, что откаченное уведомление не доставляется.'''
+        bus = InvalidationBus(dsn=invalidation_bus.dsn, channel=TEST_CHANNEL)
+        events = []
+        bus.subscribe(events.append)
+        task = asyncio.create_task(bus.run())
+        try:
+            await asyncio.wait_for(bus.ready.wait(), timeout=5)
+            async with async_session() as db:
+                await bus.notify(db=db, event='update', short_url='rolled')
+                await db.rollback()
+                await bus.notify(db=db, event='delete', short_url='done')
+                await db.commit()
+            await wait_for(lambda: events)
+            assert events == [
+                {'event': 'delete', 'short_url': 'done', 'user_id': None}
+            ]
+        finally:
+            task.cancel()
+
+    async def test_flush_after_reconnect(self):
+        '''Проверяет полную очистку кэшей после обрыва соединения.'''
+        bus = InvalidationBus(
+            dsn=invalidation_bus.dsn,
+            channel=TEST_CHANNEL,
+            reconnect_delay=0.05
+        )
+        flushes = []
+        bus.subscribe(lambda event: None, on_flush=lambda: flushes.append(1))
+        task = asyncio.create_task(bus.run())
+        try:
+            await asyncio.wait_for(bus.ready.wait(), timeout=5)
+            async with async_session() as db:
+                await db.execute(
+                    text(
+                        'SELECT pg_terminate_backend(pid) '
+                        'FROM pg_stat_activity WHERE query = :query'
+                    ),
+                    {'query': f'LISTEN "{TEST_CHANNEL}"'}
+                )
+            await wait_for(lambda: flushes)
+            await asyncio.wait_for(bus.ready.wait(), timeout=5)
+        finally:
+            task.cancel()
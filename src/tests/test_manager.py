@@ -0,0 +1,124 @@
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import event, func, select
+
+from db.db import async_session, engine
+from models import Url
+from models.schemas.db_schemas import UpdateUrl
+from services.entities import url_crud, user_crud
+from services.manager import unit_of_work
+
+pytestmark = pytest.mark.asyncio(scope='session')
+
+
+def url_data() -> dict:
+    return {
+        'original_url': f'https://example.com/{uuid4()}',
+        'short_url': f'manager-{uuid4()}',
+        'url_type': 'public'
+    }
+
+
+class TestDBManager:
+    '''Класс с тестами записи через RETURNING и unit of work.'''
+
+    async def test_writes_without_refresh(self):
+        '''Проверяет, что создание и обновление не перечитывают объект.'''
+        statements = []
+
+        def collect(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(engine.sync_engine, 'before_cursor_execute', collect)
+        try:
+            async with async_session() as db:
+                user = await user_crud.create(
+                    db=db,
+                    data_in={
+                        'username': f'm{uuid4().hex[:8]}',
+                        'password': 'p'
+                    }
+                )
+                url_obj = await url_crud.create(
+                    db=db, data_in=url_data(), user_id=user.id
+                )
+                url_obj = await url_crud.update(
+                    db=db, db_obj=url_obj, data_in={'url_type': 'private'}
+                )
+        finally:
+            event.remove(engine.sync_engine, 'before_cursor_execute', collect)
+        assert user.urls == [] and url_obj.connections == []
+        assert url_obj.url_type == 'private' and url_obj.version == 2
+        assert url_obj.created is not None
+        assert not [
+            statement for statement in statements
+            if statement.startswith('SELECT') and 'pg_notify' not in statement
+        ]
+
+    async def test_update_keeps_unset_fields(self):
+        '''Проверяет, что поля, не переданные в схеме, не затираются.'''
+        expires_at = datetime.utcnow() + timedelta(days=1)
+        async with async_session() as db:
+            url_obj = await url_crud.create(
+                db=db, data_in=url_data(), expires_at=expires_at
+            )
+            url_obj = await url_crud.update(
+                db=db, db_obj=url_obj, data_in=UpdateUrl(url_type='private')
+            )
+            stored = await db.scalar(
+                select(Url.expires_at).where(Url.id == url_obj.id)
+            )
+        assert url_obj.expires_at == stored == expires_at
+
+    async def test_unit_of_work_single_commit(self):
+        '''Проверяет, что записи в unit of work дают один COMMIT.'''
+        commits = []
+
+        def collect(conn):
+            commits.append(conn)
+
+        first, second = url_data(), url_data()
+        event.listen(engine.sync_engine, 'commit', collect)
+        try:
+            async with async_session() as db:
+                async with unit_of_work(db):
+                    url_obj = await url_crud.create(db=db, data_in=first)
+                    await url_crud.create(db=db, data_in=second)
+                    statuses = await url_crud.batch_update(
+                        db=db,
+                        short_urls=[url_obj.short_url],
+                        values={'url_type': 'private'},
+                        username=None
+                    )
+        finally:
+            event.remove(engine.sync_engine, 'commit', collect)
+        assert len(commits) == 1
+        assert statuses == {url_obj.short_url: 'updated'}
+        async with async_session() as db:
+            count = await db.scalar(
+                select(func.count()).
+                select_from(Url).
+                where(Url.short_url.in_(
+                    [first['short_url'], second['short_url']]
+                ))
+            )
+        assert count == 2
+
+    async def test_unit_of_work_rolls_back(self):
+        '''Проверяет, что записи в unit of work откатываются вместе.'''
+        data = url_data()
+        with pytest.raises(RuntimeError):
+            async with async_session() as db:
+                async with unit_of_work(db):
+                    await url_crud.create(db=db, data_in=data)
+                    await url_crud.create(db=db, data_in=url_data())
+                    raise RuntimeError
+        async with async_session() as db:
+            count = await db.scalar(
+                select(func.count()).
+                select_from(Url).
+                where(Url.short_url == data['short_url'])
+            )
+        assert count == 0
@@ -0,0 +1,192 @@
+from typing import Awaitable
+from uuid import uuid4
+
+import pytest
+import pytest_asyncio
+from fastapi import status
+from httpx import AsyncClient, Response
+
+pytestmark = pytest.mark.asyncio(scope='session')
+
+# Бюджет запросов к базе на один запрос к ручке: (запросов, строк).
+# Строки не ограничиваются, если их число зависит от данных пользователя.
+# Рост бюджета - повод найти лишнюю загрузку, а не поднять число.
+BUDGETS = {
+    'create_anonymous': (3, 2),
+    'create': (5, 4),
+    'redirect': (2, 2),
+    'redirect_cached': (1, 1),
+    'url_status': (3, 3),
+    'url_status_not_modified': (1, 1),
+    'url_status_summary': (5, 5),
+    'url_status_summary_cached': (2, 2),
+    'url_status_histogram': (3, 3),
+    'update': (6, 5),
+    'delete': (6, 5),
+    'user_status': (4, None),
+    'user_status_not_modified': (1, 1),
+    'batch_update': (3, 7),
+}
+
+
+def new_url() -> dict:
+    return {
+        'original_url': f'https://example.org/budget/{uuid4()}',
+        'url_type': 'public'
+    }
+
+
+@pytest_asyncio.fixture(scope='session')
+async def auth_header(client: AsyncClient) -> dict:
+    '''Заголовок авторизации отдельного пользователя с парой ссылок.'''
+    user = {'username': f'qb{uuid4().hex[:8]}', 'password': 'Changeme1!'}
+    await client.post('/auth/users/create', json=user)
+    response = await client.post('/auth/token', data=user)
+    header = {'Authorization': f'Bearer {response.json()["access_token"]}'}
+    for _ in range(2):
+        await client.post('/', json=new_url(), headers=header)
+    return header
+
+
+async def check(query_budget, name: str, request: Awaitable[Response]):
+    '''Выполняет запрос к ручке в рамках ее бюджета.'''
+    queries, rows = BUDGETS[name]
+    with query_budget(queries=queries, rows=rows):
+        return await request
+
+
+class TestQueryBudgets:
+    '''Класс с проверками числа запросов к базе на ручку.'''
+
+    async def test_create(self, client, query_budget, auth_header):
+        '''Проверяет создание ссылки без владельца и с владельцем.'''
+        response = await check(
+            query_budget, 'create_anonymous',
+            client.post('/', json=new_url())
+        )
+        assert response.status_code == status.HTTP_201_CREATED
+        response = await check(
+            query_budget, 'create',
+            client.post('/', json=new_url(), headers=auth_header)
+        )
+        assert response.status_code == status.HTTP_201_CREATED
+
+    async def test_redirect(self, client, query_budget):
+        '''Проверяет переадресацию с пустым и заполненным кэшем.'''
+        short_url = (
+            await client.post('/', json=new_url())
+        ).json()['short_url']
+        response = await check(
+            query_budget, 'redirect', client.get(short_url)
+        )
+        assert response.status_code == status.HTTP_307_TEMPORARY_REDIRECT
+        await check(
+            query_budget, 'redirect_cached', client.get(short_url)
+        )
+
+    async def test_url_status(self, client, query_budget):
+        '''Проверяет статистику ссылки и ответ 304.'''
+        short_url = (
+            await client.post('/', json=new_url())
+        ).json()['short_url']
+        await client.get(short_url)
+        response = await check(
+            query_budget, 'url_status',
+            client.get(f'{short_url}/status?full_info=1')
+        )
+        assert response.status_code == status.HTTP_200_OK
+        response = await check(
+            query_budget, 'url_status_not_modified',
+            client.get(
+                f'{short_url}/status?full_info=1',
+                headers={'If-None-Match': response.headers['ETag']}
+            )
+        )
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    async def test_url_status_summary(self, client, query_budget):
+        '''Проверяет сводку переходов с пустым и заполненным кэшем.'''
+        short_url = (
+            await client.post('/', json=new_url())
+        ).json()['short_url']
+        await client.get(short_url)
+        for name in ('url_status_summary', 'url_status_summary_cached'):
+            response = await check(
+                query_budget, name,
+                client.get(f'{short_url}/status?summary=1')
+            )
+            assert response.status_code == status.HTTP_200_OK
+
+    async def test_url_status_histogram(self, client, query_budget):
+        '''Проверяет гистограмму переходов одним запросом времени.'''
+        short_url = (
+            await client.post('/', json=new_url())
+        ).json()['short_url']
+        for _ in range(3):
+            await client.get(short_url)
+        response = await check(
+            query_budget, 'url_status_histogram',
+            client.get(f'{short_url}/status?histogram=1')
+        )
+        assert response.json()['histogram']['clicks'] == 3
+
+    async def test_update_and_delete(self, client, query_budget, auth_header):
+        '''Проверяет изменение и удаление ссылки владельцем.'''
+        short_url = (
+            await client.post('/', json=new_url(), headers=auth_header)
+        ).json()['short_url']
+        response = await check(
+            query_budget, 'update',
+            client.put(
+                f'{short_url}/update',
+                json={'url_type': 'private'},
+                headers=auth_header
+            )
+        )
+        assert response.status_code == status.HTTP_200_OK
+        response = await check(
+            query_budget, 'delete',
+            client.delete(f'{short_url}/delete', headers=auth_header)
+        )
+        assert response.status_code == status.HTTP_410_GONE
+
+    async def test_user_status(self, client, query_budget, auth_header):
+        '''Проверяет список ссылок пользователя и ответ 304.'''
+        response = await check(
+            query_budget, 'user_status',
+            client.get('/user/status', headers=auth_header)
+        )
+        assert response.status_code == status.HTTP_200_OK
+        response = await check(
+            query_budget, 'user_status_not_modified',
+            client.get(
+                '/user/status',
+                headers={
+                    **auth_header, 'If-None-Match': response.headers['ETag']
+                }
+            )
+        )
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    async def test_batch_update(self, client, query_budget, auth_header):
+        '''Проверяет пакетное изменение ссылок.'''
+        short_urls = [
+            (
+                await client.post('/', json=new_url(), headers=auth_header)
+            ).json()['short_url']
+            for _ in range(3)
+        ]
+        response = await check(
+            query_budget, 'batch_update',
+            client.put(
+                '/batch/update',
+                json={
+                    'short_url_ids': [
+                        short_url.rsplit('/', 1)[1] for short_url in short_urls
+                    ],
+                    'url_type': 'private'
+                },
+                headers=auth_header
+            )
+        )
+        assert response.status_code == status.HTTP_200_OK
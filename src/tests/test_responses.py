@@ -0,0 +1,57 @@
+from datetime import datetime
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+
+from models import ClientConnection, Url
+from models.schemas.db_schemas import FullUrl
+from services.utils.responses import url_response
+
+
+def make_url(connections: int) -> Url:
+    '''Создает объект url с историей переходов без обращения к базе.'''
+    url = Url(
+        id=1,
+        original_url='https://docs.python.org',
+        short_url='http://127.0.0.1:8080/abcdef',
+        created=datetime(2024, 1, 1, 12, 30, 15, 123456),
+        deleted=False,
+        url_type='public',
+        redirect_type='temporary',
+        user_id=None,
+    )
+    url.connections = [
+        ClientConnection(
+            id=index,
+            time=datetime(2024, 1, 2, 0, 0, index),
+            client_info='python-httpx',
+            url_id=1
+        )
+        for index in range(connections)
+    ]
+    return url
+
+
+class TestUrlResponse:
+    '''Класс с тестами быстрого рендеринга ответа FullUrl.'''
+
+    def test_matches_response_model(self):
+        '''Проверяет, что ответ совпадает с сериализацией через FullUrl.'''
+        for connections in (0, 3):
+            url = make_url(connections)
+            expected = jsonable_encoder(FullUrl.model_validate(url))
+            assert orjson.loads(url_response(url).body) == expected
+
+    def test_unloaded_connections(self):
+        '''Проверяет, что незагруженные соединения не подгружаются.'''
+        url = Url(
+            id=2,
+            original_url='https://example.com',
+            short_url='http://127.0.0.1:8080/fedcba',
+            created=datetime(2024, 1, 1),
+            url_type='private',
+            user_id=1
+        )
+        response = url_response(url, status_code=201)
+        assert response.status_code == 201
+        assert orjson.loads(response.body)['connections'] == []
@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from core.config import sa_url
+from db.slow_queries import SlowQueryLog, fingerprint
+
+pytestmark = pytest.mark.asyncio(scope='session')
+
+
+class TestSlowQueryLog:
+    '''Класс с тестами журнала медленных запросов.'''
+
+    async def test_fingerprint(self):
+        '''Проверяет, что запросы с разными значениями совпадают.'''
+        first = fingerprint(
+            "SELECT * FROM url WHERE id IN ($1::INTEGER, $2::INTEGER)\n"
+            "  AND created > $3::TIMESTAMP WITHOUT TIME ZONE AND x = 'a''b'"
+        )
+        second = fingerprint(
+            "SELECT * FROM url WHERE id IN ($1::INTEGER) "
+            "AND created > $2::TIMESTAMP WITHOUT TIME ZONE AND x = 'c'"
+        )
+        assert first == second == (
+            'SELECT * FROM url WHERE id IN (...) AND created > ? AND x = ?'
+        )
+
+    async def test_records_and_explains(self):
+        '''Проверяет учет медленного запроса и получение его плана.'''
+        engine = create_async_engine(sa_url)
+        log = SlowQueryLog(threshold=0.01, explain_rate=1)
+        log.install(engine.sync_engine)
+        explainer = asyncio.create_task(log.run_explainer(engine))
+        try:
+            async with engine.connect() as connection:
+                for value in ('a', 'b'):
+                    await connection.execute(
+                        text(
+                            'SELECT pg_sleep(0.02), count(*) FROM url '
+                            'WHERE short_url = :short_url'
+                        ),
+                        {'short_url': value}
+                    )
+                await connection.execute(text('SELECT 1'))
+            [stats] = log.top(limit=10)
+            assert stats['count'] == 2 and stats['p50_ms'] >= 20
+            assert 'short_url = ?' in stats['fingerprint']
+            for _ in range(100):
+                if stats['plan'] is not None:
+                    break
+                await asyncio.sleep(0.02)
+                [stats] = log.top(limit=10)
+            assert stats['plan'][0]['Plan']['Node Type']
+        finally:
+            explainer.cancel()
+            await engine.dispose()
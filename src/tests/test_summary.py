@@ -0,0 +1,52 @@
+from datetime import datetime
+from uuid import uuid4
+
+import pytest
+from fastapi import status
+from httpx import AsyncClient
+
+pytestmark = pytest.mark.asyncio(scope='session')
+
+
+class TestClickSummary:
+    '''Класс с тестами сводной статистики переходов.'''
+
+    async def test_summary(self, client: AsyncClient):
+        '''Проверяет топ user-agent, переходы по дням и границы.'''
+        response = await client.post(
+            '/',
+            json={
+                'original_url': f'https://example.org/summary/{uuid4()}',
+                'url_type': 'public'
+            }
+        )
+        short_url = response.json()['short_url']
+        response = await client.get(f'{short_url}/status?summary=1')
+        assert response.json()['summary'] == {
+            'first_click': None,
+            'last_click': None,
+            'top_clients': [],
+            'clicks_per_day': []
+        }
+
+        for agent in ('first', 'second', 'second', 'third', 'third', 'third'):
+            await client.get(short_url, headers={'user-agent': agent})
+        response = await client.get(
+            f'{short_url}/status', params={'summary': 1, 'summary_top': 2}
+        )
+        summary = response.json()['summary']
+        assert summary['top_clients'] == [
+            {'client': 'third', 'clicks': 3},
+            {'client': 'second', 'clicks': 2}
+        ]
+        assert summary['clicks_per_day'] == [
+            {'day': datetime.utcnow().date().isoformat(), 'clicks': 6}
+        ]
+        assert summary['first_click'] <= summary['last_click']
+        assert response.json()['number_of_calls'] == 6
+
+    async def test_summary_top_limit(self, client: AsyncClient):
+        response = await client.get(
+            f'/{uuid4().hex}/status', params={'summary': 1, 'summary_top': 0}
+        )
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
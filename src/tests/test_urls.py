@@ -1,13 +1,13 @@
 import random
-from typing import Any, AsyncGenerator
+from uuid import uuid4
 
 import pytest
-import pytest_asyncio
 from httpx import AsyncClient
 from fastapi import status
 
-from core.config import HOST_URL
-from main import app
+from db.db import async_session
+from services.cache.dedup import anonymous_urls
+from services.entities import url_crud
 
 # Относительные url приложения
 app_urls = {
@@ -18,19 +18,14 @@ app_urls = {
     'status': '/user/status',
     'update_url': '/update',
     'url_status': '/status',
-    'delete_url': '/delete'
+    'delete_url': '/delete',
+    'batch_update': '/batch/update',
+    'batch_delete': '/batch/delete'
 }
 
 pytestmark = pytest.mark.asyncio(scope='session')
 
 
-@pytest_asyncio.fixture(scope='session')
-async def client() -> AsyncGenerator[AsyncClient, Any]:
-    '''Асинхронный клиент для pytest.'''
-    async with AsyncClient(app=app, base_url=HOST_URL) as client:
-        yield client
-
-
 class TestUrls:
     '''Класс с тестами конечных точек.'''
 
@@ -46,7 +41,7 @@ class TestUrls:
         'url_type': 'public'
     }
     random_url = {
-        'original_url': f'https://docs.python.org/{random.randrange(1, 1000)}',
+        'original_url': f'https://docs.python.org/{uuid4().hex[:8]}',
         'url_type': 'public'
     }
     create_user_data = {
@@ -74,6 +69,56 @@ class TestUrls:
         )
         assert response.status_code == status.HTTP_201_CREATED
 
+    async def test_repeat_anonymous_create(
+        self, client: AsyncClient, query_budget
+    ):
+        '''Проверяет ответ на повторное создание ссылки из кэша.'''
+        data = {
+            'original_url': f'https://example.org/dedup/{uuid4()}',
+            'url_type': 'public'
+        }
+        first = await client.post(url=app_urls['create_url'], json=data)
+        with query_budget(queries=0):
+            second = await client.post(url=app_urls['create_url'], json=data)
+        assert second.status_code == status.HTTP_201_CREATED
+        assert second.json() == first.json()
+        async with async_session() as db:
+            url_obj = await url_crud.get_obj_by_short_url(
+                db=db, short_url=first.json()['short_url']
+            )
+            await url_crud.update(
+                db=db, db_obj=url_obj, data_in={'deleted': True}
+            )
+        assert anonymous_urls.get(data['original_url']) is None
+
+    async def test_anonymous_create_normalized(self, client: AsyncClient):
+        '''
+        Проверяет, что кэш и база одинаково находят дубль url.
+
+        Сохраняется url в том виде, в котором его прислали.
+        '''
+        path = f'/dedup/{uuid4()}'
+        first = await client.post(
+            url=app_urls['create_url'],
+            json={
+                'original_url': f'HTTPS://Example.ORG:443{path}',
+                'url_type': 'public'
+            }
+        )
+        assert first.json()['original_url'] == (
+            f'HTTPS://Example.ORG:443{path}'
+        )
+        for _ in range(2):
+            second = await client.post(
+                url=app_urls['create_url'],
+                json={
+                    'original_url': f'https://example.org{path}',
+                    'url_type': 'public'
+                }
+            )
+            assert second.json()['short_url'] == first.json()['short_url']
+            anonymous_urls.clear()
+
     async def test_redirect_to_original_url(self, client: AsyncClient):
         '''Проверяет доступность сокращенной ссылки и переадрессацию.'''
         response_post = await client.post(
@@ -83,6 +128,94 @@ class TestUrls:
         response_get = await client.get(response_post.json()['short_url'])
         assert response_get.status_code == status.HTTP_307_TEMPORARY_REDIRECT
 
+    async def test_permanent_redirect(self, client: AsyncClient):
+        '''Проверяет кэшируемую постоянную переадресацию.'''
+        response_post = await client.post(
+            app_urls['create_url'],
+            json={
+                'original_url': (
+                    f'https://docs.python.org/3/{uuid4()}'
+                ),
+                'url_type': 'public',
+                'redirect_type': 'permanent',
+                'cache_max_age': 600
+            }
+        )
+        assert response_post.json()['redirect_type'] == 'permanent'
+        response_get = await client.get(response_post.json()['short_url'])
+        assert response_get.status_code == status.HTTP_308_PERMANENT_REDIRECT
+        assert response_get.headers['cache-control'] == 'public, max-age=600'
+
+    async def test_permanent_redirect_public_only(self, client: AsyncClient):
+        '''Проверяет запрет постоянной переадресации приватной ссылки.'''
+        response_post = await client.post(
+            app_urls['create_url'],
+            json={
+                'original_url': (
+                    f'https://docs.python.org/2/{uuid4()}'
+                ),
+                'url_type': 'public',
+                'redirect_type': 'permanent'
+            }
+        )
+        short_url = response_post.json()['short_url']
+        update_response = await client.put(
+            f'{short_url}{app_urls["update_url"]}',
+            json=self.update_data
+        )
+        assert update_response.status_code == status.HTTP_400_BAD_REQUEST
+        update_response = await client.put(
+            f'{short_url}{app_urls["update_url"]}',
+            json={**self.update_data, 'redirect_type': 'temporary'}
+        )
+        assert update_response.status_code == status.HTTP_200_OK
+
+    async def test_permanent_redirect_not_expiring(self, client: AsyncClient):
+        '''Проверяет запрет постоянной переадресации истекающей ссылки.'''
+        response = await client.post(
+            app_urls['create_url'],
+            json={
+                'original_url': f'https://docs.python.org/1/{uuid4()}',
+                'url_type': 'public',
+                'redirect_type': 'permanent',
+                'expires_at': '2100-01-01T00:00:00+03:00'
+            }
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    async def test_empty_redirect_type(self, client: AsyncClient):
+        '''Проверяет, что пустой тип переадресации отклоняется.'''
+        response = await client.post(
+            app_urls['create_url'],
+            json={**self.random_url, 'redirect_type': ''}
+        )
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    async def test_update_clears_nullable_fields(self, client: AsyncClient):
+        '''Проверяет, что явный null очищает поле, а пропуск - нет.'''
+        response = await client.post(
+            app_urls['create_url'],
+            json={
+                'original_url': f'https://docs.python.org/0/{uuid4()}',
+                'url_type': 'public',
+                'cache_max_age': 600,
+                'expires_at': '2100-01-01T00:00:00'
+            }
+        )
+        update_url = f'{response.json()["short_url"]}{app_urls["update_url"]}'
+        response = await client.put(
+            update_url, json={'url_type': None, 'expires_at': None}
+        )
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data['url_type'] == 'public'
+        assert data['expires_at'] is None
+        assert data['cache_max_age'] == 600
+        response = await client.put(
+            update_url, json={'url_type': None, 'cache_max_age': None}
+        )
+        assert response.json()['cache_max_age'] is None
+
     async def test_create_user(self, client: AsyncClient):
         '''Проверяет доступность url для создания пользователя.'''
         response = await client.post(
@@ -193,6 +326,78 @@ class TestUrls:
         assert 'datetime' in data['details'][0]
         assert 'client' in data['details'][0]
 
+    async def test_url_status_etag(self, client: AsyncClient):
+        '''Проверяет 304 по ETag и смену ETag после перехода.'''
+        response = await client.post(
+            app_urls['create_url'],
+            json={
+                'original_url': f'https://example.com/{uuid4()}',
+                'url_type': 'public'
+            }
+        )
+        short_url = response.json()['short_url']
+        status_url = f'{short_url}{app_urls["url_status"]}'
+        first = await client.get(status_url)
+        etag = first.headers['etag']
+        cached = await client.get(
+            status_url,
+            headers={'If-None-Match': etag}
+        )
+        assert cached.status_code == status.HTTP_304_NOT_MODIFIED
+        await client.get(short_url)
+        changed = await client.get(
+            status_url,
+            headers={'If-None-Match': etag}
+        )
+        assert changed.status_code == status.HTTP_200_OK
+        assert changed.json()['number_of_calls'] == 1
+
+        etag = changed.headers['etag']
+        for params in (
+            {'summary': 1},
+            {'histogram': 1, 'histogram_bins': 2},
+            {'histogram': 1, 'histogram_bins': 3},
+        ):
+            other = await client.get(
+                status_url, params=params, headers={'If-None-Match': etag}
+            )
+            assert other.status_code == status.HTTP_200_OK
+            assert other.headers['etag'] != etag
+            etag = other.headers['etag']
+        uniques = await client.get(
+            status_url, params={'uniques': 1}, headers={'If-None-Match': etag}
+        )
+        assert uniques.status_code == status.HTTP_200_OK
+        assert 'etag' not in uniques.headers
+        assert changed.headers['etag'] != etag
+
+    async def test_user_status_etag(self, client: AsyncClient):
+        '''Проверяет 304 для списка ссылок и смену ETag после перехода.'''
+        login_response = await client.post(
+            app_urls['login'],
+            data=self.login_data
+        )
+        data = login_response.json()
+        auth_header = {
+            'Authorization': f'{data["token_type"]} {data["access_token"]}'
+        }
+        first = await client.get(app_urls['status'], headers=auth_header)
+        etag = first.headers['etag']
+        cached = await client.get(
+            app_urls['status'],
+            headers={**auth_header, 'If-None-Match': etag}
+        )
+        assert cached.status_code == status.HTTP_304_NOT_MODIFIED
+        await client.get(
+            first.json()['urls'][0]['short_url'],
+            headers=auth_header
+        )
+        changed = await client.get(
+            app_urls['status'],
+            headers={**auth_header, 'If-None-Match': etag}
+        )
+        assert changed.status_code == status.HTTP_200_OK
+
     async def test_delete_url(self, client: AsyncClient):
         '''Проверяет доступность url для удаления ссылки.'''
         response = await client.post(
@@ -206,3 +411,62 @@ class TestUrls:
         assert delete_response.status_code == status.HTTP_410_GONE
         new_response = await client.get(short_url)
         assert new_response.status_code == status.HTTP_404_NOT_FOUND
+
+    async def test_batch_update_and_delete(self, client: AsyncClient):
+        '''Проверяет пакетные операции и статусы каждой ссылки.'''
+        user_data = {
+            'username': f'batch{uuid4().hex[:8]}',
+            'password': 'Changeme1!'
+        }
+        await client.post(app_urls['create_user'], json=user_data)
+        login_response = await client.post(
+            app_urls['login'],
+            data=user_data
+        )
+        data = login_response.json()
+        auth_header = {
+            'Authorization': f'{data["token_type"]} {data["access_token"]}'
+        }
+        codes = []
+        for _ in range(2):
+            response = await client.post(
+                app_urls['create_url'],
+                headers=auth_header,
+                json={
+                    'original_url': f'https://example.com/{uuid4()}',
+                    'url_type': 'public'
+                }
+            )
+            codes.append(response.json()['short_url'].rsplit('/', 1)[1])
+
+        unauth_response = await client.put(
+            app_urls['batch_update'],
+            json={
+                'short_url_ids': [codes[0], 'no-such-url'],
+                'url_type': 'private'
+            }
+        )
+        assert unauth_response.json() == [
+            {'short_url_id': codes[0], 'status': 'forbidden'},
+            {'short_url_id': 'no-such-url', 'status': 'not_found'}
+        ]
+        for invalid in ({'url_type': ''}, {'url_type': None}, {}):
+            response = await client.put(
+                app_urls['batch_update'],
+                headers=auth_header,
+                json={'short_url_ids': codes, **invalid}
+            )
+            assert (
+                response.status_code
+                == status.HTTP_422_UNPROCESSABLE_ENTITY
+            )
+        delete_response = await client.post(
+            app_urls['batch_delete'],
+            headers=auth_header,
+            json={'short_url_ids': codes}
+        )
+        assert [
+            result['status'] for result in delete_response.json()
+        ] == ['updated', 'updated']
+        response = await client.get(f'/{codes[0]}')
+        assert response.status_code == status.HTTP_404_NOT_FOUND
@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+import pytest
+from httpx import AsyncClient
+
+from db.db import async_session
+from services.visitors import VisitorCounter, flush_visitors, visitor_counter
+
+pytestmark = pytest.mark.asyncio(scope='session')
+
+
+async def uniques(client: AsyncClient, short_url: str, **params) -> int:
+    response = await client.get(
+        f'{short_url}/status', params={'uniques': 1, **params}
+    )
+    return response.json()['unique_visitors']
+
+
+class TestVisitors:
+    '''Класс с тестами подсчета уникальных посетителей.'''
+
+    async def test_status_uniques(self, client: AsyncClient):
+        '''Проверяет оценку до и после сохранения скетчей в базу.'''
+        response = await client.post(
+            '/',
+            json={
+                'original_url': f'https://example.org/uniques/{uuid4()}',
+                'url_type': 'public'
+            }
+        )
+        short_url = response.json()['short_url']
+        for agent in ('first', 'second', 'third', 'first', 'second'):
+            await client.get(short_url, headers={'user-agent': agent})
+        assert await uniques(client, short_url) == 3
+
+        await flush_visitors(session_factory=async_session)
+        await client.get(short_url, headers={'user-agent': 'fourth'})
+        await client.get(short_url, headers={'user-agent': 'first'})
+        assert await uniques(client, short_url) == 4
+        await flush_visitors(session_factory=async_session)
+        assert await uniques(client, short_url) == 4
+
+        yesterday = datetime.utcnow().date() - timedelta(days=1)
+        assert await uniques(
+            client, short_url, uniques_to=yesterday.isoformat()
+        ) == 0
+
+    async def test_flush_failure_keeps_sketches(self):
+        '''Проверяет, что несохраненные скетчи не теряются.'''
+        counter = VisitorCounter(precision=visitor_counter.precision)
+        counter.add(url_id=1, visitor='127.0.0.1|pytest')
+
+        def broken_session():
+            raise ConnectionError('database is down')
+
+        with pytest.raises(ConnectionError):
+            await flush_visitors(
+                session_factory=broken_session, counter=counter
+            )
+        assert counter.pending(url_id=1).count() == 1